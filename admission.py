@@ -0,0 +1,142 @@
+"""
+Controle de admissão: recusa ou enfileira trabalho pesado quando a máquina está saturada
+
+Antes de iniciar um download/conversão, verifica carga de CPU, espaço livre em
+disco, memória do worker e processos FFmpeg ativos. Acima dos limites a
+requisição espera um pouco na fila e, se a pressão não cair, é recusada com
+503 (recursos) ou 429 (fila cheia) e Retry-After. Endpoints leves e hits de
+cache não passam por aqui.
+"""
+
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+
+
+class AdmissionRejected(Exception):
+    """Trabalho recusado por falta de recursos"""
+
+    def __init__(self, reason, status=503, retry_after=30):
+        super().__init__(reason)
+        self.reason = reason
+        self.status = status
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Limites configuráveis por variável de ambiente (0 desativa cada limite)"""
+
+    def __init__(self, download_dir):
+        self.download_dir = download_dir
+        self.max_load_per_cpu = float(os.environ.get('ADMISSION_MAX_LOAD_PER_CPU', 2.0))
+        self.min_free_disk_mb = int(os.environ.get('ADMISSION_MIN_FREE_DISK_MB', 500))
+        self.max_rss_mb = int(os.environ.get('ADMISSION_MAX_RSS_MB', 0))
+        self.max_ffmpeg = int(os.environ.get('ADMISSION_MAX_FFMPEG', 4))
+        self.max_concurrent = int(os.environ.get('ADMISSION_MAX_CONCURRENT', 2))
+        self.queue_wait = float(os.environ.get('ADMISSION_QUEUE_WAIT', 10))
+        self.retry_after = int(os.environ.get('ADMISSION_RETRY_AFTER', 30))
+        self._slots = threading.BoundedSemaphore(self.max_concurrent) if self.max_concurrent else None
+        self._active = 0
+        self._lock = threading.Lock()
+        self._cached = None
+        self._cached_at = 0
+        self._last_wait = 0.0
+
+    @staticmethod
+    def _rss_mb():
+        try:
+            with open('/proc/self/statm') as f:
+                pages = int(f.read().split()[1])
+            return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+        except (OSError, ValueError):
+            return 0.0
+
+    @staticmethod
+    def _ffmpeg_processes():
+        count = 0
+        try:
+            pids = [pid for pid in os.listdir('/proc') if pid.isdigit()]
+        except OSError:
+            return 0
+        for pid in pids:
+            try:
+                with open(f'/proc/{pid}/comm') as f:
+                    if f.read().strip().startswith('ffmpeg'):
+                        count += 1
+            except OSError:
+                continue
+        return count
+
+    def pressure(self):
+        """Métricas atuais (cacheadas por 1 segundo para manter a checagem barata)"""
+        now = time.time()
+        if self._cached and now - self._cached_at < 1:
+            return self._cached
+        try:
+            load_per_cpu = os.getloadavg()[0] / (os.cpu_count() or 1)
+        except OSError:
+            load_per_cpu = 0.0
+        self._cached = {
+            'load_per_cpu': round(load_per_cpu, 2),
+            'free_disk_mb': shutil.disk_usage(self.download_dir).free // (1024 * 1024),
+            'rss_mb': round(self._rss_mb(), 1),
+            'ffmpeg_processes': self._ffmpeg_processes(),
+            'active_jobs': self._active,
+            'last_queue_wait': round(self._last_wait, 2),
+        }
+        self._cached_at = now
+        return self._cached
+
+    def overload_reason(self):
+        """Retorna o motivo da sobrecarga, ou None se há recursos para trabalho pesado"""
+        metrics = self.pressure()
+        if self.max_load_per_cpu and metrics['load_per_cpu'] > self.max_load_per_cpu:
+            return f"CPU sobrecarregada (load {metrics['load_per_cpu']} por CPU)"
+        if self.min_free_disk_mb and metrics['free_disk_mb'] < self.min_free_disk_mb:
+            return f"Pouco espaço em disco ({metrics['free_disk_mb']} MB livres)"
+        if self.max_rss_mb and metrics['rss_mb'] > self.max_rss_mb:
+            return f"Memória do worker alta ({metrics['rss_mb']} MB)"
+        if self.max_ffmpeg and metrics['ffmpeg_processes'] >= self.max_ffmpeg:
+            return f"Muitos processos FFmpeg ativos ({metrics['ffmpeg_processes']})"
+        return None
+
+    def check(self):
+        """Recusa imediatamente se a máquina estiver sobrecarregada"""
+        reason = self.overload_reason()
+        if reason:
+            raise AdmissionRejected(reason, 503, self.retry_after)
+
+    @contextmanager
+    def slot(self, timeout=None):
+        """Reserva uma vaga para trabalho pesado, esperando na fila até `timeout` segundos"""
+        timeout = self.queue_wait if timeout is None else timeout
+        start = time.time()
+        deadline = start + timeout
+        acquired = False
+        try:
+            while True:
+                reason = self.overload_reason()
+                if reason is None:
+                    if self._slots is None or self._slots.acquire(timeout=min(1.0, max(deadline - time.time(), 0))):
+                        acquired = self._slots is not None
+                        break
+                    reason = 'Fila de downloads cheia'
+                    status = 429
+                else:
+                    status = 503
+                    time.sleep(min(1.0, max(deadline - time.time(), 0)))
+                if time.time() >= deadline:
+                    raise AdmissionRejected(reason, status, self.retry_after)
+            self._last_wait = time.time() - start
+            with self._lock:
+                self._active += 1
+            try:
+                yield
+            finally:
+                with self._lock:
+                    self._active -= 1
+        finally:
+            if acquired:
+                self._slots.release()
@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, Response, redirect
 from flask_cors import CORS
 import yt_dlp
 import os
@@ -10,20 +10,272 @@ from werkzeug.utils import secure_filename
 import logging
 import re
 import urllib.parse
+import unicodedata
+import http.client
+import hashlib
+import hmac
+import json
+import shutil
+import subprocess
+from shared_state import create_state_backend
+from cluster import Cluster
+from job_journal import JobJournal
+from archive import stream_zip, stream_tar
+from admission import AdmissionController, AdmissionRejected
+from object_store import ObjectStore
+from webhooks import WebhookDispatcher, parse_allowed_hosts, valid_callback_url
+from thumbnails import ThumbnailStore, ThumbnailNotFound, VIDEO_ID_RE, SIZES as THUMBNAIL_SIZES, FORMATS as THUMBNAIL_FORMATS
+import extractor_cache
+import format_listing
+from metadata_cache import MetadataCache, MetadataRecord
+from extractor_cache import CachingYoutubeDL
+from structured_logging import YtDlpLogger, bind_request_id, sampled, setup_logging
+from http_cache import finalize_json
+from variants import parse_variants, plan_variants, variant_encode_args
+import introspection
+from file_reaper import FileReaper
+import task_pool as task_pool_module
+from task_pool import TaskPool, WORKER_ENV
+from live_stream import LIVE_STATUSES, HlsLiveReader, LiveModeUnavailable, LiveStreamError, check_not_live
+import preflight
+from preflight import PreflightRejected
+from resilience import (CircuitBreaker, CircuitOpen, Deadline, DeadlineExceeded, is_retryable, retry_with_backoff,
+                        upstream_status)
 
 app = Flask(__name__)
 CORS(app)
 
-# Configuração de logging
-logging.basicConfig(level=logging.INFO)
+# Configuração de logging (LOG_FORMAT=json para logs estruturados; escrita em thread própria)
+setup_logging()
 logger = logging.getLogger(__name__)
+# Fração das linhas de debug frequentes (limpeza de URL, progresso do yt-dlp) que é emitida
+LOG_SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', 0.01))
+LOG_SAMPLED = sampled(LOG_SAMPLE_RATE)
+ytdlp_logger = YtDlpLogger(LOG_SAMPLE_RATE)
+REQUEST_ID_HEADER = 'X-Request-ID'
 
 # Configuração para armazenamento temporário
 TEMP_DIR = tempfile.gettempdir()
 DOWNLOAD_DIR = os.path.join(TEMP_DIR, 'youtube_downloads')
 
+# Camada de fontes: streams originais baixados da origem, reaproveitados por qualquer formato de saída
+SOURCE_DIR = os.path.join(DOWNLOAD_DIR, 'sources')
+
 # Criar diretório de downloads se não existir
 os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+os.makedirs(SOURCE_DIR, exist_ok=True)
+
+# Executável do FFmpeg usado para gerar as saídas a partir das fontes
+FFMPEG_BIN = os.environ.get('FFMPEG_BIN', 'ffmpeg')
+
+# Modo de entrega dos arquivos:
+#   sendfile         - o próprio worker envia via os.sendfile (zero-copy) quando o servidor suporta
+#   x-accel-redirect - devolve só o header e o nginx local serve os bytes
+#   x-sendfile       - idem, para Apache/lighttpd (header X-Sendfile)
+SERVE_MODE = os.environ.get('SERVE_MODE', 'sendfile')
+# Location interna do nginx que aponta para DOWNLOAD_DIR (usada no modo x-accel-redirect)
+ACCEL_REDIRECT_PREFIX = os.environ.get('ACCEL_REDIRECT_PREFIX', '/protected-downloads/')
+# Tamanho do bloco usado quando o servidor não tem sendfile e cai na cópia em Python
+SENDFILE_BLOCK_SIZE = 1024 * 1024
+
+if SERVE_MODE == 'x-sendfile':
+    app.config['USE_X_SENDFILE'] = True
+
+# Estado compartilhado entre workers (fica fora de DOWNLOAD_DIR para não ser limpo junto)
+STATE_DIR = os.environ.get('STATE_DIR', os.path.join(TEMP_DIR, 'youtube_state'))
+os.makedirs(STATE_DIR, exist_ok=True)
+state = create_state_backend(STATE_DIR)
+# Cache das respostas HTTP do extrator (página, player JS, API, manifests)
+extractor_responses = extractor_cache.configure(os.path.join(STATE_DIR, 'extractor'))
+
+# Tempo em que um arquivo baixado continua disponível para novos pedidos (0 desativa o cache)
+ARTIFACT_CACHE_TTL = int(os.environ.get('ARTIFACT_CACHE_TTL', 3600))
+# Journal persistente de downloads; aponte JOURNAL_PATH para um disco persistente em produção
+journal = JobJournal(os.environ.get('JOURNAL_PATH', os.path.join(STATE_DIR, 'journal.db')))
+# Identifica este processo nos heartbeats; downloads de processos sem heartbeat são retomados
+INSTANCE_ID = uuid.uuid4().hex
+HEARTBEAT_INTERVAL = 15
+HEARTBEAT_TTL = 60
+# Tentativas de um download (original + retomadas) antes de desistir: evita loop se o próprio download derruba o processo
+RECOVERY_MAX_ATTEMPTS = int(os.environ.get('RECOVERY_MAX_ATTEMPTS', 3))
+# Intervalo entre as limpezas feitas pela thread de manutenção (estado expirado, caches e journal)
+MAINTENANCE_CLEANUP_INTERVAL = 3600
+
+# Controle de admissão para trabalho pesado (download + FFmpeg)
+admission = AdmissionController(DOWNLOAD_DIR)
+# Jobs assíncronos esperam na fila por mais tempo que requisições síncronas
+JOB_QUEUE_WAIT = int(os.environ.get('JOB_QUEUE_WAIT', 600))
+
+# Prazos por etapa em segundos (0 desativa): metadados, download da mídia e conversão no FFmpeg
+EXTRACT_DEADLINE = int(os.environ.get('EXTRACT_DEADLINE', 60))
+DOWNLOAD_DEADLINE = int(os.environ.get('DOWNLOAD_DEADLINE', 900))
+CONVERT_DEADLINE = int(os.environ.get('CONVERT_DEADLINE', 600))
+# Tentativas contra a origem, espaçadas por backoff exponencial com jitter
+UPSTREAM_RETRIES = int(os.environ.get('UPSTREAM_RETRIES', 3))
+# Os retries ficam só no call_upstream (breaker e prazo a cada tentativa); os internos do yt-dlp,
+# somados a ele, virariam até (N+1)² tentativas por chamada
+YTDLP_NO_RETRIES = {'retries': 0, 'fragment_retries': 0, 'extractor_retries': 0}
+RETRY_BACKOFF_BASE = float(os.environ.get('RETRY_BACKOFF_BASE', 1.0))
+RETRY_BACKOFF_CAP = float(os.environ.get('RETRY_BACKOFF_CAP', 30.0))
+# Abre quando a taxa de 403/429 da origem passa do limite; novos pedidos falham na hora
+upstream_breaker = CircuitBreaker()
+
+# Onde rodam extrações e downloads:
+#   inline     - no próprio worker (padrão)
+#   subprocess - em processos filhos reaproveitáveis, com limites de CPU/memória, kill por prazo
+#                e reciclagem após TASK_MAX_TASKS tarefas (task_pool.py)
+EXECUTION_MODE = os.environ.get('EXECUTION_MODE', 'inline')
+# Verdadeiro dentro dos processos filhos do pool: executam inline e não iniciam threads de fundo
+TASK_WORKER = os.environ.get(WORKER_ENV) == '1'
+TASK_POOL_SIZE = int(os.environ.get('TASK_POOL_SIZE', os.cpu_count() or 2))
+TASK_MAX_TASKS = int(os.environ.get('TASK_MAX_TASKS', 50))
+# CPU (s) de cada tarefa no processo filho; o FFmpeg chamado por ela herda um teto próprio
+TASK_CPU_SECONDS = int(os.environ.get('TASK_CPU_SECONDS', 300))
+# Memória virtual (RLIMIT_AS) de cada processo filho, herdada pelo FFmpeg; 0 = sem limite
+TASK_MEMORY_MB = int(os.environ.get('TASK_MEMORY_MB', 4096))
+# Prazo de relógio de uma tarefa de download; padrão = soma dos prazos das etapas + folga
+TASK_TIMEOUT = int(os.environ.get('TASK_TIMEOUT', EXTRACT_DEADLINE + DOWNLOAD_DEADLINE + CONVERT_DEADLINE + 30))
+task_pool = None
+if EXECUTION_MODE == 'subprocess' and not TASK_WORKER:
+    task_pool = TaskPool(os.path.splitext(os.path.basename(__file__))[0], size=TASK_POOL_SIZE,
+                         max_tasks=TASK_MAX_TASKS, cpu_seconds=TASK_CPU_SECONDS, memory_mb=TASK_MEMORY_MB,
+                         timeout=TASK_TIMEOUT, release_lock=lambda name, token: state.release_lock(name, token))
+
+# Pré-aquecimento do cache: fila explícita (POST /warmup) + vídeos mais pedidos recentemente
+WARMUP_ENABLED = os.environ.get('WARMUP_ENABLED', '1') != '0'
+WARMUP_INTERVAL = int(os.environ.get('WARMUP_INTERVAL', 30))
+# Só aquece com a máquina ociosa: load por CPU abaixo disto, nenhum FFmpeg e nenhum download ativo
+WARMUP_MAX_LOAD_PER_CPU = float(os.environ.get('WARMUP_MAX_LOAD_PER_CPU', 0.5))
+# Prioridade (nice) da thread de aquecimento e dos processos que ela cria
+WARMUP_NICE = int(os.environ.get('WARMUP_NICE', 19))
+# Um vídeo/formato é "quente" com este número de pedidos dentro da janela
+WARMUP_HOT_THRESHOLD = int(os.environ.get('WARMUP_HOT_THRESHOLD', 5))
+WARMUP_HOT_WINDOW = int(os.environ.get('WARMUP_HOT_WINDOW', 900))
+# Arquivos quentes a menos disto de expirar têm a validade renovada
+WARMUP_REFRESH_MARGIN = int(os.environ.get('WARMUP_REFRESH_MARGIN', 600))
+MAX_WARMUP_ITEMS = int(os.environ.get('MAX_WARMUP_ITEMS', 100))
+
+# Publicação opcional num object store S3-compatível (OBJECT_STORE_ENDPOINT + OBJECT_STORE_BUCKET)
+object_store = ObjectStore.from_env(state)
+# Por quanto tempo um objeto publicado é reaproveitado; deve ser menor que a regra de expiração do bucket
+OBJECT_STORE_RETENTION = int(os.environ.get('OBJECT_STORE_RETENTION', 86400))
+
+# Hosts e redes internas que podem receber callbacks (ex.: "hooks.interno,10.0.0.0/8"); fora deles só endereços públicos
+WEBHOOK_ALLOWED_HOSTS = parse_allowed_hosts(os.environ.get('WEBHOOK_ALLOWED_HOSTS'))
+# Callbacks de jobs (callback_url); com WEBHOOK_SECRET o corpo é assinado com HMAC-SHA256
+webhooks = WebhookDispatcher(
+    secret=os.environ.get('WEBHOOK_SECRET'),
+    retries=int(os.environ.get('WEBHOOK_RETRIES', 5)),
+    batch_window=float(os.environ.get('WEBHOOK_BATCH_WINDOW', 0.5)),
+    on_result=lambda events, delivered: record_callback_result(events, delivered),
+    allowed_hosts=WEBHOOK_ALLOWED_HOSTS,
+)
+
+# Remoção agendada dos arquivos entregues sem cache: uma thread para todos
+file_reaper = FileReaper()
+
+# Endpoint de introspecção (/introspect): desligado por padrão; com INTROSPECTION_TOKEN exige
+# o header X-Introspection-Token
+INTROSPECTION_ENABLED = os.environ.get('INTROSPECTION_ENABLED', '0') == '1'
+INTROSPECTION_TOKEN = os.environ.get('INTROSPECTION_TOKEN')
+# Quadros de pilha guardados pelo tracemalloc (0 = desligado; ligar custa CPU e memória em cada alocação)
+INTROSPECTION_TRACEMALLOC = int(os.environ.get('INTROSPECTION_TRACEMALLOC', 0))
+if INTROSPECTION_ENABLED:
+    introspection.start_tracing(INTROSPECTION_TRACEMALLOC)
+
+# Thumbnails redimensionados (fora de DOWNLOAD_DIR, que é limpo a cada hora)
+THUMBNAIL_DIR = os.environ.get('THUMBNAIL_DIR', os.path.join(TEMP_DIR, 'youtube_thumbnails'))
+# Por quanto tempo um thumbnail baixado é reaproveitado antes de ser buscado de novo
+THUMBNAIL_CACHE_TTL = int(os.environ.get('THUMBNAIL_CACHE_TTL', 7 * 86400))
+# Cache-Control enviado aos clientes/CDN
+THUMBNAIL_MAX_AGE = int(os.environ.get('THUMBNAIL_MAX_AGE', 86400))
+thumbnail_store = ThumbnailStore(THUMBNAIL_DIR, FFMPEG_BIN, max_age=THUMBNAIL_CACHE_TTL)
+
+# Arquivos compactados (vários vídeos/formatos em uma resposta)
+MAX_ARCHIVE_ITEMS = int(os.environ.get('MAX_ARCHIVE_ITEMS', 50))
+ARCHIVE_TYPES = {
+    'zip': ('application/zip', stream_zip),
+    'tar': ('application/x-tar', stream_tar),
+}
+
+# Modo cluster (desligado se CLUSTER_NODES/CLUSTER_SELF não estiverem definidos)
+cluster = Cluster.from_env()
+# Header que marca requisições já encaminhadas por outro nó (evita loops)
+CLUSTER_FORWARDED_HEADER = 'X-Cluster-Forwarded-By'
+CLUSTER_PROXY_TIMEOUT = int(os.environ.get('CLUSTER_PROXY_TIMEOUT', 900))
+HOP_BY_HOP_HEADERS = {
+    'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization',
+    'te', 'trailers', 'transfer-encoding', 'upgrade', 'host'
+}
+
+# Por quanto tempo o estado de um job fica consultável
+JOB_TTL = max(ARTIFACT_CACHE_TTL, 3600)
+# /jobs/<id>/events: intervalo (s) de leitura do estado, comentário de keep-alive e duração máxima de uma conexão
+# (o cliente reconecta se o job ainda não terminou; cada conexão ocupa uma thread do worker)
+JOB_EVENTS_INTERVAL = float(os.environ.get('JOB_EVENTS_INTERVAL', 0.5))
+JOB_EVENTS_HEARTBEAT = float(os.environ.get('JOB_EVENTS_HEARTBEAT', 15))
+JOB_EVENTS_MAX_DURATION = float(os.environ.get('JOB_EVENTS_MAX_DURATION', 300))
+# Tempo em que os streams originais ficam disponíveis para gerar outros formatos
+SOURCE_CACHE_TTL = int(os.environ.get('SOURCE_CACHE_TTL', ARTIFACT_CACHE_TTL))
+# Por quanto tempo título, duração e formatos de um vídeo são reaproveitados por /formats, /test e /debug
+METADATA_CACHE_TTL = int(os.environ.get('METADATA_CACHE_TTL', 1800))
+# Entradas mantidas em memória por worker; METADATA_CACHE_COMPRESS=1 guarda a tabela de formatos com zlib
+metadata_cache = MetadataCache(
+    state, METADATA_CACHE_TTL,
+    max_entries=int(os.environ.get('METADATA_CACHE_ENTRIES', 1000)),
+    compress=os.environ.get('METADATA_CACHE_COMPRESS', '0') == '1',
+)
+# Respostas JSON a partir deste tamanho (bytes) são comprimidas (brotli se instalado, senão gzip)
+COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', 6))
+# Cache-Control das respostas JSON por endpoint; no-cache = o cliente guarda mas revalida (304 via ETag)
+CACHE_CONTROL = {
+    'home': 'public, max-age=3600',
+    'get_info': 'public, max-age=60',
+    'list_formats': 'public, max-age=60',
+    'estimate_download': 'public, max-age=60',
+    'test_download': 'no-cache',
+    'debug_download': 'no-cache',
+    'status': 'no-cache',
+    'cluster_status': 'no-cache',
+    'warmup_status': 'no-cache',
+    'get_job': 'no-cache',
+    'job_events': 'no-store',
+    'health': 'no-store',
+    'introspect': 'no-store',
+}
+# Teto de duração (s) de uma live repassada ou gravada; nenhuma transmissão prende um worker além disso
+LIVE_MAX_DURATION = int(os.environ.get('LIVE_MAX_DURATION', 1800))
+# Janela gravada por padrão em live=record
+LIVE_RECORD_DURATION = int(os.environ.get('LIVE_RECORD_DURATION', 300))
+# Seleção da variante HLS de uma live: vídeo na melhor qualidade; áudio na menor variante que tenha áudio
+LIVE_FORMATS = {
+    'video': 'best[protocol^=m3u8]/best',
+    'audio': 'bestaudio[protocol^=m3u8]/worst[protocol^=m3u8][acodec!=none]/best',
+}
+
+# Tetos verificados antes de baixar qualquer byte de mídia, pela estimativa feita com os metadados
+# em cache (0 desativa cada um): duração da mídia (s), download da origem e arquivo gerado (MB)
+MAX_MEDIA_DURATION = int(os.environ.get('MAX_MEDIA_DURATION', 4 * 3600))
+MAX_DOWNLOAD_MB = int(os.environ.get('MAX_DOWNLOAD_MB', 4096))
+MAX_OUTPUT_MB = int(os.environ.get('MAX_OUTPUT_MB', 4096))
+# Prazo (s) da extração feita só para estimar; se vencer, o pedido segue sem estimativa.
+# Nunca passa do prazo da etapa de extração nem do TASK_TIMEOUT do pool
+PREFLIGHT_TIMEOUT = int(os.environ.get('PREFLIGHT_TIMEOUT', 10))
+# Links diretos para arquivos de mídia: o extrator genérico não informa duração nem tamanho, então não há o que estimar
+DIRECT_MEDIA_EXTENSIONS = ('.mp4', '.m4a', '.mp3', '.webm', '.mkv', '.mov', '.ogg', '.opus', '.flac', '.wav',
+                           '.ts', '.m3u8')
+
+# Máximo de saídas (bitrates/alturas) geradas por um único FFmpeg em variants=
+MAX_VARIANTS = int(os.environ.get('MAX_VARIANTS', 4))
+
+# Validade do lock de download; se o worker morrer o lock expira sozinho
+DOWNLOAD_LOCK_TTL = int(os.environ.get('DOWNLOAD_LOCK_TTL', 900))
+# Quanto tempo esperar por um download do mesmo vídeo que já está em andamento em outro worker
+DOWNLOAD_LOCK_WAIT = int(os.environ.get('DOWNLOAD_LOCK_WAIT', 600))
+
+# Vídeos com download pendente no journal, atualizado por recover_interrupted_downloads
+pending_video_ids = frozenset()
 
 def cleanup_old_files():
     """Remove arquivos mais antigos que 1 hora"""
@@ -31,38 +283,110 @@ def cleanup_old_files():
         current_time = time.time()
         max_age = 3600  # 1 hora em segundos
         
-        for filename in os.listdir(DOWNLOAD_DIR):
-            filepath = os.path.join(DOWNLOAD_DIR, filename)
-            if os.path.isfile(filepath):
-                file_age = current_time - os.path.getmtime(filepath)
-                if file_age > max_age:
-                    try:
-                        os.remove(filepath)
-                        logger.info(f"Arquivo removido: {filename}")
-                    except Exception as e:
-                        logger.error(f"Erro ao remover arquivo {filename}: {str(e)}")
+        # Arquivos parciais de downloads pendentes no journal serão retomados, não removidos
+        # (a lista vem da thread de manutenção; varrer o journal a cada pedido sairia caro)
+        pending_ids = pending_video_ids
+        
+        for directory in (DOWNLOAD_DIR, SOURCE_DIR):
+            for filename in os.listdir(directory):
+                filepath = os.path.join(directory, filename)
+                if any(video_id in filename for video_id in pending_ids):
+                    continue
+                if os.path.isfile(filepath):
+                    file_age = current_time - os.path.getmtime(filepath)
+                    if file_age > max_age:
+                        try:
+                            os.remove(filepath)
+                            logger.info("Arquivo removido: %s", filename)
+                        except Exception as e:
+                            logger.error("Erro ao remover arquivo %s: %s", filename, e)
     except Exception as e:
-        logger.error(f"Erro na limpeza de arquivos: {str(e)}")
+        logger.error("Erro na limpeza de arquivos: %s", e)
 
 def delete_file_after_delay(filepath, delay=30):
-    """Deleta um arquivo após um delay específico"""
-    def delete_file():
-        time.sleep(delay)
-        try:
-            if os.path.exists(filepath):
-                os.remove(filepath)
-                logger.info(f"Arquivo removido após delay: {os.path.basename(filepath)}")
-        except Exception as e:
-            logger.error(f"Erro ao remover arquivo {filepath}: {str(e)}")
-    
-    thread = threading.Thread(target=delete_file)
-    thread.daemon = True
-    thread.start()
+    """Deleta um arquivo após um delay específico (fila única, sem uma thread por arquivo)"""
+    file_reaper.schedule(filepath, delay)
+
+def set_attachment_headers(response, download_name):
+    """Define o Content-Disposition, com fallback RFC 5987 para nomes não ASCII"""
+    try:
+        download_name.encode('ascii')
+        names = {'filename': download_name}
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize('NFKD', download_name).encode('ascii', 'ignore').decode('ascii')
+        quoted = urllib.parse.quote(download_name, safe="!#$&+-.^_`|~")
+        names = {'filename': simple, 'filename*': f"UTF-8''{quoted}"}
+    response.headers.set('Content-Disposition', 'attachment', **names)
+
+def iter_file_range(f, length, block_size=SENDFILE_BLOCK_SIZE):
+    """Lê até `length` bytes do arquivo em blocos e fecha ao final"""
+    try:
+        while length > 0:
+            chunk = f.read(min(block_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        f.close()
+
+def send_artifact(filepath, download_name=None, mimetype='application/octet-stream'):
+    """Envia um arquivo de DOWNLOAD_DIR sem copiar os bytes pelo Python sempre que possível"""
+    download_name = download_name or os.path.basename(filepath)
+
+    if SERVE_MODE == 'x-sendfile':
+        # O Flask já sabe emitir o header X-Sendfile com USE_X_SENDFILE
+        return send_file(filepath, as_attachment=True, download_name=download_name, mimetype=mimetype)
+
+    if SERVE_MODE == 'x-accel-redirect':
+        # O nginx serve o arquivo a partir da location interna; o worker fica livre na hora
+        relative = os.path.relpath(filepath, DOWNLOAD_DIR).replace(os.sep, '/')
+        response = Response(status=200, mimetype=mimetype)
+        response.headers['X-Accel-Redirect'] = ACCEL_REDIRECT_PREFIX.rstrip('/') + '/' + urllib.parse.quote(relative)
+        set_attachment_headers(response, download_name)
+        return response
+
+    # Modo sendfile: o gunicorn usa os.sendfile quando recebe o seu próprio wsgi.file_wrapper
+    # com o arquivo já posicionado e Content-Length definido, inclusive para requisições Range.
+    f = open(filepath, 'rb')
+    stat = os.fstat(f.fileno())
+    size = stat.st_size
+    status = 200
+    start, length = 0, size
+    # Validador do arquivo entregue: com If-Range, um download retomado só recebe 206 se for o mesmo arquivo
+    etag = f'{stat.st_mtime_ns:x}-{size:x}'
+
+    if request.range is not None and (request.if_range.etag is None or request.if_range.etag == etag):
+        byte_range = request.range.range_for_length(size)
+        if byte_range is None:
+            f.close()
+            response = Response(status=416)
+            response.headers['Content-Range'] = f'bytes */{size}'
+            return response
+        start, stop = byte_range
+        length = stop - start
+        status = 206
+
+    f.seek(start)
+    file_wrapper = request.environ.get('wsgi.file_wrapper')
+    if file_wrapper is not None:
+        body = file_wrapper(f, SENDFILE_BLOCK_SIZE)
+    else:
+        # Servidor sem suporte (ex.: app.run): cópia em blocos respeitando o intervalo
+        body = iter_file_range(f, length)
+    response = Response(body, status=status, mimetype=mimetype, direct_passthrough=True)
+    response.headers['Content-Length'] = str(length)
+    response.headers['Accept-Ranges'] = 'bytes'
+    response.set_etag(etag)
+    if status == 206:
+        response.headers['Content-Range'] = f'bytes {start}-{start + length - 1}/{size}'
+    set_attachment_headers(response, download_name)
+    return response
 
 def clean_youtube_url(url):
     """Limpa a URL do YouTube e extrai apenas o ID do vídeo"""
     try:
-        logger.info(f"Limpando URL: {url}")
+        logger.debug("Limpando URL: %s", url, extra=LOG_SAMPLED)
         
         # Padrões para extrair o ID do vídeo
         patterns = [
@@ -75,179 +399,1490 @@ def clean_youtube_url(url):
             match = re.search(pattern, url)
             if match:
                 video_id = match.group(1)
-                logger.info(f"Encontrou ID: {video_id}")
+                logger.debug("Encontrou ID: %s", video_id, extra=LOG_SAMPLED)
                 # Verificar se o ID tem 10-11 caracteres (padrão do YouTube)
                 if 10 <= len(video_id) <= 11:
                     cleaned_url = f"https://www.youtube.com/watch?v={video_id}"
-                    logger.info(f"URL limpa: {cleaned_url}")
+                    logger.debug("URL limpa: %s", cleaned_url, extra=LOG_SAMPLED)
                     return cleaned_url
         
         # Se não encontrou padrão, tentar parsear a URL
         parsed = urllib.parse.urlparse(url)
         query_params = urllib.parse.parse_qs(parsed.query)
-        logger.info(f"Query params: {query_params}")
+        logger.debug("Query params: %s", query_params, extra=LOG_SAMPLED)
         
         if 'v' in query_params:
             video_id = query_params['v'][0]
-            logger.info(f"ID encontrado via parse: {video_id}")
+            logger.debug("ID encontrado via parse: %s", video_id, extra=LOG_SAMPLED)
             if 10 <= len(video_id) <= 11:
                 cleaned_url = f"https://www.youtube.com/watch?v={video_id}"
-                logger.info(f"URL limpa via parse: {cleaned_url}")
+                logger.debug("URL limpa via parse: %s", cleaned_url, extra=LOG_SAMPLED)
                 return cleaned_url
         
         # Se não encontrou padrão, retorna a URL original
-        logger.info(f"Retornando URL original: {url}")
+        logger.debug("Retornando URL original: %s", url, extra=LOG_SAMPLED)
         return url
     except Exception as e:
-        logger.error(f"Erro ao limpar URL: {str(e)}")
+        logger.error("Erro ao limpar URL: %s", e)
         return url
 
+# Formatos de saída suportados. `format` escolhe o stream baixado da origem (camada de
+# fontes); a saída é gerada localmente pelo FFmpeg. Quando o codec da fonte já está em
+# `copy_codecs`, o FFmpeg só troca o container (stream copy); senão usa `encode`.
+# Só o mp3 sempre paga decode + encode. `presets` troca o `encode` (o balanced) por
+# encoders mais rápidos (fast) ou arquivos menores (small); a cópia de stream não muda.
+FORMAT_PROFILES = {
+    'mp4': {
+        'format': 'best',
+        'ext': 'mp4',
+        'muxer': 'mp4',
+        'video': True,
+        'encode': ['-c:v', 'libx264', '-c:a', 'aac'],
+        'presets': {
+            'fast': ['-c:v', 'libx264', '-preset', 'veryfast', '-c:a', 'aac'],
+            'small': ['-c:v', 'libx264', '-preset', 'slow', '-crf', '28', '-c:a', 'aac', '-b:a', '96k'],
+        },
+    },
+    'mp3': {
+        'format': 'bestaudio/best',
+        'ext': 'mp3',
+        'muxer': 'mp3',
+        'copy_codecs': ('mp3',),
+        'encode': ['-c:a', 'libmp3lame', '-b:a', '192k'],
+        'presets': {
+            # compression_level do LAME: 0 = melhor/mais lento, 9 = mais rápido
+            'fast': ['-c:a', 'libmp3lame', '-b:a', '192k', '-compression_level', '9'],
+            # VBR V6 (~115 kbps em média)
+            'small': ['-c:a', 'libmp3lame', '-q:a', '6'],
+        },
+    },
+    'm4a': {
+        # AAC já vem em m4a/mp4: só cópia do stream
+        'format': 'bestaudio[ext=m4a]/bestaudio[acodec^=mp4a]/bestaudio/best',
+        'ext': 'm4a',
+        'muxer': 'ipod',
+        'copy_codecs': ('mp4a', 'aac'),
+        'encode': ['-c:a', 'aac', '-b:a', '192k'],
+        'presets': {
+            'small': ['-c:a', 'aac', '-b:a', '96k'],
+        },
+    },
+    'opus': {
+        # Opus do webm é copiado para o container .opus sem reencode
+        'format': 'bestaudio[acodec=opus]/bestaudio/best',
+        'ext': 'opus',
+        'muxer': 'opus',
+        'copy_codecs': ('opus',),
+        'encode': ['-c:a', 'libopus', '-b:a', '128k'],
+        'presets': {
+            'fast': ['-c:a', 'libopus', '-b:a', '128k', '-compression_level', '0'],
+            'small': ['-c:a', 'libopus', '-b:a', '64k'],
+        },
+    },
+    'webm-audio': {
+        'format': 'bestaudio[ext=webm]/bestaudio[acodec=opus]/bestaudio/best',
+        'ext': 'webm',
+        'muxer': 'webm',
+        'copy_codecs': ('opus', 'vorbis'),
+        'encode': ['-c:a', 'libopus', '-b:a', '128k'],
+        'presets': {
+            'fast': ['-c:a', 'libopus', '-b:a', '128k', '-compression_level', '0'],
+            'small': ['-c:a', 'libopus', '-b:a', '64k'],
+        },
+    },
+}
+SUPPORTED_FORMATS = list(FORMAT_PROFILES)
+FORMAT_ERROR = 'Formato deve ser ' + ', '.join(SUPPORTED_FORMATS[:-1]) + ' ou ' + SUPPORTED_FORMATS[-1]
+PRESETS = ('fast', 'balanced', 'small')
+DEFAULT_PRESET = 'balanced'
+PRESET_ERROR = 'preset deve ser fast, balanced ou small'
+
+def get_video_id(url):
+    """Retorna o ID do vídeo a partir da URL limpa, ou None se não for do YouTube"""
+    match = re.search(r'youtube\.com/watch\?v=([a-zA-Z0-9_-]{10,11})$', clean_youtube_url(url))
+    return match.group(1) if match else None
+
+def parse_time(value):
+    """Converte '90', '1:30' ou '01:02:03.5' em segundos"""
+    seconds = 0.0
+    for part in str(value).strip().split(':'):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+def parse_clip(start, end):
+    """Valida os parâmetros start/end e retorna [início, fim] (fim None = até o final) ou None"""
+    if start in (None, '') and end in (None, ''):
+        return None
+    try:
+        start = parse_time(start) if start not in (None, '') else 0.0
+        end = parse_time(end) if end not in (None, '') else None
+    except ValueError:
+        raise ValueError('start/end devem ser segundos ou HH:MM:SS')
+    if start < 0 or (end is not None and end <= start):
+        raise ValueError('Intervalo inválido: end deve ser maior que start')
+    return [start, end]
+
+def clip_label(clip):
+    """Sufixo legível do trecho para nomes de arquivo e chaves de cache"""
+    start, end = clip
+    return f"{start:g}-{end:g}" if end is not None else f"{start:g}-fim"
+
+def parse_preset(value):
+    """Valida o preset de encode (vazio = balanced)"""
+    if value in (None, ''):
+        return DEFAULT_PRESET
+    if value not in PRESETS:
+        raise ValueError(PRESET_ERROR)
+    return value
+
+def bind_socket_timeout(ydl, deadline):
+    """socket_timeout do yt-dlp = o que resta do prazo: um socket travado não passa do prazo da etapa"""
+    remaining = deadline.remaining()
+    if ydl is None or remaining is None:
+        return
+    ydl.params['socket_timeout'] = max(remaining, 1)
+    # Os handlers de rede guardam o timeout de quando foram criados; recria-os (como faz o YoutubeDL.close)
+    if '_request_director' in ydl.__dict__:
+        ydl._request_director.close()
+        del ydl._request_director
+
+# Erros do yt-dlp causados por algo local (pós-processamento, disco), não pela origem
+LOCAL_ERRORS = (yt_dlp.utils.PostProcessingError, FileNotFoundError, FileExistsError, PermissionError,
+                IsADirectoryError, NotADirectoryError)
+
+def is_upstream_error(error):
+    """Erro vindo da origem (extração, HTTP, rede): o único que conta para o breaker e vale nova tentativa"""
+    if upstream_status(error) is not None:
+        return True
+    cause = error
+    if isinstance(error, yt_dlp.utils.DownloadError) and getattr(error, 'exc_info', None):
+        cause = error.exc_info[1]
+    if isinstance(cause, LOCAL_ERRORS):
+        return False
+    return isinstance(error, yt_dlp.utils.DownloadError) or isinstance(cause, (
+        yt_dlp.utils.ExtractorError, yt_dlp.networking.exceptions.RequestError, TimeoutError, ConnectionError))
+
+def record_upstream_result(error=None):
+    """Registra no breaker o resultado de uma chamada à origem; erro local só libera o teste do meio-aberto"""
+    if error is None or is_upstream_error(error):
+        upstream_breaker.record(error)
+    else:
+        upstream_breaker.release()
+
+def call_upstream(func, deadline, ydl=None):
+    """Chama a origem através do circuit breaker, com retries e backoff dentro do prazo da etapa"""
+    def attempt():
+        # Nos filhos do pool o breaker é o do processo pai (run_task); o do filho se perderia a cada reciclagem
+        if not TASK_WORKER:
+            upstream_breaker.allow()
+        bind_socket_timeout(ydl, deadline)
+        try:
+            result = func()
+        except Exception as e:
+            # Falha local (lock, FFmpeg, disco) não diz nada sobre a origem: sem breaker e sem retry
+            if not TASK_WORKER:
+                record_upstream_result(e)
+            raise
+        if not TASK_WORKER:
+            record_upstream_result()
+        return result
+    return retry_with_backoff(attempt, UPSTREAM_RETRIES, RETRY_BACKOFF_BASE, RETRY_BACKOFF_CAP, deadline,
+                              retryable=lambda e: is_upstream_error(e) and is_retryable(e))
+
+def run_task(func_name, args, timeout=None):
+    """Executa uma tarefa da origem no pool, com o breaker do processo pai (o que o /health mostra)"""
+    upstream_breaker.allow()
+    try:
+        result = task_pool.run(func_name, args, timeout=timeout)
+    except Exception as e:
+        record_upstream_result(e)
+        raise
+    record_upstream_result()
+    return result
+
 def get_video_info(url):
-    """Obtém informações do vídeo sem fazer download"""
+    """Obtém informações do vídeo sem fazer download; retorna (info, registro de metadados)"""
     try:
-        # Limpar a URL primeiro
-        clean_url = clean_youtube_url(url)
-        
-        ydl_opts = {
-            'quiet': True,
-            'no_warnings': True,
-            'extract_flat': True,
-            'ignoreerrors': True,
-            'nocheckcertificate': True,
-            'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'http_headers': {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-                'Accept-Language': 'en-us,en;q=0.5',
-                'Sec-Fetch-Mode': 'navigate',
-            },
-        }
+        metadata = get_video_metadata(url)
         
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(clean_url, download=False)
+        # Verificar se info é None
+        if metadata is None:
+            logger.error("Não foi possível extrair informações do vídeo")
+            return None, None
             
-            # Verificar se info é None
-            if info is None:
-                logger.error("Não foi possível extrair informações do vídeo")
-                return None
-                
-            return {
-                'title': info.get('title', 'Unknown'),
-                'duration': info.get('duration', 0),
-                'thumbnail': info.get('thumbnail', ''),
-                'formats': []
-            }
+        return {
+            'title': metadata.title,
+            'duration': metadata.duration,
+            'thumbnail': metadata.thumbnail,
+            'live_status': metadata.live_status,
+            'release_timestamp': metadata.release_timestamp,
+            # Variantes servidas por /thumbnail, bem menores que a original
+            'thumbnails': {
+                size: f"/thumbnail/{metadata.id}?size={size}" for size in THUMBNAIL_SIZES
+            } if VIDEO_ID_RE.match(metadata.id or '') else {},
+            'formats': []
+        }, metadata
+    except CircuitOpen:
+        raise
     except Exception as e:
-        logger.error(f"Erro ao obter informações do vídeo: {str(e)}")
+        logger.error("Erro ao obter informações do vídeo: %s", e)
+        return None, None
+
+def metadata_response(payload, metadata):
+    """JSON montado a partir de um registro de metadados: o ETag vem da versão do registro + parâmetros"""
+    response = jsonify(payload)
+    response.set_etag(f"{metadata.version}-{hashlib.sha1(request.full_path.encode()).hexdigest()[:8]}")
+    return response
+
+def extract_metadata(clean_url, timeout=None):
+    """Extrai os metadados na origem e retorna só o registro compacto (no pool, com EXECUTION_MODE=subprocess)"""
+    if task_pool is not None:
+        # Com timeout explícito (pre-flight) o processo é morto no próprio prazo, sem a folga da extração normal
+        pool_timeout = timeout or (EXTRACT_DEADLINE + 30 if EXTRACT_DEADLINE else None)
+        return run_task('extract_metadata', (clean_url, timeout), timeout=pool_timeout)
+
+    ydl_opts = {
+        'quiet': True,
+        'no_warnings': True,
+        'logger': ytdlp_logger,
+        'ignoreerrors': False,
+        'nocheckcertificate': True,
+        **YTDLP_NO_RETRIES,
+        'ignore_no_formats_error': True,  # estreias ainda não têm formatos
+        'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+        'http_headers': {
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+            'Accept-Language': 'en-us,en;q=0.5',
+            'Sec-Fetch-Mode': 'navigate',
+        },
+    }
+    with CachingYoutubeDL(ydl_opts) as ydl:
+        info = call_upstream(lambda: ydl.extract_info(clean_url, download=False),
+                             Deadline('extração', timeout or EXTRACT_DEADLINE), ydl)
+    if info is None:
         return None
+    # Só o registro compacto sobrevive; o info completo é descartado aqui
+    return MetadataRecord.from_info(info, metadata_cache.compress)
+
+def get_video_metadata(url, timeout=None):
+    """Título, duração, thumbnail e formatos do vídeo (MetadataRecord), do cache quando possível"""
+    clean_url = clean_youtube_url(url)
+    key = get_video_id(url) or hashlib.sha1(clean_url.encode()).hexdigest()
+    record = metadata_cache.get(key, time.time())
+    if record:
+        return record
+    record = extract_metadata(clean_url, timeout)
+    if record is None:
+        return None
+    return metadata_cache.put_record(key, record, time.time())
+
+def select_format(formats, profile):
+    """Formato que o seletor do yt-dlp escolheria para o perfil, a partir dos formatos em cache"""
+    with CachingYoutubeDL({'quiet': True, 'logger': ytdlp_logger}) as ydl:
+        selector = ydl.build_format_selector(profile['format'])
+        return next(iter(selector({
+            'formats': formats,
+            'has_merged_format': any(f.get('vcodec') != 'none' and f.get('acodec') != 'none' for f in formats),
+            'incomplete_formats': False,
+        })), None)
 
-def download_video(url, format_type='mp4'):
-    """Faz o download do vídeo no formato especificado"""
+def estimate_request(metadata, format_type, clip=None, preset=DEFAULT_PRESET, variants=None):
+    """Bytes baixados, bytes gerados e CPU estimados de um pedido; None se nenhum formato servir"""
+    profile = FORMAT_PROFILES[format_type]
+    selected = select_format(metadata.formats, profile)
+    if selected is None:
+        return None
+    args = build_output_args(profile, selected, preset)
+    return preflight.estimate(selected, metadata.duration, args, clip, preset, variants, bool(profile.get('video')))
+
+def estimate_fits(estimate):
+    """Mensagem do teto excedido pela estimativa, ou None"""
+    return preflight.exceeded(estimate, MAX_MEDIA_DURATION, MAX_DOWNLOAD_MB * 1024 ** 2, MAX_OUTPUT_MB * 1024 ** 2)
+
+def estimate_alternatives(metadata, clip=None, preset=DEFAULT_PRESET):
+    """Estimativa de todos os formatos (mesmo trecho e preset), para o cliente escolher um mais leve"""
+    alternatives = []
+    for format_type in SUPPORTED_FORMATS:
+        estimate = estimate_request(metadata, format_type, clip, preset)
+        if estimate:
+            alternatives.append(dict(estimate, format=format_type, fits=estimate_fits(estimate) is None))
+    return alternatives
+
+def preflight_budget():
+    """Prazo da extração do pre-flight: PREFLIGHT_TIMEOUT limitado pelo prazo da extração e pelo do pool"""
+    limits = [PREFLIGHT_TIMEOUT, EXTRACT_DEADLINE, TASK_TIMEOUT if task_pool is not None else 0]
+    return min(limit for limit in limits if limit > 0) if any(limit > 0 for limit in limits) else None
+
+def is_direct_media(url):
+    """True para links diretos a um arquivo de mídia (sem metadados estimáveis)"""
+    return urllib.parse.urlparse(url).path.lower().endswith(DIRECT_MEDIA_EXTENSIONS)
+
+def check_preflight(url, format_type, clip=None, preset=DEFAULT_PRESET, variants=None):
+    """Estima o pedido pelos metadados e levanta PreflightRejected se passar de um teto, antes de baixar mídia"""
+    if not (MAX_MEDIA_DURATION or MAX_DOWNLOAD_MB or MAX_OUTPUT_MB) or is_direct_media(url):
+        return None
     try:
-        # Limpar a URL primeiro
-        clean_url = clean_youtube_url(url)
+        # Prazo curto e próprio: um pre-flight lento não pode consumir o prazo do download que ele protege
+        metadata = get_video_metadata(url, preflight_budget())
+    except CircuitOpen:
+        raise
+    except Exception as e:
+        # Sem metadados não há como estimar; o download segue e falha (ou não) pelo caminho normal
+        logger.warning("Pre-flight sem metadados para %s: %s", url, e)
+        return None
+    if metadata is None or metadata.live_status in LIVE_STATUSES:
+        return None
+    estimate = estimate_request(metadata, format_type, clip, preset, variants)
+    problem = estimate_fits(estimate) if estimate else None
+    if problem:
+        logger.info("Pre-flight recusou %s (%s): %s", url, format_type, problem)
+        raise PreflightRejected(problem, estimate, [alternative for alternative in estimate_alternatives(metadata, clip, preset)
+                                                    if alternative['fits']])
+    return estimate
+
+def preflight_error(error):
+    """Resposta 413 com a estimativa e os formatos que cabem nos limites"""
+    return jsonify({'error': str(error), 'estimate': error.estimate, 'alternatives': error.alternatives}), error.status
+
+def register_source(video_id, title, source):
+    """Registra um stream baixado no índice da camada de fontes"""
+    lock_name = f'sources:{video_id}'
+    token = None
+    for _ in range(50):
+        token = state.acquire_lock(lock_name, 30)
+        if token:
+            break
+        time.sleep(0.1)
+    try:
+        record = state.get('sources', video_id) or {'title': title, 'formats': {}}
+        record['formats'][source['format_id']] = source
+        state.set('sources', video_id, record, ttl=SOURCE_CACHE_TTL)
+    finally:
+        if token:
+            state.release_lock(lock_name, token)
+
+def find_cached_source(video_id, profile, clip=None):
+    """Procura uma fonte já baixada que sirva para o formato pedido, preferindo as que permitem stream copy"""
+    record = state.get('sources', video_id)
+    if not record:
+        return None
+    
+    candidates = []
+    for source in record['formats'].values():
+        if not os.path.exists(source['path']):
+            continue
+        # Uma fonte parcial só serve para exatamente o mesmo trecho
+        if source.get('section') and source['section'] != clip:
+            continue
+        if source.get('acodec') == 'none':
+            continue
+        if profile.get('video') and source.get('vcodec') == 'none':
+            continue
+        candidates.append(source)
+    
+    if not candidates:
+        return None
+    
+    # Fontes copiáveis primeiro; entre elas, a menor (normalmente a só de áudio)
+    candidates.sort(key=lambda source: (build_output_args(profile, source) not in (None, ['-vn', '-c:a', 'copy']),
+                                        not source.get('section'),
+                                        os.path.getsize(source['path'])))
+    return record['title'], candidates[0]
+
+def wait_for_lock(lock_name):
+    """Adquire o lock esperando até DOWNLOAD_LOCK_WAIT enquanto outro pedido o segura; retorna o token"""
+    deadline = time.time() + DOWNLOAD_LOCK_WAIT
+    token = state.acquire_lock(lock_name, DOWNLOAD_LOCK_TTL)
+    while token is None:
+        if time.time() > deadline:
+            raise Exception("Tempo esgotado aguardando download em andamento")
+        time.sleep(1)
+        token = state.acquire_lock(lock_name, DOWNLOAD_LOCK_TTL)
+    return token
+
+class SourceLock(yt_dlp.postprocessor.PostProcessor):
+    """Trava a fonte (id + format_id) entre pedidos e workers, já com o formato escolhido e antes do download"""
+
+    def __init__(self, clip=None):
+        super().__init__()
+        self.clip = clip
+        self.held = {}
+
+    def run(self, info):
+        # mp3 e m4a podem escolher o mesmo format_id e gravariam juntos o mesmo .part
+        name = f"source:{info['id']}:{info.get('format_id')}"
+        if self.clip:
+            name += '.' + clip_label(self.clip)
+        if name in self.held:  # nova tentativa do call_upstream: o lock já é nosso
+            return [], info
+        self.held[name] = wait_for_lock(name)
+        task_pool_module.hold_lock(name, self.held[name])  # se o filho for morto, o pai libera
+        # Se outro pedido terminou a fonte enquanto esperávamos, o yt-dlp encontra o arquivo
+        # final e não baixa de novo (a checagem dele vem depois desta etapa, e fetch_source não força overwrites)
+        return [], info
+
+    def release(self):
+        for name, token in self.held.items():
+            state.release_lock(name, token)
+            task_pool_module.drop_lock(name)
+        self.held.clear()
+
+def fetch_source(clean_url, profile, clip=None):
+    """Baixa da origem apenas o stream de mídia (ou só o trecho pedido), sem pós-processamento"""
+    ydl_opts = {
+        'format': profile['format'],
+        'outtmpl': os.path.join(SOURCE_DIR, '%(id)s.%(format_id)s.%(ext)s'),
+        'quiet': True,
+        'no_warnings': False,
+        'logger': ytdlp_logger,
+        'extract_flat': False,
+        'ignoreerrors': False,
+        'nocheckcertificate': True,
+        'prefer_ffmpeg': True,
+        # Sem 'overwrites': uma fonte completa que outro pedido terminou enquanto este aguardava o
+        # SourceLock é reaproveitada; o arquivo final só existe depois do rename do .part
+        'continuedl': True,  # retoma arquivos .part após restart
+        **YTDLP_NO_RETRIES,
+        # Fragmento perdido vira erro, repetido pelo call_upstream retomando o .part, e não um buraco no arquivo
+        'skip_unavailable_fragments': False,
+        'ignore_no_formats_error': True,  # estreias ainda sem formatos chegam até a checagem de live
+        'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+        'http_headers': {
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+            'Accept-Language': 'en-us,en;q=0.5',
+            'Sec-Fetch-Mode': 'navigate',
+        },
+    }
+    if clip:
+        # Baixa só os fragmentos/bytes do trecho; o corte é feito por stream copy
+        # a partir do keyframe anterior ao início, sem reencode
+        ydl_opts['download_ranges'] = yt_dlp.utils.download_range_func(
+            None, [(clip[0], clip[1] if clip[1] is not None else float('inf'))])
+        ydl_opts['force_keyframes_at_cuts'] = False
+        ydl_opts['outtmpl'] = os.path.join(SOURCE_DIR, f'%(id)s.%(format_id)s.{clip_label(clip)}.%(ext)s')
+    
+    # O prazo do download é verificado a cada bloco recebido
+    ydl_opts['progress_hooks'] = [lambda progress: download_deadline.check()]
+    
+    source_lock = SourceLock(clip)
+    with CachingYoutubeDL(ydl_opts) as ydl:
+        ydl.add_post_processor(source_lock, when='before_dl')
+        # Metadados e mídia em etapas separadas, cada uma com seu prazo e retries
+        info = call_upstream(lambda: ydl.extract_info(clean_url, download=False, process=False),
+                             Deadline('extração', EXTRACT_DEADLINE), ydl)
+        # Live ou estreia no fluxo de VOD prenderia o worker até o fim da transmissão
+        check_not_live(info)
+        download_deadline = Deadline('download', DOWNLOAD_DEADLINE)
+        try:
+            info = call_upstream(lambda: ydl.process_ie_result(info, download=True), download_deadline, ydl)
+        finally:
+            source_lock.release()
         
-        # Configurações baseadas no formato
-        if format_type == 'mp3':
-            ydl_opts = {
-                'format': 'bestaudio/best',
-                'postprocessors': [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'mp3',
-                    'preferredquality': '192',
-                }],
-                'outtmpl': os.path.join(DOWNLOAD_DIR, '%(title)s.%(ext)s'),
-                'quiet': False,
-                'no_warnings': False,
-                'extract_flat': False,
-                'ignoreerrors': True,
-                'nocheckcertificate': True,
-                'prefer_ffmpeg': True,
-                'nooverwrites': False,
-                'retries': 3,
-                'fragment_retries': 3,
-                'skip_unavailable_fragments': True,
-                'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-                'http_headers': {
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-                    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-                    'Accept-Language': 'en-us,en;q=0.5',
-                    'Sec-Fetch-Mode': 'navigate',
-                },
-            }
-        elif format_type == 'mp4':
-            ydl_opts = {
-                'format': 'best',
-                'outtmpl': os.path.join(DOWNLOAD_DIR, '%(title)s.%(ext)s'),
-                'quiet': False,
-                'no_warnings': False,
-                'extract_flat': False,
-                'ignoreerrors': True,
-                'nocheckcertificate': True,
-                'prefer_ffmpeg': True,
-                'nooverwrites': False,
-                'retries': 3,
-                'fragment_retries': 3,
-                'skip_unavailable_fragments': True,
-                'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-                'http_headers': {
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-                    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-                    'Accept-Language': 'en-us,en;q=0.5',
-                    'Sec-Fetch-Mode': 'navigate',
-                },
-            }
-        else:
-            ydl_opts = {
-                'format': 'best',
-                'outtmpl': os.path.join(DOWNLOAD_DIR, '%(title)s.%(ext)s'),
-                'quiet': False,
-                'no_warnings': False,
-                'extract_flat': False,
-                'ignoreerrors': True,
-                'nocheckcertificate': True,
-                'prefer_ffmpeg': True,
-                'nooverwrites': False,
-                'retries': 3,
-                'fragment_retries': 3,
-                'skip_unavailable_fragments': True,
-                'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-                'http_headers': {
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-                    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-                    'Accept-Language': 'en-us,en;q=0.5',
-                    'Sec-Fetch-Mode': 'navigate',
-                },
-            }
+        # Verificar se info é None após o download
+        if info is None:
+            raise Exception("Erro durante o download do vídeo")
         
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            # Fazer o download diretamente sem verificar formatos primeiro
-            info = ydl.extract_info(clean_url, download=True)
-            
-            # Verificar se info é None após o download
-            if info is None:
-                raise Exception("Erro durante o download do vídeo")
-            
-            filename = ydl.prepare_filename(info)
-            
-            # Para MP3, o arquivo final terá extensão .mp3
-            if format_type == 'mp3':
-                filename = filename.rsplit('.', 1)[0] + '.mp3'
-            
-            # Verificar se o arquivo foi realmente criado
-            if not os.path.exists(filename):
-                raise Exception("Arquivo não foi criado após o download")
-            
-            # Verificar se o arquivo tem tamanho > 0
-            if os.path.getsize(filename) == 0:
-                raise Exception("Arquivo baixado está vazio")
-            
-            return filename
+        requested = info.get('requested_downloads') or [{}]
+        filename = requested[0].get('filepath') or ydl.prepare_filename(info)
+    
+    # Verificar se o arquivo foi realmente criado
+    if not os.path.exists(filename):
+        raise Exception("Arquivo não foi criado após o download")
+    
+    # Verificar se o arquivo tem tamanho > 0
+    if os.path.getsize(filename) == 0:
+        raise Exception("Arquivo baixado está vazio")
+    
+    source = {
+        'path': filename,
+        'format_id': str(info.get('format_id') or 'default'),
+        'ext': info.get('ext'),
+        'acodec': info.get('acodec'),
+        'vcodec': info.get('vcodec'),
+    }
+    if clip:
+        source['format_id'] += '.' + clip_label(clip)
+        source['section'] = clip
+    title = info.get('title') or info['id']
+    # Com o cache desligado a fonte é apagada logo após o uso: registrá-la (ttl=0 = sem validade) deixaria entradas eternas
+    if SOURCE_CACHE_TTL > 0:
+        register_source(info['id'], title, source)
+    return info['id'], title, source
+
+def encode_args(profile, preset=DEFAULT_PRESET):
+    """Argumentos de encode do formato no preset pedido"""
+    return profile.get('presets', {}).get(preset, profile['encode'])
+
+def build_output_args(profile, source, preset=DEFAULT_PRESET):
+    """Argumentos do FFmpeg para gerar a saída a partir da fonte (None = a própria fonte serve)"""
+    if profile.get('video'):
+        if source.get('ext') == profile['ext']:
+            return None
+        return ['-c', 'copy']
+    acodec = (source.get('acodec') or '').lower()
+    if any(acodec.startswith(codec) for codec in profile['copy_codecs']):
+        return ['-vn', '-c:a', 'copy']
+    return ['-vn'] + encode_args(profile, preset)
+
+def run_ffmpeg_outputs(input_path, outputs, input_args=(), filter_graph=None):
+    """Executa um FFmpeg com uma ou mais saídas [(caminho, args, muxer)], via temporários renomeados ao final"""
+    command = [FFMPEG_BIN, '-y', '-hide_banner', '-loglevel', 'error'] + list(input_args) + ['-i', input_path]
+    if filter_graph:
+        command += ['-filter_complex', filter_graph]
+    for output_path, args, muxer in outputs:
+        command += list(args) + ['-f', muxer, output_path + '.tmp']
+    
+    def discard_temps():
+        for output_path, _, _ in outputs:
+            if os.path.exists(output_path + '.tmp'):
+                os.remove(output_path + '.tmp')
+    
+    try:
+        result = subprocess.run(command, capture_output=True, text=True, timeout=CONVERT_DEADLINE or None)
+    except subprocess.TimeoutExpired:
+        discard_temps()
+        raise DeadlineExceeded('conversão', CONVERT_DEADLINE)
+    if result.returncode != 0:
+        discard_temps()
+        raise Exception(f"Erro no FFmpeg: {result.stderr.strip()[-500:]}")
+    for output_path, _, _ in outputs:
+        os.replace(output_path + '.tmp', output_path)
+
+def run_ffmpeg(input_path, output_path, args, muxer, input_args=()):
+    """Executa o FFmpeg gravando em arquivo temporário e renomeando ao final"""
+    run_ffmpeg_outputs(input_path, [(output_path, args, muxer)], input_args)
+
+def clip_input_args(clip, source):
+    """Argumentos de corte antes do -i quando a fonte é completa e o pedido é de um trecho"""
+    # Com -ss antes do -i o stream copy começa no keyframe anterior; no reencode o corte é exato
+    if not clip or source.get('section'):
+        return []
+    input_args = ['-ss', str(clip[0])]
+    if clip[1] is not None:
+        input_args += ['-to', str(clip[1])]
+    return input_args
+
+def derive_output(video_id, title, source, format_type, clip=None, preset=DEFAULT_PRESET):
+    """Gera (ou reaproveita) a saída derivada de uma fonte, indexada por fonte + parâmetros"""
+    profile = FORMAT_PROFILES[format_type]
+    args = build_output_args(profile, source, preset)
+    
+    # Fonte completa e pedido de trecho: corta localmente
+    input_args = clip_input_args(clip, source)
+    if input_args and args is None:
+        args = ['-c', 'copy']
+    
+    # O preset só diferencia saídas que podem passar por um encoder (no vídeo, o reencode de fallback)
+    tagged = preset != DEFAULT_PRESET and args not in (None, ['-vn', '-c:a', 'copy'])
+    output_key = hashlib.sha1(
+        f"{video_id}.{source['format_id']}|{format_type}|{input_args}|{args}{'|' + preset if tagged else ''}".encode()
+    ).hexdigest()
+    record = state.get('outputs', output_key)
+    if record and os.path.exists(record['path']):
+        return record['path']
+    
+    suffix = f" ({clip_label(clip)})" if clip else ''
+    if tagged:
+        suffix += f" ({preset})"
+    output_path = os.path.join(DOWNLOAD_DIR, f"{yt_dlp.utils.sanitize_filename(title)} [{video_id}]{suffix}.{profile['ext']}")
+    if args is None:
+        # A fonte já está no formato final: hardlink evita copiar os bytes
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        try:
+            os.link(source['path'], output_path)
+        except OSError:
+            shutil.copyfile(source['path'], output_path)
+    else:
+        try:
+            run_ffmpeg(source['path'], output_path, args, profile['muxer'], input_args)
+        except Exception:
+            if profile.get('video') and args == ['-c', 'copy']:
+                # Codecs incompatíveis com o container: reencode
+                run_ffmpeg(source['path'], output_path, encode_args(profile, preset), profile['muxer'], input_args)
+            else:
+                raise
+    
+    if os.path.getsize(output_path) == 0:
+        raise Exception("Arquivo gerado está vazio")
+    
+    state.set('outputs', output_key, {'path': output_path, 'created_at': time.time()}, ttl=ARTIFACT_CACHE_TTL or None)
+    return output_path
+
+def resolve_source(url, profile, format_type, clip=None):
+    """Fonte local já baixada para o vídeo ou, se não houver, baixada da origem: (video_id, título, fonte)"""
+    if task_pool is not None:
+        return run_task('resolve_source', (url, profile, format_type, clip))
+    video_id = get_video_id(url)
+    cached = find_cached_source(video_id, profile, clip) if video_id else None
+    if cached:
+        title, source = cached
+        logger.info("Reaproveitando fonte %s.%s para %s", video_id, source['format_id'], format_type)
+        return video_id, title, source
+    return fetch_source(clean_youtube_url(url), profile, clip)
+
+def download_video(url, format_type='mp4', clip=None, preset=DEFAULT_PRESET):
+    """Faz o download do vídeo (ou só do trecho clip=[início, fim]) no formato especificado"""
+    if task_pool is not None:
+        # Extração, download e FFmpeg num processo filho; o worker só espera o caminho do arquivo
+        return run_task('download_video', (url, format_type, clip, preset))
+    try:
+        profile = FORMAT_PROFILES.get(format_type, FORMAT_PROFILES['mp4'])
+        format_type = format_type if format_type in FORMAT_PROFILES else 'mp4'
+        
+        # Se já existe uma fonte local para este vídeo, gera a saída sem ir à origem
+        video_id, title, source = resolve_source(url, profile, format_type, clip)
+        
+        filename = derive_output(video_id, title, source, format_type, clip, preset)
+        
+        # Sem cache, a fonte não é mantida após gerar a saída
+        if SOURCE_CACHE_TTL <= 0 and os.path.exists(source['path']):
+            os.remove(source['path'])
+        
+        return filename
             
     except Exception as e:
-        logger.error(f"Erro no download: {str(e)}")
+        logger.error("Erro no download: %s", e)
         raise e
 
+def derive_variants(video_id, title, source, format_type, variants, preset=DEFAULT_PRESET, clip=None):
+    """Gera (ou reaproveita) várias saídas da mesma fonte com um único FFmpeg; retorna [(variante, arquivo)]"""
+    profile = FORMAT_PROFILES[format_type]
+    video = bool(profile.get('video'))
+    encode = encode_args(profile, preset)
+    input_args = clip_input_args(clip, source)
+    # No vídeo o áudio AAC da fonte serve para todas as alturas
+    copy_audio = video and (source.get('acodec') or '').lower().startswith('mp4a')
+    
+    base = f"{yt_dlp.utils.sanitize_filename(title)} [{video_id}]" + (f" ({clip_label(clip)})" if clip else '')
+    if preset != DEFAULT_PRESET:
+        # Os argumentos do encoder mudam com o preset: o nome também, senão um preset sobrescreve o outro
+        base += f" ({preset})"
+    paths = {}
+    pending = []
+    for variant in variants:
+        args = variant_encode_args(encode, variant, video, copy_audio)
+        output_key = hashlib.sha1(
+            f"{video_id}.{source['format_id']}|{format_type}|{input_args}|{variant}|{args}".encode()
+        ).hexdigest()
+        record = state.get('outputs', output_key)
+        if record and os.path.exists(record['path']):
+            paths[variant] = record['path']
+        else:
+            output_path = os.path.join(DOWNLOAD_DIR, f"{base} ({variant}).{profile['ext']}")
+            pending.append((variant, output_key, output_path))
+    
+    # Um lock por saída (em ordem fixa, sem deadlock entre pedidos com conjuntos que se cruzam);
+    # depois de adquirir, as que outro pedido gerou enquanto esperávamos saem da lista
+    held = []
+    try:
+        for _, output_key, _ in sorted(pending, key=lambda item: item[1]):
+            held.append((f'outputs:{output_key}', wait_for_lock(f'outputs:{output_key}')))
+        still_pending = []
+        for variant, output_key, output_path in pending:
+            record = state.get('outputs', output_key)
+            if record and os.path.exists(record['path']):
+                paths[variant] = record['path']
+            else:
+                still_pending.append((variant, output_key, output_path))
+        if still_pending:
+            # Só as variantes que faltam entram no comando: uma leitura e um decode da fonte para todas
+            filter_graph, outputs_args = plan_variants(encode, [variant for variant, _, _ in still_pending], video,
+                                                       copy_audio)
+            start = time.time()
+            run_ffmpeg_outputs(source['path'], [(output_path, args, profile['muxer'])
+                                                for (_, _, output_path), args in zip(still_pending, outputs_args)],
+                               input_args, filter_graph)
+            logger.info("%d variantes de %s (%s) geradas em %.1fs", len(still_pending), video_id, format_type,
+                        time.time() - start)
+            for variant, output_key, output_path in still_pending:
+                if os.path.getsize(output_path) == 0:
+                    raise Exception("Arquivo gerado está vazio")
+                state.set('outputs', output_key, {'path': output_path, 'created_at': time.time()},
+                          ttl=ARTIFACT_CACHE_TTL or None)
+                paths[variant] = output_path
+    finally:
+        for lock_name, token in held:
+            state.release_lock(lock_name, token)
+    return [(variant, paths[variant]) for variant in variants]
+
+def variants_download(url, format_type, variants, preset=DEFAULT_PRESET, clip=None):
+    """Gera as variantes pedidas e entrega o arquivo (uma variante) ou um zip com todas"""
+    profile = FORMAT_PROFILES[format_type]
+    check_preflight(url, format_type, clip, preset, variants)
+    cleanup_old_files()
+    with admission.slot():
+        video_id, title, source = resolve_source(url, profile, format_type, clip)
+        outputs = derive_variants(video_id, title, source, format_type, variants, preset, clip)
+    if SOURCE_CACHE_TTL <= 0 and os.path.exists(source['path']):
+        os.remove(source['path'])
+    if ARTIFACT_CACHE_TTL <= 0:
+        for _, filename in outputs:
+            delete_file_after_delay(filename, 30)
+    
+    if len(outputs) == 1:
+        return deliver_artifact(outputs[0][1])
+    entries = [(os.path.basename(filename), filename) for _, filename in outputs]
+    response = Response(stream_zip(entries), mimetype='application/zip', direct_passthrough=True)
+    set_attachment_headers(response, os.path.basename(outputs[0][1]).rsplit(' (', 1)[0] + '.zip')
+    return response
+
+def parse_live_duration(mode, value):
+    """Duração pedida para o modo ao vivo, sempre limitada por LIVE_MAX_DURATION"""
+    if value in (None, ''):
+        duration = LIVE_MAX_DURATION if mode == 'stream' else LIVE_RECORD_DURATION
+    else:
+        try:
+            duration = parse_time(value)
+        except ValueError:
+            raise ValueError('duration deve ser segundos ou HH:MM:SS')
+        if duration <= 0:
+            raise ValueError('duration deve ser maior que zero')
+    return min(duration, LIVE_MAX_DURATION)
+
+def resolve_live(url, profile):
+    """Extrai a live e retorna o info da variante HLS escolhida (com a URL da playlist)"""
+    ydl_opts = {
+        'format': LIVE_FORMATS['video' if profile.get('video') else 'audio'],
+        'quiet': True,
+        'no_warnings': True,
+        'logger': ytdlp_logger,
+        'ignoreerrors': False,
+        'ignore_no_formats_error': True,
+        'nocheckcertificate': True,
+        **YTDLP_NO_RETRIES,
+    }
+    with CachingYoutubeDL(ydl_opts) as ydl:
+        info = call_upstream(lambda: ydl.extract_info(clean_youtube_url(url), download=False),
+                             Deadline('extração', EXTRACT_DEADLINE), ydl)
+    if info is None:
+        raise Exception("Não foi possível extrair informações da transmissão")
+    live_status = info.get('live_status') or ('is_live' if info.get('is_live') else None)
+    if live_status == 'is_upcoming':
+        raise LiveStreamError(live_status, info.get('release_timestamp'))
+    if live_status != 'is_live':
+        raise LiveModeUnavailable(live_status, 'Não é uma transmissão ao vivo; use o download normal')
+    if not str(info.get('protocol', '')).startswith('m3u8'):
+        raise LiveModeUnavailable(live_status, 'Só transmissões HLS são suportadas no modo ao vivo')
+    return info
+
+def live_output_args(profile, info):
+    """Argumentos do FFmpeg para gerar o formato pedido a partir dos segmentos da live"""
+    if profile.get('video'):
+        return ['-c', 'copy']
+    return build_output_args(profile, {'acodec': info.get('acodec')})
+
+def transcode_stream(chunks, args, muxer):
+    """Passa os segmentos por um FFmpeg em pipe, produzindo a saída enquanto a live chega"""
+    if muxer in ('mp4', 'ipod'):
+        # MP4 em pipe precisa ser fragmentado (o moov não pode ficar no fim)
+        args = args + ['-movflags', 'frag_keyframe+empty_moov']
+    command = [FFMPEG_BIN, '-hide_banner', '-loglevel', 'error', '-i', 'pipe:0'] + args + ['-f', muxer, 'pipe:1']
+    process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+    def feed():
+        try:
+            for chunk in chunks:
+                process.stdin.write(chunk)
+        except (BrokenPipeError, ValueError):
+            pass
+        except Exception as e:
+            logger.error("Erro lendo segmentos da live: %s", e)
+        finally:
+            try:
+                process.stdin.close()
+            except OSError:
+                pass
+
+    feeder = threading.Thread(target=feed, daemon=True)
+    feeder.start()
+    try:
+        while True:
+            data = process.stdout.read(64 * 1024)
+            if not data:
+                break
+            yield data
+    finally:
+        if process.poll() is None:
+            process.kill()
+        process.wait()
+        feeder.join(timeout=5)
+
+def stream_live(reader, info, format_type):
+    """Resposta que repassa a live ao cliente conforme os segmentos aparecem"""
+    profile = FORMAT_PROFILES[format_type]
+    if profile.get('video'):
+        # Segmentos concatenados (MPEG-TS, ou init + fragmentos fMP4) já formam um arquivo válido: sem FFmpeg
+        body, ext = reader.segments(), reader.container
+        mimetype = 'video/mp2t' if ext == 'ts' else 'video/mp4'
+    else:
+        body = transcode_stream(reader.segments(), live_output_args(profile, info), profile['muxer'])
+        ext, mimetype = profile['ext'], 'application/octet-stream'
+
+    def generate():
+        try:
+            with admission.slot():
+                yield from body
+        finally:
+            reader.stop()
+            logger.info("Live %s encerrada: %s segmentos, %.0fs", info.get('id'), reader.stats['segments'],
+                        reader.stats['seconds'])
+
+    response = Response(generate(), mimetype=mimetype, direct_passthrough=True)
+    title = yt_dlp.utils.sanitize_filename(info.get('title') or info.get('id') or 'live')
+    set_attachment_headers(response, f"{title} [{info.get('id')}] (ao vivo).{ext}")
+    response.headers['X-Live-Max-Duration'] = str(int(reader.max_duration))
+    return response
+
+def record_live(reader, info, format_type):
+    """Grava uma janela limitada da live e converte para o formato pedido"""
+    profile = FORMAT_PROFILES[format_type]
+    segments_path = os.path.join(DOWNLOAD_DIR, f"live-{uuid.uuid4().hex}.{reader.container}")
+    title = yt_dlp.utils.sanitize_filename(info.get('title') or info.get('id') or 'live')
+    output_path = os.path.join(
+        DOWNLOAD_DIR, f"{title} [{info.get('id')}] (ao vivo {time.strftime('%Y%m%d-%H%M%S')}).{profile['ext']}")
+    try:
+        with admission.slot():
+            with open(segments_path, 'wb') as f:
+                for chunk in reader.segments():
+                    f.write(chunk)
+            if reader.stats['segments'] == 0:
+                raise Exception("Nenhum segmento recebido da transmissão")
+            try:
+                run_ffmpeg(segments_path, output_path, live_output_args(profile, info), profile['muxer'])
+            except DeadlineExceeded:
+                raise
+            except Exception:
+                # Codec incompatível com o container pedido: reencode
+                run_ffmpeg(segments_path, output_path, (['-vn'] if not profile.get('video') else []) + profile['encode'],
+                           profile['muxer'])
+    finally:
+        if os.path.exists(segments_path):
+            os.remove(segments_path)
+    logger.info("Live %s gravada: %s segmentos, %.0fs", info.get('id'), reader.stats['segments'],
+                reader.stats['seconds'])
+    return output_path
+
+def live_download(url, format_type, mode, duration):
+    """Modo ao vivo: repassa os segmentos HLS (stream) ou grava uma janela limitada (record)"""
+    admission.check()
+    info = resolve_live(url, FORMAT_PROFILES[format_type])
+    reader = HlsLiveReader(info['url'], info.get('http_headers'), max_duration=duration)
+    reader.probe()
+    if mode == 'stream':
+        return stream_live(reader, info, format_type)
+    filename = record_live(reader, info, format_type)
+    # Gravações de live não entram no cache: cada pedido é uma janela diferente
+    delete_file_after_delay(filename, 300)
+    return deliver_artifact(filename)
+
+def live_error(error):
+    """Resposta 409 para live/estreia no modo normal (400 se o modo ao vivo não se aplica), com Retry-After para estreias"""
+    response = jsonify({'error': str(error), 'live_status': error.live_status,
+                        'release_timestamp': error.release_timestamp})
+    response.status_code = error.status
+    if error.retry_after:
+        response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+def proxy_to_node(node_url):
+    """Encaminha a requisição atual para outro nó e devolve a resposta em streaming"""
+    parsed = urllib.parse.urlparse(node_url)
+    connection_class = http.client.HTTPSConnection if parsed.scheme == 'https' else http.client.HTTPConnection
+    conn = connection_class(parsed.hostname, parsed.port, timeout=CLUSTER_PROXY_TIMEOUT)
+    headers = {k: v for k, v in request.headers.items() if k.lower() not in HOP_BY_HOP_HEADERS}
+    headers[CLUSTER_FORWARDED_HEADER] = cluster.self_url
+    headers[REQUEST_ID_HEADER] = request.environ.get('request_id', '-')
+    conn.request(request.method, request.full_path, body=request.get_data(), headers=headers)
+    upstream = conn.getresponse()
+
+    def generate():
+        try:
+            while True:
+                chunk = upstream.read(64 * 1024)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            conn.close()
+
+    response = Response(generate(), status=upstream.status, direct_passthrough=True)
+    for key, value in upstream.getheaders():
+        if key.lower() not in HOP_BY_HOP_HEADERS:
+            response.headers.add(key, value)
+    return response
+
+def route_to_owner(url):
+    """No modo cluster, envia a requisição para o nó dono do vídeo; None se for local"""
+    if cluster is None or request.headers.get(CLUSTER_FORWARDED_HEADER):
+        return None
+    
+    video_id = get_video_id(url)
+    if not video_id or cluster.is_local(video_id):
+        return None
+    
+    owner = cluster.owner(video_id)
+    if cluster.routing == 'redirect':
+        return redirect(owner + request.full_path, code=307)
+    
+    try:
+        logger.info("Encaminhando %s para %s", video_id, owner)
+        return proxy_to_node(owner)
+    except Exception as e:
+        # Dono fora do ar: atende localmente em vez de falhar
+        logger.error("Erro ao encaminhar para %s: %s", owner, e)
+        return None
+
+def admission_error(error):
+    """Resposta 503/429 com Retry-After para trabalho recusado (controle de admissão ou circuit breaker)"""
+    logger.info("Requisição recusada: %s", error.reason)
+    response = jsonify({'error': error.reason, 'retry_after': error.retry_after})
+    response.status_code = error.status
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+def lookup_artifact(cache_key):
+    """Procura um arquivo já baixado no índice compartilhado"""
+    record = state.get('artifacts', cache_key)
+    if record and os.path.exists(record['path']):
+        return record['path']
+    if record:
+        # O arquivo foi removido (limpeza ou restart); descarta a entrada
+        state.delete('artifacts', cache_key)
+    return None
+
+def journaled_download(journal_id, url, format_type, clip=None, cache_key=None, lock_token=None, is_job=False,
+                       preset=DEFAULT_PRESET):
+    """Executa download_video registrando início e fim no journal persistente"""
+    journal.append(journal_id, 'started', url=url, format=format_type, clip=clip, preset=preset, cache_key=cache_key,
+                   lock_token=lock_token, job=is_job, instance=INSTANCE_ID, attempt=journal.attempts(journal_id) + 1)
+    try:
+        filename = download_video(url, format_type, clip, preset)
+    except Exception as e:
+        journal.append(journal_id, 'failed', error=str(e))
+        raise
+    journal.append(journal_id, 'finished', file=filename)
+    return filename
+
+def fetch_artifact(url, format_type='mp4', journal_id=None, clip=None, queue_timeout=None, prefetch=False,
+                   preset=DEFAULT_PRESET):
+    """Retorna (arquivo, veio_do_cache), garantindo um único download por vídeo entre os workers"""
+    journal_id = journal_id or uuid.uuid4().hex
+    is_job = state.get('jobs', journal_id) is not None
+    video_id = get_video_id(url)
+    if not video_id or ARTIFACT_CACHE_TTL <= 0:
+        check_preflight(url, format_type, clip, preset)
+        with admission.slot(queue_timeout):
+            return journaled_download(journal_id, url, format_type, clip, is_job=is_job, preset=preset), False
+
+    cache_key = f'{video_id}:{format_type}'
+    if preset != DEFAULT_PRESET:
+        cache_key += f':{preset}'
+    if clip:
+        cache_key += f':{clip_label(clip)}'
+    elif not prefetch:
+        # Contagem de pedidos recentes; os mais pedidos são mantidos aquecidos
+        state.incr('demand', cache_key, ttl=WARMUP_HOT_WINDOW)
+    cached = lookup_artifact(cache_key)
+    if cached:
+        logger.info("Cache hit: %s", cache_key)
+        return cached, True
+    # Só pedidos que vão de fato baixar passam pela estimativa (hits de cache já retornaram)
+    check_preflight(url, format_type, clip, preset)
+
+    lock_name = f'download:{cache_key}'
+    deadline = time.time() + DOWNLOAD_LOCK_WAIT
+    token = state.acquire_lock(lock_name, DOWNLOAD_LOCK_TTL)
+    while token is None:
+        # Outro worker já está baixando este vídeo: aguarda e reaproveita o arquivo
+        if time.time() > deadline:
+            raise Exception("Tempo esgotado aguardando download em andamento")
+        time.sleep(1)
+        cached = lookup_artifact(cache_key)
+        if cached:
+            logger.info("Download compartilhado com outro worker: %s", cache_key)
+            return cached, True
+        token = state.acquire_lock(lock_name, DOWNLOAD_LOCK_TTL)
+
+    try:
+        cached = lookup_artifact(cache_key)
+        if cached:
+            return cached, True
+        # Só o trabalho pesado passa pelo controle de admissão; hits de cache já retornaram
+        with admission.slot(queue_timeout):
+            filename = journaled_download(journal_id, url, format_type, clip, cache_key, token, is_job, preset)
+        state.set('artifacts', cache_key, {'path': filename, 'created_at': time.time()}, ttl=ARTIFACT_CACHE_TTL)
+        return filename, False
+    finally:
+        state.release_lock(lock_name, token)
+
+def publish_artifact(filepath):
+    """Envia o arquivo ao object store uma única vez e retorna a chave; None se outro worker já está enviando"""
+    stat = os.stat(filepath)
+    record = state.get('published', filepath)
+    if record and record['size'] == stat.st_size and record['mtime'] == stat.st_mtime:
+        return record['key']
+    
+    lock_name = f'publish:{filepath}'
+    token = state.acquire_lock(lock_name, DOWNLOAD_LOCK_TTL)
+    if token is None:
+        return None
+    try:
+        key = f"artifacts/{hashlib.sha1(filepath.encode()).hexdigest()[:16]}/{os.path.basename(filepath)}"
+        start = time.time()
+        object_store.upload_file(filepath, key)
+        logger.info("Publicado %s em %.1fs", key, time.time() - start)
+        state.set('published', filepath, {'key': key, 'size': stat.st_size, 'mtime': stat.st_mtime},
+                  ttl=OBJECT_STORE_RETENTION)
+        return key
+    finally:
+        state.release_lock(lock_name, token)
+
+def deliver_artifact(filepath):
+    """Redireciona para o object store quando configurado; senão (ou se a publicação falhar) serve do disco"""
+    if object_store is not None:
+        try:
+            key = publish_artifact(filepath)
+            if key:
+                return redirect(object_store.presigned_url(key, os.path.basename(filepath)), code=302)
+        except Exception as e:
+            logger.error("Erro ao publicar %s: %s", filepath, e)
+    return send_artifact(filepath)
+
+def notify_job(job):
+    """Agenda o callback de um job concluído ou com falha"""
+    event = {
+        'event': f"job.{job['status']}",
+        'job_id': job['id'],
+        'status': job['status'],
+        'url': job['url'],
+        'format': job['format'],
+        'clip': job.get('clip'),
+        'preset': job.get('preset', DEFAULT_PRESET),
+        'finished_at': job.get('finished_at'),
+    }
+    if job['status'] == 'finished':
+        if job.get('object_key') and object_store is not None:
+            event['download_url'] = object_store.presigned_url(job['object_key'], os.path.basename(job['file']))
+        else:
+            event['download_url'] = f"{job['base_url']}/jobs/{job['id']}/file"
+    else:
+        event['error'] = job.get('error')
+    webhooks.enqueue(job['callback_url'], event)
+
+def record_callback_result(events, delivered):
+    """Registra no job se o callback foi entregue"""
+    for event in events:
+        job = state.get('jobs', event['job_id'])
+        if job:
+            job['callback'] = 'delivered' if delivered else 'failed'
+            state.set('jobs', event['job_id'], job, ttl=JOB_TTL)
+
+def start_job(url, format_type, clip=None, callback_url=None, preset=DEFAULT_PRESET):
+    """Registra e inicia um job assíncrono; retorna o id"""
+    job_id = uuid.uuid4().hex
+    job = {
+        'id': job_id,
+        'url': url,
+        'format': format_type,
+        'clip': clip,
+        'preset': preset,
+        'status': 'queued',
+        'created_at': time.time()
+    }
+    if callback_url:
+        job['callback_url'] = callback_url
+        # A thread do job não tem contexto de requisição para montar o link do arquivo
+        job['base_url'] = request.host_url.rstrip('/')
+    state.set('jobs', job_id, job, ttl=JOB_TTL)
+    
+    thread = threading.Thread(target=run_job, args=(job_id, url, format_type, clip, preset))
+    thread.daemon = True
+    thread.start()
+    
+    logger.info("Job %s criado para %s (%s)", job_id, url, format_type)
+    return job_id
+
+def public_job(job):
+    """Estado do job como visto pelos clientes: sem caminhos locais, com o link do object store se houver"""
+    job = dict(job)
+    job.pop('file', None)
+    job.pop('base_url', None)
+    object_key = job.pop('object_key', None)
+    if object_key and object_store is not None:
+        job['download_url'] = object_store.presigned_url(object_key)
+    return job
+
+def run_job(job_id, url, format_type, clip=None, preset=DEFAULT_PRESET):
+    """Executa um job de download em background, registrando o estado no backend compartilhado"""
+    bind_request_id(job_id)
+    job = state.get('jobs', job_id) or {}
+    job.update({'status': 'running', 'started_at': time.time()})
+    state.set('jobs', job_id, job, ttl=JOB_TTL)
+    try:
+        filename, _ = fetch_artifact(url, format_type, journal_id=job_id, clip=clip, queue_timeout=JOB_QUEUE_WAIT,
+                                     preset=preset)
+        if object_store is not None:
+            try:
+                job['object_key'] = publish_artifact(filename)
+            except Exception as e:
+                logger.error("Erro ao publicar resultado do job %s: %s", job_id, e)
+        job.update({'status': 'finished', 'file': filename, 'finished_at': time.time()})
+    except PreflightRejected as e:
+        job.update({'status': 'failed', 'error': str(e), 'estimate': e.estimate, 'alternatives': e.alternatives,
+                    'finished_at': time.time()})
+    except Exception as e:
+        logger.error("Erro no job %s: %s", job_id, e)
+        job.update({'status': 'failed', 'error': str(e), 'finished_at': time.time()})
+    state.set('jobs', job_id, job, ttl=JOB_TTL)
+    if job.get('callback_url'):
+        notify_job(job)
+
+def machine_is_idle():
+    """True quando não há trabalho pesado em andamento e a CPU está folgada"""
+    metrics = admission.pressure()
+    return (admission.overload_reason() is None and metrics['active_jobs'] == 0
+            and metrics['ffmpeg_processes'] == 0 and metrics['load_per_cpu'] < WARMUP_MAX_LOAD_PER_CPU)
+
+def hot_artifacts():
+    """Chaves de cache com pedidos suficientes na janela, das mais pedidas para as menos"""
+    counts = [(key, count) for key, count in state.items('demand') if count >= WARMUP_HOT_THRESHOLD]
+    return [key for key, _ in sorted(counts, key=lambda item: item[1], reverse=True)]
+
+def refresh_hot_artifact(cache_key):
+    """Renova a validade de um arquivo quente perto de expirar; False se ele precisa ser baixado"""
+    record = state.get('artifacts', cache_key)
+    if not record or not os.path.exists(record['path']):
+        return False
+    if time.time() - record['created_at'] > ARTIFACT_CACHE_TTL - WARMUP_REFRESH_MARGIN:
+        os.utime(record['path'])  # a limpeza periódica usa o mtime
+        state.set('artifacts', cache_key, {'path': record['path'], 'created_at': time.time()}, ttl=ARTIFACT_CACHE_TTL)
+    return True
+
+def next_warmup_item():
+    """Próximo item da fila explícita cujo horário já chegou, ou um vídeo quente fora do cache"""
+    now = time.time()
+    queued = [(key, item) for key, item in state.items('warmup')
+              if item['status'] == 'queued' and item.get('not_before', 0) <= now]
+    if queued:
+        return min(queued, key=lambda entry: (entry[1].get('not_before', 0), entry[1]['requested_at']))
+    for cache_key in hot_artifacts():
+        if state.get('warmup_failed', cache_key):
+            continue
+        if not refresh_hot_artifact(cache_key):
+            # Só chaves sem trecho são contadas: video_id:formato[:preset]
+            video_id, format_type, *preset = cache_key.split(':')
+            return cache_key, {'url': f'https://www.youtube.com/watch?v={video_id}', 'format': format_type,
+                               'preset': preset[0] if preset else DEFAULT_PRESET, 'source': 'hot'}
+    return None
+
+def run_warmup_item(key, item):
+    """Baixa/converte um item para o cache sem esperar na fila de admissão"""
+    explicit = item.get('source') != 'hot'
+    if explicit:
+        item.update({'status': 'running', 'started_at': time.time()})
+        state.set('warmup', key, item, ttl=JOB_TTL)
+    try:
+        _, cached = fetch_artifact(item['url'], item['format'], queue_timeout=0, prefetch=True,
+                                   preset=item.get('preset', DEFAULT_PRESET))
+        logger.info("Aquecimento %s: %s", 'já estava no cache' if cached else 'concluído', key)
+        item.update({'status': 'finished', 'finished_at': time.time()})
+    except AdmissionRejected:
+        # Chegou trabalho de verdade: devolve o item para a fila e tenta mais tarde
+        item['status'] = 'queued'
+    except Exception as e:
+        logger.error("Erro no aquecimento de %s: %s", key, e)
+        item.update({'status': 'failed', 'error': str(e), 'finished_at': time.time()})
+        if not explicit:
+            # Não insiste num vídeo quente que falhou até a janela de contagem acabar
+            state.set('warmup_failed', key, item, ttl=WARMUP_HOT_WINDOW)
+    if explicit:
+        state.set('warmup', key, item, ttl=JOB_TTL)
+
+def warmup_loop():
+    """Worker de aquecimento com prioridade baixa; um por máquina, só quando ela está ociosa"""
+    try:
+        # No Linux a prioridade vale só para esta thread (e os processos que ela criar)
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), WARMUP_NICE)
+    except (AttributeError, OSError) as e:
+        logger.info("Não foi possível reduzir a prioridade do aquecimento: %s", e)
+    while True:
+        time.sleep(WARMUP_INTERVAL)
+        token = None
+        try:
+            if not machine_is_idle():
+                continue
+            token = state.acquire_lock('warmup:worker', DOWNLOAD_LOCK_TTL)
+            if token is None:
+                continue
+            entry = next_warmup_item()
+            if entry:
+                run_warmup_item(*entry)
+        except Exception as e:
+            logger.error("Erro no worker de aquecimento: %s", e)
+        finally:
+            if token:
+                state.release_lock('warmup:worker', token)
+
+def start_warmup_thread():
+    if not WARMUP_ENABLED:
+        return
+    thread = threading.Thread(target=warmup_loop)
+    thread.daemon = True
+    thread.start()
+
+def enqueue_warmup(items, not_before=0):
+    """Coloca itens {url, format} na fila de aquecimento; retorna as chaves enfileiradas"""
+    keys = []
+    for entry in items:
+        video_id = get_video_id(entry['url'])
+        if not video_id:
+            continue
+        key = f"{video_id}:{entry['format']}"
+        current = state.get('warmup', key)
+        if current and current['status'] in ('queued', 'running'):
+            keys.append(key)
+            continue
+        state.set('warmup', key, {
+            'url': entry['url'],
+            'format': entry['format'],
+            'status': 'queued',
+            'requested_at': time.time(),
+            'not_before': not_before,
+        }, ttl=JOB_TTL + max(not_before - time.time(), 0))
+        keys.append(key)
+    return keys
+
+def forward_warmup(node_url, items, not_before):
+    """Envia ao nó dono os itens de aquecimento que pertencem a ele"""
+    parsed = urllib.parse.urlparse(node_url)
+    connection_class = http.client.HTTPSConnection if parsed.scheme == 'https' else http.client.HTTPConnection
+    conn = connection_class(parsed.hostname, parsed.port, timeout=CLUSTER_PROXY_TIMEOUT)
+    try:
+        body = json.dumps({'items': items, 'not_before': not_before})
+        conn.request('POST', '/warmup', body=body, headers={
+            'Content-Type': 'application/json',
+            CLUSTER_FORWARDED_HEADER: cluster.self_url,
+        })
+        response = conn.getresponse()
+        return json.loads(response.read()).get('queued', [])
+    finally:
+        conn.close()
+
+def expand_playlist(url):
+    """Lista as URLs dos vídeos de uma playlist, sem baixar nada"""
+    ydl_opts = {
+        'quiet': True,
+        'no_warnings': True,
+        'logger': ytdlp_logger,
+        'extract_flat': True,
+        'ignoreerrors': True,
+        'nocheckcertificate': True,
+        'playlistend': MAX_ARCHIVE_ITEMS,
+    }
+    with CachingYoutubeDL(ydl_opts) as ydl:
+        info = ydl.extract_info(url, download=False)
+    if not info:
+        raise Exception("Não foi possível ler a playlist")
+    return [
+        entry.get('url') or f"https://www.youtube.com/watch?v={entry['id']}"
+        for entry in info.get('entries') or [] if entry
+    ]
+
+def iter_archive_entries(items):
+    """Baixa cada item sob demanda, enquanto o arquivo compactado já está sendo transmitido"""
+    used_names = set()
+    errors = []
+    for item in items:
+        try:
+            filename, _ = fetch_artifact(item['url'], item['format'], clip=item['clip'], preset=item['preset'])
+        except Exception as e:
+            # Os headers já foram enviados; a falha vai para erros.txt dentro do arquivo
+            errors.append(f"{item['url']} ({item['format']}): {str(e)}")
+            continue
+        name = os.path.basename(filename)
+        base, ext = os.path.splitext(name)
+        counter = 1
+        while name in used_names:
+            counter += 1
+            name = f"{base} ({counter}){ext}"
+        used_names.add(name)
+        yield name, filename
+    if errors:
+        report = ('\n'.join(errors) + '\n').encode()
+        yield 'erros.txt', [report], len(report)
+
+def build_archive_response(data):
+    """Valida o pedido e devolve o zip/tar em streaming"""
+    archive_type = data.get('type') or 'zip'
+    if archive_type not in ARCHIVE_TYPES:
+        return jsonify({'error': 'Tipo deve ser zip ou tar'}), 400
+    
+    default_format = data.get('format') or 'mp4'
+    default_preset = data.get('preset')
+    raw_items = list(data.get('items') or [])
+    raw_items += [{'url': url} for url in data.get('urls') or []]
+    if data.get('playlist'):
+        try:
+            raw_items += [{'url': url} for url in expand_playlist(data['playlist'])]
+        except Exception as e:
+            logger.error("Erro ao ler playlist: %s", e)
+            return jsonify({'error': f'Erro ao ler playlist: {str(e)}'}), 400
+    
+    if not raw_items:
+        return jsonify({'error': 'Informe items, urls ou playlist'}), 400
+    if len(raw_items) > MAX_ARCHIVE_ITEMS:
+        return jsonify({'error': f'Máximo de {MAX_ARCHIVE_ITEMS} itens por arquivo'}), 400
+    
+    try:
+        admission.check()
+    except AdmissionRejected as e:
+        return admission_error(e)
+    
+    items = []
+    for raw in raw_items:
+        if not isinstance(raw, dict) or not raw.get('url'):
+            return jsonify({'error': 'Cada item precisa de uma URL'}), 400
+        format_type = raw.get('format') or default_format
+        if format_type not in SUPPORTED_FORMATS:
+            return jsonify({'error': FORMAT_ERROR}), 400
+        try:
+            clip = parse_clip(raw.get('start'), raw.get('end'))
+            preset = parse_preset(raw.get('preset') or default_preset)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        items.append({'url': raw['url'], 'format': format_type, 'clip': clip, 'preset': preset})
+    
+    cleanup_old_files()
+    
+    mimetype, writer = ARCHIVE_TYPES[archive_type]
+    response = Response(writer(iter_archive_entries(items)), mimetype=mimetype, direct_passthrough=True)
+    set_attachment_headers(response, f"youtube-{time.strftime('%Y%m%d-%H%M%S')}.{archive_type}")
+    return response
+
+def recover_interrupted_downloads():
+    """Retoma downloads cujo processo morreu (restart, redeploy, crash) aproveitando os arquivos .part"""
+    global pending_video_ids
+    pending = journal.pending()
+    pending_video_ids = frozenset(entry['cache_key'].split(':')[0] for _, entry in pending if entry.get('cache_key'))
+    for journal_id, entry in pending:
+        # Processo ainda vivo (heartbeat válido): o download segue normalmente
+        if state.get('instances', entry.get('instance')):
+            continue
+        
+        # Pedido síncrono sem cache: o cliente que esperava o arquivo já foi embora e ninguém o buscaria
+        if not entry.get('job') and not entry.get('cache_key'):
+            logger.info("Download interrompido sem destinatário, não será retomado: %s", journal_id)
+            journal.append(journal_id, 'abandoned')
+            continue
+        
+        token = state.acquire_lock(f'recover:{journal_id}', DOWNLOAD_LOCK_TTL)
+        if token is None:
+            continue
+        
+        # O lock do processo morto ainda pode estar ativo até expirar; libera para retomar já
+        if entry.get('cache_key') and entry.get('lock_token'):
+            state.release_lock(f"download:{entry['cache_key']}", entry['lock_token'])
+        
+        if entry.get('attempt', 1) >= RECOVERY_MAX_ATTEMPTS:
+            abandon_download(journal_id, entry)
+            state.release_lock(f'recover:{journal_id}', token)
+            continue
+        
+        logger.info("Retomando download interrompido: %s (%s)", journal_id, entry['url'])
+        if entry.get('job'):
+            target, args = run_job, (journal_id, entry['url'], entry['format'], entry.get('clip'),
+                                     entry.get('preset', DEFAULT_PRESET))
+        else:
+            target, args = fetch_artifact, (entry['url'], entry['format'], journal_id, entry.get('clip'), None, False,
+                                            entry.get('preset', DEFAULT_PRESET))
+        thread = threading.Thread(target=run_recovery, args=(journal_id, token, target, args))
+        thread.daemon = True
+        thread.start()
+
+def abandon_download(journal_id, entry):
+    """Marca como falho um download interrompido vezes demais (e o job dele, se houver)"""
+    error = f"Download interrompido {entry.get('attempt', 1)} vezes; não será retomado"
+    logger.error("Desistindo do download %s (%s): %s", journal_id, entry['url'], error)
+    journal.append(journal_id, 'failed', error=error)
+    job = state.get('jobs', journal_id) if entry.get('job') else None
+    if job:
+        job.update({'status': 'failed', 'error': error, 'finished_at': time.time()})
+        state.set('jobs', journal_id, job, ttl=JOB_TTL)
+        if job.get('callback_url'):
+            notify_job(job)
+
+def run_recovery(journal_id, token, target, args):
+    """Executa uma retomada e sempre fecha a entrada no journal e libera o lock de recuperação"""
+    error = None
+    try:
+        target(*args)
+    except Exception as e:
+        error = str(e)
+        logger.error("Erro ao retomar download %s: %s", journal_id, e)
+    finally:
+        # Terminou sem passar pelo journaled_download (arquivo já no cache, fila cheia, pre-flight):
+        # a entrada ainda aponta para o processo morto e seria retomada de novo
+        if journal.is_pending(journal_id):
+            job = state.get('jobs', journal_id) or {}
+            if error or job.get('status') == 'failed':
+                journal.append(journal_id, 'failed', error=error or job.get('error'))
+            else:
+                journal.append(journal_id, 'finished')
+        state.release_lock(f'recover:{journal_id}', token)
+
+def maintenance_loop():
+    """Publica o heartbeat deste processo, procura downloads órfãos e limpa estado, caches e journal periodicamente"""
+    last_cleanup = 0
+    while True:
+        try:
+            state.set('instances', INSTANCE_ID, {'pid': os.getpid(), 'updated_at': time.time()}, ttl=HEARTBEAT_TTL)
+            recover_interrupted_downloads()
+            if time.time() - last_cleanup > MAINTENANCE_CLEANUP_INTERVAL:
+                # Sem isso as linhas expiradas (demanda, saídas, metadados, uploads) só sairiam via /cleanup
+                state.cleanup()
+                extractor_responses.cleanup()
+                thumbnail_store.cleanup(THUMBNAIL_CACHE_TTL)
+                journal.compact(JOB_TTL)
+                last_cleanup = time.time()
+        except Exception as e:
+            logger.error("Erro na manutenção: %s", e)
+        time.sleep(HEARTBEAT_INTERVAL)
+
+def start_maintenance_thread():
+    thread = threading.Thread(target=maintenance_loop)
+    thread.daemon = True
+    thread.start()
+
+if not TASK_WORKER:
+    start_maintenance_thread()
+    start_warmup_thread()
+
+@app.before_request
+def assign_request_id():
+    """Id de correlação da requisição: reaproveita o X-Request-ID recebido ou gera um novo"""
+    request_id = request.headers.get(REQUEST_ID_HEADER, '')
+    if not re.fullmatch(r'[\w.-]{1,64}', request_id):
+        request_id = uuid.uuid4().hex[:16]
+    request.environ['request_id'] = request_id
+    bind_request_id(request_id)
+
+@app.after_request
+def add_request_id_header(response):
+    response.headers[REQUEST_ID_HEADER] = request.environ.get('request_id', '-')
+    return response
+
+@app.after_request
+def finalize_json_response(response):
+    """ETag/304, Cache-Control por endpoint e compressão das respostas JSON"""
+    return finalize_json(response, request, CACHE_CONTROL.get(request.endpoint), COMPRESS_MIN_SIZE, COMPRESS_LEVEL)
+
+@app.teardown_request
+def clear_request_id(error=None):
+    bind_request_id('-')
+
 @app.route('/')
 def home():
     """Endpoint de teste"""
@@ -256,7 +1891,11 @@ def home():
         'status': 'running',
         'endpoints': {
             'GET /info': 'Obter informações do vídeo',
-            'POST /download': 'Fazer download do vídeo'
+            'GET /formats': 'Listar formatos (filtros, ordenação e paginação)',
+            'POST /download': 'Fazer download do vídeo',
+            'POST /jobs': 'Criar job de download assíncrono',
+            'GET /jobs/<id>': 'Consultar estado do job',
+            'GET /thumbnail/<video_id>': 'Thumbnail redimensionado (small, medium, large)'
         }
     })
 
@@ -268,14 +1907,106 @@ def get_info():
     if not url:
         return jsonify({'error': 'URL é obrigatória'}), 400
     
+    routed = route_to_owner(url)
+    if routed is not None:
+        return routed
+    
     try:
-        info = get_video_info(url)
+        info, metadata = get_video_info(url)
         if info:
-            return jsonify(info)
+            return metadata_response(info, metadata)
         else:
             return jsonify({'error': 'Não foi possível obter informações do vídeo'}), 400
+    except CircuitOpen as e:
+        return admission_error(e)
     except Exception as e:
-        logger.error(f"Erro: {str(e)}")
+        logger.error("Erro: %s", e)
+        return jsonify({'error': 'Erro interno do servidor'}), 500
+
+@app.route('/formats', methods=['GET'])
+def list_formats():
+    """Formatos disponíveis, com filtros, ordenação, paginação e seleção de campos"""
+    url = request.args.get('url')
+    
+    if not url:
+        return jsonify({'error': 'URL é obrigatória'}), 400
+    
+    try:
+        params = format_listing.parse_query(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    routed = route_to_owner(url)
+    if routed is not None:
+        return routed
+    
+    try:
+        metadata = get_video_metadata(url)
+        if not metadata:
+            return jsonify({'error': 'Não foi possível obter informações do vídeo'}), 400
+        result = format_listing.query(metadata.formats, **params)
+        return metadata_response(dict(result, title=metadata.title, duration=metadata.duration), metadata)
+    except CircuitOpen as e:
+        return admission_error(e)
+    except DeadlineExceeded as e:
+        return jsonify({'error': str(e)}), 504
+    except Exception as e:
+        logger.error("Erro ao listar formatos: %s", e)
+        return jsonify({'error': 'Erro interno do servidor'}), 500
+
+@app.route('/estimate', methods=['GET'])
+def estimate_download():
+    """Estimativa de tamanho e custo de um download, sem baixar mídia, e os formatos que cabem nos limites"""
+    url = request.args.get('url')
+    format_type = request.args.get('format', 'mp4')
+    
+    if not url:
+        return jsonify({'error': 'URL é obrigatória'}), 400
+    
+    if format_type not in SUPPORTED_FORMATS:
+        return jsonify({'error': FORMAT_ERROR}), 400
+    
+    try:
+        clip = parse_clip(request.args.get('start'), request.args.get('end'))
+        preset = parse_preset(request.args.get('preset'))
+        variants = parse_variants(request.args['variants'], FORMAT_PROFILES[format_type].get('video'),
+                                  MAX_VARIANTS) if request.args.get('variants') else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    routed = route_to_owner(url)
+    if routed is not None:
+        return routed
+    
+    try:
+        metadata = get_video_metadata(url)
+        if not metadata:
+            return jsonify({'error': 'Não foi possível obter informações do vídeo'}), 400
+        if metadata.live_status in LIVE_STATUSES:
+            return jsonify({'error': 'Transmissão ao vivo não tem tamanho estimável; use live=stream ou live=record'}), 400
+        result = estimate_request(metadata, format_type, clip, preset, variants)
+        if result is None:
+            return jsonify({'error': 'Nenhum formato disponível para o perfil pedido'}), 400
+        problem = estimate_fits(result)
+        return metadata_response({
+            'format': format_type,
+            'preset': preset,
+            'estimate': result,
+            'fits': problem is None,
+            'reason': problem,
+            'limits': {
+                'max_duration': MAX_MEDIA_DURATION or None,
+                'max_download_bytes': MAX_DOWNLOAD_MB * 1024 ** 2 or None,
+                'max_output_bytes': MAX_OUTPUT_MB * 1024 ** 2 or None,
+            },
+            'alternatives': estimate_alternatives(metadata, clip, preset),
+        }, metadata)
+    except CircuitOpen as e:
+        return admission_error(e)
+    except DeadlineExceeded as e:
+        return jsonify({'error': str(e)}), 504
+    except Exception as e:
+        logger.error("Erro ao estimar download: %s", e)
         return jsonify({'error': 'Erro interno do servidor'}), 500
 
 @app.route('/download', methods=['POST'])
@@ -292,33 +2023,74 @@ def download():
     if not url:
         return jsonify({'error': 'URL é obrigatória'}), 400
     
-    if format_type not in ['mp3', 'mp4']:
-        return jsonify({'error': 'Formato deve ser mp3 ou mp4'}), 400
+    if format_type not in SUPPORTED_FORMATS:
+        return jsonify({'error': FORMAT_ERROR}), 400
     
     try:
+        clip = parse_clip(data.get('start'), data.get('end'))
+        preset = parse_preset(data.get('preset'))
+        live = data.get('live')
+        if live not in (None, '', 'stream', 'record'):
+            raise ValueError('live deve ser stream ou record')
+        live_duration = parse_live_duration(live, data.get('duration')) if live else None
+        variants = parse_variants(data['variants'], FORMAT_PROFILES[format_type].get('video'),
+                                  MAX_VARIANTS) if data.get('variants') else None
+        if variants and live:
+            raise ValueError('variants não se aplica ao modo ao vivo')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    callback_url = data.get('callback_url')
+    if callback_url and not valid_callback_url(callback_url, WEBHOOK_ALLOWED_HOSTS):
+        return jsonify({'error': 'callback_url deve ser uma URL http(s) de um host público'}), 400
+    if callback_url and variants:
+        return jsonify({'error': 'variants não pode ser usado com callback_url'}), 400
+    
+    routed = route_to_owner(url)
+    if routed is not None:
+        return routed
+    
+    if callback_url and not live:
+        # Com callback o download vira um job: responde já e avisa o cliente ao terminar
+        job_id = start_job(url, format_type, clip, callback_url, preset)
+        return jsonify({'id': job_id, 'status': 'queued'}), 202
+    
+    try:
+        if live:
+            # Live: repassa os segmentos ou grava uma janela, sempre com teto de duração
+            return live_download(url, format_type, live, live_duration)
+        if variants:
+            # Várias qualidades: um FFmpeg, um decode, vários encodes
+            return variants_download(url, format_type, variants, preset, clip)
+        
         # Limpar arquivos antigos antes do download
         cleanup_old_files()
         
-        # Fazer download
-        filename = download_video(url, format_type)
+        # Fazer download (ou reaproveitar o arquivo já baixado por qualquer worker)
+        filename, _ = fetch_artifact(url, format_type, clip=clip, preset=preset)
         
         # Verificar se o arquivo existe
         if not os.path.exists(filename):
             return jsonify({'error': 'Erro no download do arquivo'}), 500
         
-        # Agendar remoção do arquivo após 30 segundos
-        delete_file_after_delay(filename, 30)
+        # Sem cache, agendar remoção do arquivo após 30 segundos
+        if ARTIFACT_CACHE_TTL <= 0:
+            delete_file_after_delay(filename, 30)
         
-        # Enviar arquivo
-        return send_file(
-            filename,
-            as_attachment=True,
-            download_name=os.path.basename(filename),
-            mimetype='application/octet-stream'
-        )
+        # Redirecionar para o object store ou enviar o arquivo (sendfile zero-copy ou offload para o proxy)
+        return deliver_artifact(filename)
         
+    except (AdmissionRejected, CircuitOpen) as e:
+        return admission_error(e)
+    except LiveStreamError as e:
+        return live_error(e)
+    except PreflightRejected as e:
+        return preflight_error(e)
+    except DeadlineExceeded as e:
+        logger.error("Erro no download: %s", e)
+        return jsonify({'error': str(e)}), 504
     except Exception as e:
-        logger.error(f"Erro no download: {str(e)}")
+        logger.error("Erro no download: %s", e)
         return jsonify({'error': f'Erro no download: {str(e)}'}), 500
 
 @app.route('/download', methods=['GET'])
@@ -330,51 +2102,315 @@ def download_get():
     if not url:
         return jsonify({'error': 'URL é obrigatória. Use: /download?url=YOUTUBE_URL&format=mp3'}), 400
     
-    if format_type not in ['mp3', 'mp4']:
-        return jsonify({'error': 'Formato deve ser mp3 ou mp4'}), 400
+    if format_type not in SUPPORTED_FORMATS:
+        return jsonify({'error': FORMAT_ERROR}), 400
     
     try:
+        clip = parse_clip(request.args.get('start'), request.args.get('end'))
+        preset = parse_preset(request.args.get('preset'))
+        live = request.args.get('live')
+        if live not in (None, '', 'stream', 'record'):
+            raise ValueError('live deve ser stream ou record')
+        live_duration = parse_live_duration(live, request.args.get('duration')) if live else None
+        variants = parse_variants(request.args['variants'], FORMAT_PROFILES[format_type].get('video'),
+                                  MAX_VARIANTS) if request.args.get('variants') else None
+        if variants and live:
+            raise ValueError('variants não se aplica ao modo ao vivo')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    routed = route_to_owner(url)
+    if routed is not None:
+        return routed
+    
+    try:
+        if live:
+            # Live: repassa os segmentos ou grava uma janela, sempre com teto de duração
+            return live_download(url, format_type, live, live_duration)
+        if variants:
+            # Várias qualidades: um FFmpeg, um decode, vários encodes
+            return variants_download(url, format_type, variants, preset, clip)
+        
         # Limpar arquivos antigos antes do download
         cleanup_old_files()
         
-        # Fazer download
-        filename = download_video(url, format_type)
+        # Fazer download (ou reaproveitar o arquivo já baixado por qualquer worker)
+        filename, _ = fetch_artifact(url, format_type, clip=clip, preset=preset)
         
         # Verificar se o arquivo existe
         if not os.path.exists(filename):
             return jsonify({'error': 'Erro no download do arquivo'}), 500
         
-        # Agendar remoção do arquivo após 30 segundos
-        delete_file_after_delay(filename, 30)
+        # Sem cache, agendar remoção do arquivo após 30 segundos
+        if ARTIFACT_CACHE_TTL <= 0:
+            delete_file_after_delay(filename, 30)
         
-        # Enviar arquivo
-        return send_file(
-            filename,
-            as_attachment=True,
-            download_name=os.path.basename(filename),
-            mimetype='application/octet-stream'
-        )
+        # Redirecionar para o object store ou enviar o arquivo (sendfile zero-copy ou offload para o proxy)
+        return deliver_artifact(filename)
         
+    except (AdmissionRejected, CircuitOpen) as e:
+        return admission_error(e)
+    except LiveStreamError as e:
+        return live_error(e)
+    except PreflightRejected as e:
+        return preflight_error(e)
+    except DeadlineExceeded as e:
+        logger.error("Erro no download: %s", e)
+        return jsonify({'error': str(e)}), 504
     except Exception as e:
-        logger.error(f"Erro no download: {str(e)}")
+        logger.error("Erro no download: %s", e)
         return jsonify({'error': f'Erro no download: {str(e)}'}), 500
 
+@app.route('/archive', methods=['POST'])
+def archive():
+    """Baixa vários vídeos/formatos em um único zip ou tar transmitido em streaming"""
+    data = request.get_json()
+    
+    if not data:
+        return jsonify({'error': 'Dados JSON são obrigatórios'}), 400
+    
+    return build_archive_response(data)
+
+@app.route('/archive', methods=['GET'])
+def archive_get():
+    """Versão GET: /archive?url=...&url=...&format=mp3&type=zip ou /archive?playlist=..."""
+    return build_archive_response({
+        'urls': request.args.getlist('url'),
+        'playlist': request.args.get('playlist'),
+        'format': request.args.get('format'),
+        'preset': request.args.get('preset'),
+        'type': request.args.get('type'),
+    })
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    """Cria um job de download assíncrono"""
+    data = request.get_json()
+    
+    if not data:
+        return jsonify({'error': 'Dados JSON são obrigatórios'}), 400
+    
+    url = data.get('url')
+    format_type = data.get('format', 'mp4')
+    
+    if not url:
+        return jsonify({'error': 'URL é obrigatória'}), 400
+    
+    if format_type not in SUPPORTED_FORMATS:
+        return jsonify({'error': FORMAT_ERROR}), 400
+    
+    try:
+        clip = parse_clip(data.get('start'), data.get('end'))
+        preset = parse_preset(data.get('preset'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    callback_url = data.get('callback_url')
+    if callback_url and not valid_callback_url(callback_url, WEBHOOK_ALLOWED_HOSTS):
+        return jsonify({'error': 'callback_url deve ser uma URL http(s) de um host público'}), 400
+    
+    routed = route_to_owner(url)
+    if routed is not None:
+        return routed
+    
+    job_id = start_job(url, format_type, clip, callback_url, preset)
+    return jsonify({'id': job_id, 'status': 'queued'}), 202
+
+@app.route('/warmup', methods=['POST'])
+def warmup():
+    """Agenda vídeos para serem baixados/convertidos para o cache antes dos pedidos chegarem"""
+    data = request.get_json()
+    
+    if not data:
+        return jsonify({'error': 'Dados JSON são obrigatórios'}), 400
+    
+    default_format = data.get('format', 'mp4')
+    items = [{'url': url, 'format': default_format} for url in data.get('urls') or []]
+    for item in data.get('items') or []:
+        items.append({'url': item.get('url'), 'format': item.get('format') or default_format})
+    
+    if not items:
+        return jsonify({'error': 'Informe urls ou items'}), 400
+    if len(items) > MAX_WARMUP_ITEMS:
+        return jsonify({'error': f'Máximo de {MAX_WARMUP_ITEMS} itens por pedido'}), 400
+    for item in items:
+        if not item['url']:
+            return jsonify({'error': 'URL é obrigatória em todos os itens'}), 400
+        if item['format'] not in SUPPORTED_FORMATS:
+            return jsonify({'error': FORMAT_ERROR}), 400
+    
+    # Horário opcional (timestamp Unix) para estreias e vídeos agendados
+    try:
+        not_before = float(data.get('not_before') or 0)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'not_before deve ser um timestamp Unix'}), 400
+    
+    # No modo cluster cada item vai para a fila do nó dono do vídeo
+    local_items = items
+    queued = []
+    if cluster is not None and not request.headers.get(CLUSTER_FORWARDED_HEADER):
+        by_owner = {}
+        for item in items:
+            video_id = get_video_id(item['url'])
+            owner = cluster.owner(video_id) if video_id else cluster.self_url
+            by_owner.setdefault(owner, []).append(item)
+        local_items = by_owner.pop(cluster.self_url, [])
+        for owner, owner_items in by_owner.items():
+            try:
+                queued += forward_warmup(owner, owner_items, not_before)
+            except Exception as e:
+                logger.error("Erro ao encaminhar aquecimento para %s: %s", owner, e)
+    
+    queued += enqueue_warmup(local_items, not_before)
+    return jsonify({'queued': queued, 'count': len(queued)}), 202
+
+@app.route('/warmup', methods=['GET'])
+def warmup_status():
+    """Fila de aquecimento e vídeos quentes deste nó"""
+    items = [dict(item, key=key) for key, item in state.items('warmup')]
+    return jsonify({
+        'enabled': WARMUP_ENABLED,
+        'idle': machine_is_idle(),
+        'queue': sorted(items, key=lambda item: item['requested_at']),
+        'hot': [{'key': key, 'requests': count} for key, count in state.items('demand')
+                if count >= WARMUP_HOT_THRESHOLD]
+    })
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Consulta o estado de um job (visível para qualquer worker)"""
+    job = state.get('jobs', job_id)
+    if not job:
+        return jsonify({'error': 'Job não encontrado'}), 404
+    return jsonify(public_job(job))
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """Server-Sent Events com o estado do job a cada mudança, até terminar (substitui o polling do /jobs/<id>)"""
+    job = state.get('jobs', job_id)
+    if not job:
+        return jsonify({'error': 'Job não encontrado'}), 404
+
+    def generate():
+        deadline = time.monotonic() + JOB_EVENTS_MAX_DURATION
+        last, last_sent = None, time.monotonic()
+        yield 'retry: 1000\n\n'
+        while True:
+            current = state.get('jobs', job_id)
+            if current is None:
+                yield 'event: gone\ndata: {}\n\n'
+                return
+            if current != last:
+                last, last_sent = current, time.monotonic()
+                yield f"event: job\ndata: {json.dumps(public_job(current))}\n\n"
+                if current['status'] in ('finished', 'failed'):
+                    return
+            elif time.monotonic() - last_sent >= JOB_EVENTS_HEARTBEAT:
+                # Comentário SSE: mantém proxies e o cliente sabendo que a conexão está viva
+                last_sent = time.monotonic()
+                yield ': keep-alive\n\n'
+            if time.monotonic() >= deadline:
+                return
+            time.sleep(JOB_EVENTS_INTERVAL)
+
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-store'
+    # Sem buffer no nginx: cada evento chega ao cliente na hora
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/jobs/<job_id>/file', methods=['GET'])
+def get_job_file(job_id):
+    """Envia o arquivo de um job concluído"""
+    job = state.get('jobs', job_id)
+    if not job:
+        return jsonify({'error': 'Job não encontrado'}), 404
+    if job['status'] != 'finished':
+        return jsonify({'error': 'Job ainda não concluído', 'status': job['status']}), 409
+    if job.get('object_key') and object_store is not None:
+        return redirect(object_store.presigned_url(job['object_key'], os.path.basename(job['file'])), code=302)
+    if not os.path.exists(job['file']):
+        return jsonify({'error': 'Arquivo expirado'}), 410
+    return send_artifact(job['file'])
+
+@app.route('/thumbnail/<video_id>', methods=['GET'])
+def thumbnail(video_id):
+    """Thumbnail redimensionado (size=small|medium|large, format=webp|jpeg) com ETag e cache longo"""
+    if not VIDEO_ID_RE.match(video_id):
+        return jsonify({'error': 'ID de vídeo inválido'}), 400
+    
+    size = request.args.get('size', 'medium')
+    if size not in THUMBNAIL_SIZES:
+        return jsonify({'error': f"Tamanho inválido. Use: {', '.join(THUMBNAIL_SIZES)}"}), 400
+    
+    # Sem format explícito, WebP para quem aceita e JPEG para o resto
+    image_format = request.args.get('format')
+    negotiated = image_format is None
+    if negotiated:
+        image_format = 'webp' if 'image/webp' in request.headers.get('Accept', '') else 'jpeg'
+    if image_format not in THUMBNAIL_FORMATS:
+        return jsonify({'error': f"Formato inválido. Use: {', '.join(THUMBNAIL_FORMATS)}"}), 400
+    
+    try:
+        path, mimetype, etag = thumbnail_store.variant(video_id, size, image_format)
+    except ThumbnailNotFound:
+        return jsonify({'error': 'Thumbnail não encontrado'}), 404
+    except Exception as e:
+        logger.error("Erro ao gerar thumbnail de %s: %s", video_id, e)
+        return jsonify({'error': 'Erro ao obter thumbnail'}), 502
+    
+    with open(path, 'rb') as f:
+        response = Response(f.read(), mimetype=mimetype)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = f'public, max-age={THUMBNAIL_MAX_AGE}'
+    if negotiated:
+        response.headers['Vary'] = 'Accept'
+    # 304 quando o If-None-Match do cliente bate com o ETag
+    return response.make_conditional(request)
+
 @app.route('/health')
 def health():
-    """Endpoint de health check"""
-    return jsonify({'status': 'healthy'})
+    """Endpoint de health check (degraded enquanto o circuit breaker da origem estiver aberto)"""
+    breaker = upstream_breaker.snapshot()
+    return jsonify({
+        'status': 'healthy' if breaker['state'] == 'closed' else 'degraded',
+        'circuit_breaker': breaker
+    })
+
+@app.route('/cluster', methods=['GET'])
+def cluster_status():
+    """Mostra os nós do cluster e, opcionalmente, o dono de um vídeo"""
+    if cluster is None:
+        return jsonify({'enabled': False})
+    
+    result = {
+        'enabled': True,
+        'self': cluster.self_url,
+        'routing': cluster.routing,
+        'nodes': sorted(cluster.ring.nodes)
+    }
+    url = request.args.get('url')
+    if url:
+        video_id = get_video_id(url)
+        result['video_id'] = video_id
+        result['owner'] = cluster.owner(video_id) if video_id else None
+    return jsonify(result)
 
 @app.route('/cleanup', methods=['POST'])
 def cleanup_files():
     """Endpoint para limpeza manual dos arquivos temporários"""
     try:
         cleanup_old_files()
+        state.cleanup()
+        extractor_responses.cleanup()
+        thumbnail_store.cleanup(THUMBNAIL_CACHE_TTL)
+        journal.compact(JOB_TTL)
         return jsonify({
             'message': 'Limpeza realizada com sucesso',
             'status': 'success'
         })
     except Exception as e:
-        logger.error(f"Erro na limpeza manual: {str(e)}")
+        logger.error("Erro na limpeza manual: %s", e)
         return jsonify({'error': 'Erro na limpeza'}), 500
 
 @app.route('/status')
@@ -399,12 +2435,42 @@ def status():
         return jsonify({
             'files_count': len(files),
             'total_size_bytes': total_size,
-            'files': files
+            'files': files,
+            'admission': admission.pressure(),
+            'extractor_cache': extractor_responses.stats,
+            'metadata_cache': dict(metadata_cache.stats, entries=len(metadata_cache)),
+            'webhooks': dict(webhooks.stats, pending=webhooks.pending()),
+            'task_pool': task_pool.info() if task_pool is not None else None
         })
     except Exception as e:
-        logger.error(f"Erro ao obter status: {str(e)}")
+        logger.error("Erro ao obter status: %s", e)
         return jsonify({'error': 'Erro ao obter status'}), 500
 
+@app.route('/introspect', methods=['GET'])
+def introspect():
+    """RSS, FDs por tipo, threads e maiores alocadores do worker (só com INTROSPECTION_ENABLED=1)"""
+    if not INTROSPECTION_ENABLED:
+        return jsonify({'error': 'Endpoint não encontrado'}), 404
+    if INTROSPECTION_TOKEN and not hmac.compare_digest(request.headers.get('X-Introspection-Token', ''),
+                                                      INTROSPECTION_TOKEN):
+        return jsonify({'error': 'Token de introspecção inválido'}), 403
+    
+    try:
+        top = max(min(int(request.args.get('top', 20)), 200), 1)
+    except ValueError:
+        return jsonify({'error': 'top deve ser um número'}), 400
+    data = introspection.snapshot(top, collect=request.args.get('gc') == '1')
+    files = request.args.get('files')
+    if files:
+        # Ex.: files=socket lista os alvos dos FDs desse tipo
+        data['fds']['open'] = introspection.open_files(files)
+    data['instance'] = INSTANCE_ID
+    data['file_reaper'] = dict(file_reaper.stats, pending=file_reaper.pending())
+    data['webhooks_pending'] = webhooks.pending()
+    data['admission'] = admission.pressure()
+    data['task_pool'] = task_pool.info() if task_pool is not None else None
+    return jsonify(data)
+
 @app.route('/test', methods=['GET'])
 def test_download():
     """Endpoint de teste para verificar formatos disponíveis"""
@@ -414,57 +2480,31 @@ def test_download():
         return jsonify({'error': 'URL é obrigatória'}), 400
     
     try:
-        # Limpar a URL primeiro
         clean_url = clean_youtube_url(url)
+        metadata = get_video_metadata(url)
         
-        ydl_opts = {
-            'quiet': True,
-            'no_warnings': True,
-            'extract_flat': False,
-            'ignoreerrors': True,
-            'nocheckcertificate': True,
-            'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'http_headers': {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-                'Accept-Language': 'en-us,en;q=0.5',
-                'Sec-Fetch-Mode': 'navigate',
-            },
-        }
-        
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(clean_url, download=False)
-            
-            # Verificar se info é None
-            if info is None:
-                return jsonify({
-                    'error': 'Não foi possível extrair informações do vídeo',
-                    'original_url': url,
-                    'cleaned_url': clean_url
-                }), 400
-            
-            formats = []
-            for f in info.get('formats', []):
-                formats.append({
-                    'format_id': f.get('format_id', 'N/A'),
-                    'ext': f.get('ext', 'N/A'),
-                    'resolution': f.get('resolution', 'N/A'),
-                    'filesize': f.get('filesize', 'N/A'),
-                    'acodec': f.get('acodec', 'N/A'),
-                    'vcodec': f.get('vcodec', 'N/A'),
-                })
-            
+        # Verificar se info é None
+        if metadata is None:
             return jsonify({
-                'title': info.get('title', 'Unknown'),
-                'duration': info.get('duration', 0),
-                'formats_count': len(formats),
-                'formats': formats[:10],  # Mostrar apenas os primeiros 10 formatos
+                'error': 'Não foi possível extrair informações do vídeo',
                 'original_url': url,
                 'cleaned_url': clean_url
-            })
-            
+            }), 400
+        
+        # Primeira página; /formats aceita filtros, ordenação e offset
+        listing = format_listing.query(metadata.formats, limit=10)
+        return metadata_response({
+            'title': metadata.title,
+            'duration': metadata.duration,
+            'formats_count': listing['total'],
+            'formats': listing['formats'],
+            'next_offset': listing['next_offset'],
+            'original_url': url,
+            'cleaned_url': clean_url
+        }, metadata)
+        
     except Exception as e:
-        logger.error(f"Erro no teste: {str(e)}")
+        logger.error("Erro no teste: %s", e)
         return jsonify({'error': f'Erro no teste: {str(e)}'}), 500
 
 @app.route('/debug', methods=['GET'])
@@ -481,40 +2521,35 @@ def debug_download():
         clean_url = clean_youtube_url(url)
         
         # Configurações baseadas no formato
-        if format_type == 'mp3':
-            ydl_opts = {
-                'format': 'bestaudio[ext=m4a]/bestaudio[ext=webm]/bestaudio/best',
-                'quiet': True,
-                'no_warnings': True,
-            }
-        elif format_type == 'mp4':
-            ydl_opts = {
-                'format': 'best',
-                'quiet': True,
-                'no_warnings': True,
-            }
-        else:
-            ydl_opts = {
-                'format': 'best',
-                'quiet': True,
-                'no_warnings': True,
+        profile = FORMAT_PROFILES.get(format_type, FORMAT_PROFILES['mp4'])
+        metadata = get_video_metadata(url)
+        if metadata is None:
+            return jsonify({'error': 'Não foi possível extrair informações do vídeo'}), 400
+        
+        # Roda o seletor do yt-dlp sobre os formatos em cache, sem nova extração
+        formats = metadata.formats
+        selected = select_format(formats, profile)
+        
+        selected_format = None
+        if selected:
+            selected_format = {
+                'format_id': selected.get('format_id'),
+                'formats': [
+                    {field: f.get(field) for field in format_listing.DEFAULT_FIELDS}
+                    for f in selected.get('requested_formats') or [selected]
+                ],
             }
         
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            # Simular seleção de formato
-            info = ydl.extract_info(clean_url, download=False)
-            selected_format = ydl.list_formats(info)
-            
-            return jsonify({
-                'url': clean_url,
-                'format_type': format_type,
-                'ydl_opts': ydl_opts,
-                'selected_format': selected_format,
-                'info_keys': list(info.keys()) if info else []
-            })
-            
+        return metadata_response({
+            'url': clean_url,
+            'format_type': format_type,
+            'format_selector': profile['format'],
+            'selected_format': selected_format,
+            'formats_count': len(formats),
+        }, metadata)
+        
     except Exception as e:
-        logger.error(f"Erro no debug: {str(e)}")
+        logger.error("Erro no debug: %s", e)
         return jsonify({'error': f'Erro no debug: {str(e)}'}), 500
 
 if __name__ == '__main__':
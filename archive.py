@@ -0,0 +1,116 @@
+"""
+Empacotamento em streaming (zip/tar) com memória constante
+
+Os arquivos de mídia já são comprimidos, então o zip usa o modo store (sem
+recompressão). Os bytes são gerados bloco a bloco direto para a resposta; nada
+é montado em memória ou em disco, independente do tamanho total. Entradas
+grandes ou de tamanho desconhecido usam Zip64.
+
+Cada entrada é (nome, origem) ou (nome, origem, tamanho), onde a origem é o
+caminho de um arquivo ou um iterável de bytes (ex.: stdout de um processo).
+"""
+
+import io
+import os
+import tarfile
+import time
+import zipfile
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class _StreamBuffer(io.RawIOBase):
+    """Destino não pesquisável do zipfile; acumula só o último bloco escrito"""
+
+    def __init__(self):
+        self._chunks = []
+        self._offset = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._offset
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _normalize(entry):
+    name, source = entry[0], entry[1]
+    size = entry[2] if len(entry) > 2 else None
+    mtime = time.time()
+    if isinstance(source, (str, os.PathLike)):
+        stat = os.stat(source)
+        size, mtime = stat.st_size, stat.st_mtime
+    return name, source, size, mtime
+
+
+def _iter_source(source, chunk_size):
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+    else:
+        for chunk in source:
+            if chunk:
+                yield chunk
+
+
+def stream_zip(entries, chunk_size=CHUNK_SIZE):
+    """Gera um zip (modo store) em blocos a partir de arquivos ou iteráveis de bytes"""
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for entry in entries:
+            name, source, size, mtime = _normalize(entry)
+            info = zipfile.ZipInfo(name, date_time=time.localtime(mtime)[:6])
+            info.compress_type = zipfile.ZIP_STORED
+            info.external_attr = 0o644 << 16
+            if size is not None:
+                info.file_size = size
+            # Tamanho desconhecido (pipe) ou acima de 4 GB: cabeçalhos Zip64
+            force_zip64 = size is None or size >= zipfile.ZIP64_LIMIT
+            with archive.open(info, 'w', force_zip64=force_zip64) as dest:
+                for chunk in _iter_source(source, chunk_size):
+                    dest.write(chunk)
+                    yield buffer.drain()
+            yield buffer.drain()
+    # Diretório central, escrito no close()
+    yield buffer.drain()
+
+
+def stream_tar(entries, chunk_size=CHUNK_SIZE):
+    """Gera um tar (formato PAX, sem limite de 8 GB) em blocos; iteráveis precisam informar o tamanho"""
+    for entry in entries:
+        name, source, size, mtime = _normalize(entry)
+        if size is None:
+            raise ValueError(f'Tamanho desconhecido para {name}: tar exige o tamanho antecipado')
+        info = tarfile.TarInfo(name)
+        info.size = size
+        info.mtime = int(mtime)
+        info.mode = 0o644
+        yield info.tobuf(format=tarfile.PAX_FORMAT)
+
+        written = 0
+        for chunk in _iter_source(source, chunk_size):
+            written += len(chunk)
+            if written > size:
+                raise ValueError(f'{name} excedeu o tamanho informado ({size} bytes)')
+            yield chunk
+        if written != size:
+            raise ValueError(f'{name} terminou com {written} de {size} bytes')
+        padding = -size % tarfile.BLOCKSIZE
+        if padding:
+            yield tarfile.NUL * padding
+    # Dois blocos vazios marcam o fim do arquivo
+    yield tarfile.NUL * (tarfile.BLOCKSIZE * 2)
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Benchmark de memória do empacotamento em streaming (zip/tar) com saídas de vários GB
+"""
+
+import os
+import resource
+import sys
+import tempfile
+import time
+
+from archive import stream_zip, stream_tar
+
+# Tamanho de cada arquivo de teste (arquivos esparsos, não ocupam disco)
+FILE_SIZE_GB = float(os.environ.get('BENCH_FILE_SIZE_GB', 2.5))
+FILE_COUNT = int(os.environ.get('BENCH_FILE_COUNT', 2))
+# Pico de RSS aceitável, em MB
+MAX_RSS_MB = int(os.environ.get('BENCH_MAX_RSS_MB', 100))
+
+def peak_rss_mb():
+    """Pico de memória residente do processo (ru_maxrss é em KB no Linux)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def pipe_entry(size):
+    """Simula um pipe ao vivo (ex.: stdout do FFmpeg) de tamanho desconhecido"""
+    chunk = b'\0' * (1024 * 1024)
+    remaining = size
+    while remaining > 0:
+        yield chunk[:min(len(chunk), remaining)]
+        remaining -= len(chunk)
+
+def run_bench(name, writer, entries):
+    """Consome o arquivo gerado descartando os bytes e mede tempo e pico de RSS"""
+    start = time.time()
+    total = 0
+    for chunk in writer(entries):
+        total += len(chunk)
+    elapsed = time.time() - start
+    print(f"  {name:<22}{total / 1024 ** 3:>8.2f} GB{elapsed:>9.1f} s{total / elapsed / 1024 ** 2:>10.0f} MB/s"
+          f"{peak_rss_mb():>10.1f} MB RSS")
+    return total
+
+def main():
+    """Executa o benchmark"""
+    print("🚀 Benchmark de empacotamento em streaming")
+    print("=" * 50)
+
+    size = int(FILE_SIZE_GB * 1024 ** 3)
+    workdir = tempfile.mkdtemp(prefix='bench_archive_')
+    paths = []
+    for i in range(FILE_COUNT):
+        path = os.path.join(workdir, f'video{i}.mp4')
+        with open(path, 'wb') as f:
+            f.truncate(size)
+        paths.append(path)
+
+    print(f"{FILE_COUNT} arquivos de {FILE_SIZE_GB} GB; RSS inicial {peak_rss_mb():.1f} MB")
+    try:
+        entries = [(os.path.basename(path), path) for path in paths]
+        zip_total = run_bench('zip (arquivos)', stream_zip, entries)
+        run_bench('zip (pipe, Zip64)', stream_zip, [('pipe.mp4', pipe_entry(size))])
+        run_bench('tar (arquivos)', stream_tar, entries)
+    finally:
+        for path in paths:
+            os.remove(path)
+        os.rmdir(workdir)
+
+    print("\n" + "=" * 50)
+    peak = peak_rss_mb()
+    if zip_total < FILE_COUNT * size:
+        print("❌ Zip menor que a soma dos arquivos")
+        return 1
+    if peak > MAX_RSS_MB:
+        print(f"❌ Pico de RSS {peak:.1f} MB acima do limite de {MAX_RSS_MB} MB")
+        return 1
+    print(f"🎉 Pico de RSS {peak:.1f} MB, constante em relação ao tamanho da saída")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Benchmark de CPU por requisição: mp3 (reencode) vs. formatos de áudio com stream copy
+"""
+
+import os
+import resource
+import sys
+import time
+
+# Sem cache de fontes: cada execução baixa o stream de novo, senão a partir da segunda só o FFmpeg seria medido
+os.environ.setdefault('SOURCE_CACHE_TTL', '0')
+
+from app import download_video  # noqa: E402  (lê SOURCE_CACHE_TTL na importação)
+
+URL = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+FORMATS = ['mp3', 'm4a', 'opus', 'webm-audio']
+RUNS = int(os.environ.get('BENCH_RUNS', 3))
+
+def cpu_seconds():
+    """CPU (usuário + sistema) deste processo e dos filhos (FFmpeg)"""
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+def bench_format(format_type):
+    """Mede CPU e tempo médio por download de um formato"""
+    cpu_total = 0.0
+    wall_total = 0.0
+    size = 0
+    for _ in range(RUNS):
+        cpu_start = cpu_seconds()
+        wall_start = time.time()
+        filename = download_video(URL, format_type)
+        wall_total += time.time() - wall_start
+        cpu_total += cpu_seconds() - cpu_start
+        size = os.path.getsize(filename)
+        os.remove(filename)
+    return cpu_total / RUNS, wall_total / RUNS, size
+
+def main():
+    """Executa o benchmark"""
+    print("🚀 Benchmark de formatos de áudio")
+    print("=" * 50)
+    print(f"URL: {URL} ({RUNS} execuções por formato, cache de fontes {os.environ['SOURCE_CACHE_TTL']}s)")
+
+    results = {}
+    for format_type in FORMATS:
+        try:
+            results[format_type] = bench_format(format_type)
+        except Exception as e:
+            print(f"❌ Erro no formato {format_type}: {e}")
+
+    print("\n" + "=" * 50)
+    print(f"{'formato':<12}{'CPU-s/req':>12}{'tempo (s)':>12}{'tamanho (KB)':>15}{'vs mp3':>10}")
+    baseline = results.get('mp3', (None,))[0]
+    for format_type, (cpu, wall, size) in results.items():
+        ratio = f"{cpu / baseline:.0%}" if baseline else 'N/A'
+        print(f"{format_type:<12}{cpu:>12.2f}{wall:>12.2f}{size / 1024:>15.0f}{ratio:>10}")
+
+    return 0 if len(results) == len(FORMATS) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
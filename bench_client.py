@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Benchmark do firedow_client contra requests.get avulsos, com o app no gunicorn local
+
+Mede, com origem de mídia local (sem rede):
+- metadados: chamadas repetidas ao /info (conexão nova por chamada x pool x pool + cache condicional)
+- downloads idênticos simultâneos: pedidos e bytes recebidos com e sem deduplicação
+- conexão derrubada no meio de um download grande: bytes recebidos recomeçando do zero x retomando
+- espera de job: pedidos e atraso até perceber o fim, polling a cada 1 s x SSE
+"""
+
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from firedow_client import Client
+
+PORT = 9700
+ORIGIN_PORT = 9701
+PROXY_PORT = 9702
+BASE_URL = f'http://127.0.0.1:{PORT}'
+MEDIA_URL = f'http://127.0.0.1:{ORIGIN_PORT}/media/{{}}.mp4'
+METADATA_CALLS = int(os.environ.get('BENCH_METADATA_CALLS', 500))
+CONCURRENCY = int(os.environ.get('BENCH_CONCURRENCY', 8))
+FFMPEG_BIN = os.environ.get('FFMPEG_BIN', 'ffmpeg')
+
+
+class OriginHandler(BaseHTTPRequestHandler):
+    body = b''
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'video/mp4')
+        self.send_header('Content-Length', str(len(self.body)))
+        self.end_headers()
+        try:
+            self.wfile.write(self.body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # o yt-dlp fecha a conexão da sondagem antes do fim
+
+    do_HEAD = do_GET
+
+
+class CuttingProxy:
+    """Proxy TCP para o app que, quando armado, derruba a próxima conexão depois de N bytes de resposta"""
+
+    def __init__(self, port, upstream_port):
+        self.upstream_port = upstream_port
+        self.cut_after = None
+        self.listener = socket.create_server(('127.0.0.1', port))
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            client, _ = self.listener.accept()
+            limit, self.cut_after = self.cut_after, None
+            upstream = socket.create_connection(('127.0.0.1', self.upstream_port))
+            threading.Thread(target=self._pipe, args=(client, upstream, None), daemon=True).start()
+            threading.Thread(target=self._pipe, args=(upstream, client, limit), daemon=True).start()
+
+    @staticmethod
+    def _pipe(source, target, limit):
+        sent = 0
+        try:
+            while True:
+                data = source.recv(65536)
+                if not data:
+                    break
+                if limit is not None and sent + len(data) >= limit:
+                    target.sendall(data[:limit - sent])
+                    break
+                target.sendall(data)
+                sent += len(data)
+        except OSError:
+            pass
+        for sock in (source, target):
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+
+
+def make_media(path, seconds, size, bitrate):
+    subprocess.run([
+        FFMPEG_BIN, '-y', '-hide_banner', '-loglevel', 'error',
+        # Ruído no quadro: sem ele o x264 comprime o testsrc bem abaixo do bitrate pedido
+        '-f', 'lavfi', '-i', f'testsrc=size={size}:rate=25:duration={seconds},noise=alls=30:allf=t',
+        '-f', 'lavfi', '-i', f'sine=frequency=440:duration={seconds}',
+        '-c:v', 'libx264', '-b:v', bitrate, '-c:a', 'aac', '-shortest', path,
+    ], check=True)
+
+
+def start_server(state_dir):
+    env = dict(os.environ, STATE_DIR=state_dir, WARMUP_ENABLED='0', JOB_EVENTS_INTERVAL='0.2',
+               LOG_LEVEL=os.environ.get('LOG_LEVEL', 'WARNING'))
+    process = subprocess.Popen([
+        sys.executable, '-m', 'gunicorn', 'app:app', '--bind', f'127.0.0.1:{PORT}',
+        '--worker-class', 'gthread', '--workers', '2', '--threads', '16', '--keep-alive', '30',
+    ], cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(100):
+        try:
+            requests.get(f'{BASE_URL}/health', timeout=1)
+            return process
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError('gunicorn não subiu')
+
+
+def bench_metadata():
+    """Mesmas N chamadas de /info (10 vídeos, em paralelo) com cada estratégia"""
+    urls = [MEDIA_URL.format(f'meta{n}') for n in range(10)]
+    for url in urls:
+        requests.get(f'{BASE_URL}/info', params={'url': url})  # servidor aquecido: mede só o cliente
+
+    def naive(url):
+        requests.get(f'{BASE_URL}/info', params={'url': url}).json()
+
+    pooled = Client(BASE_URL, cache_entries=0, pool_size=CONCURRENCY)
+    cached = Client(BASE_URL, pool_size=CONCURRENCY)
+    rows = []
+    for name, call, client in (('requests.get avulso', naive, None),
+                               ('Client (sem cache)', pooled.info, pooled),
+                               ('Client (pool + cache)', cached.info, cached)):
+        start = time.perf_counter()
+        with ThreadPoolExecutor(CONCURRENCY) as pool:
+            list(pool.map(call, (urls[n % len(urls)] for n in range(METADATA_CALLS))))
+        elapsed = time.perf_counter() - start
+        sent = client.stats['requests'] if client else METADATA_CALLS
+        rows.append((name, elapsed, sent))
+    pooled.close()
+    cached.close()
+    print(f"\n📊 Metadados: {METADATA_CALLS} chamadas ao /info, {CONCURRENCY} em paralelo")
+    print(f"{'estratégia':<24}{'tempo (s)':>10}{'chamadas/s':>12}{'pedidos':>9}")
+    for name, elapsed, sent in rows:
+        print(f"{name:<24}{elapsed:>10.2f}{METADATA_CALLS / elapsed:>12.0f}{sent:>9}")
+    return rows[1][1] <= rows[0][1] and rows[2][1] <= rows[1][1]
+
+
+def bench_dedup(size):
+    """Vários consumidores pedem o mesmo download ao mesmo tempo"""
+    dest = tempfile.mkdtemp(prefix='bench_client_')
+
+    def naive(_):
+        response = requests.get(f'{BASE_URL}/download', params={'url': MEDIA_URL.format('dedup-a'), 'format': 'mp4'})
+        return response.status_code, len(response.content)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(CONCURRENCY) as pool:
+        responses = list(pool.map(naive, range(CONCURRENCY)))
+    naive_elapsed = time.perf_counter() - start
+    naive_bytes = sum(length for _, length in responses)
+    naive_failed = sum(1 for status, _ in responses if status != 200)
+
+    client = Client(BASE_URL, pool_size=CONCURRENCY)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(CONCURRENCY) as pool:
+        paths = list(pool.map(lambda _: client.download(MEDIA_URL.format('dedup-b'), 'mp4', dest), range(CONCURRENCY)))
+    client_elapsed = time.perf_counter() - start
+    client.close()
+
+    print(f"\n📊 {CONCURRENCY} downloads idênticos simultâneos ({size / 1024 ** 2:.1f} MB)")
+    print(f"{'estratégia':<24}{'tempo (s)':>10}{'pedidos':>9}{'recusados':>11}{'MB recebidos':>14}")
+    print(f"{'requests.get avulso':<24}{naive_elapsed:>10.2f}{CONCURRENCY:>9}{naive_failed:>11}"
+          f"{naive_bytes / 1024 ** 2:>14.1f}")
+    print(f"{'Client (dedup)':<24}{client_elapsed:>10.2f}{client.stats['requests']:>9}{0:>11}"
+          f"{client.stats['downloaded_bytes'] / 1024 ** 2:>14.1f}")
+    return len(set(paths)) == 1 and client.stats['downloaded_bytes'] < naive_bytes
+
+
+def bench_resume(proxy, size):
+    """A conexão cai a 80% do arquivo: recomeçar do zero x retomar com Range"""
+    cut = int(size * 0.8)
+    url = MEDIA_URL.format('resume')
+    requests.get(f'{BASE_URL}/download', params={'url': url, 'format': 'mp4'}).content  # artefato no cache
+    proxy_url = f'http://127.0.0.1:{PROXY_PORT}'
+
+    naive_bytes = 0
+    proxy.cut_after = cut
+    for _ in range(3):
+        try:
+            with requests.get(f'{proxy_url}/download', params={'url': url, 'format': 'mp4'}, stream=True) as response:
+                for chunk in response.iter_content(65536):
+                    naive_bytes += len(chunk)
+            break
+        except requests.RequestException:
+            continue
+
+    client = Client(proxy_url, backoff=0.1)
+    proxy.cut_after = cut
+    client.download(url, 'mp4', tempfile.mkdtemp(prefix='bench_client_'))
+    client.close()
+
+    print(f"\n📊 Conexão derrubada a 80% de {size / 1024 ** 2:.1f} MB")
+    print(f"{'estratégia':<24}{'MB recebidos':>14}{'x arquivo':>11}")
+    print(f"{'recomeçar do zero':<24}{naive_bytes / 1024 ** 2:>14.1f}{naive_bytes / size:>11.2f}")
+    print(f"{'Client (Range)':<24}{client.stats['downloaded_bytes'] / 1024 ** 2:>14.1f}"
+          f"{client.stats['downloaded_bytes'] / size:>11.2f}")
+    return client.stats['resumed'] == 1 and client.stats['downloaded_bytes'] < naive_bytes
+
+
+def bench_jobs():
+    """Espera de job: polling a cada 1 s (como test_api.py) x SSE"""
+    rows = []
+    for name, events in (('polling 1 s', False), ('SSE', True)):
+        client = Client(BASE_URL)
+        job_id = client.submit_job(MEDIA_URL.format(f'job-{name}'), 'mp3')
+        if events:
+            job = client.wait_job(job_id, timeout=120)
+        else:
+            job = client.job(job_id)
+            while job['status'] not in ('finished', 'failed'):
+                time.sleep(1)
+                job = client.job(job_id)
+        rows.append((name, client.stats['requests'] - 1, time.time() - job['finished_at']))
+        client.close()
+    print("\n📊 Espera de job (mp3)")
+    print(f"{'estratégia':<24}{'pedidos':>9}{'atraso (ms)':>13}")
+    for name, sent, delay in rows:
+        print(f"{name:<24}{sent:>9}{delay * 1000:>13.0f}")
+    return rows[1][2] <= rows[0][2] + 0.25
+
+
+def main():
+    """Executa o benchmark"""
+    print("🚀 Benchmark do firedow_client (gunicorn gthread local, origem local)")
+    print("=" * 60)
+
+    media = os.path.join(tempfile.mkdtemp(prefix='bench_client_origin_'), 'media.mp4')
+    make_media(media, 20, '1280x720', '4M')
+    with open(media, 'rb') as f:
+        OriginHandler.body = f.read()
+    size = len(OriginHandler.body)
+    origin = ThreadingHTTPServer(('127.0.0.1', ORIGIN_PORT), OriginHandler)
+    origin.daemon_threads = True
+    threading.Thread(target=origin.serve_forever, daemon=True).start()
+    server = start_server(tempfile.mkdtemp(prefix='bench_client_state_'))
+    proxy = CuttingProxy(PROXY_PORT, PORT)
+    try:
+        results = [bench_metadata(), bench_dedup(size), bench_resume(proxy, size), bench_jobs()]
+    finally:
+        server.terminate()
+        server.wait()
+        origin.shutdown()
+
+    print("\n" + "=" * 60)
+    if all(results):
+        print("✅ Cliente mais rápido ou igual e com menos tráfego em todos os cenários")
+        return 0
+    print(f"❌ Algum cenário não melhorou: {results}")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
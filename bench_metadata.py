@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Benchmark de memória do cache de metadados: info completo do yt-dlp vs registro compacto
+"""
+
+import os
+import random
+import string
+import sys
+import tracemalloc
+
+from metadata_cache import MetadataRecord
+
+ENTRIES = int(os.environ.get('BENCH_ENTRIES', 200))
+# Ganho mínimo aceitável de entradas por MB do registro compacto sobre o info completo
+MIN_GAIN = float(os.environ.get('BENCH_MIN_GAIN', 20))
+
+# (format_id, ext, vcodec, acodec, altura, tbr) no formato dos vídeos do YouTube
+FORMAT_TEMPLATES = [
+    ('139', 'm4a', 'none', 'mp4a.40.5', None, 49), ('249', 'webm', 'none', 'opus', None, 53),
+    ('250', 'webm', 'none', 'opus', None, 70), ('140', 'm4a', 'none', 'mp4a.40.2', None, 130),
+    ('251', 'webm', 'none', 'opus', None, 135), ('160', 'mp4', 'avc1.4d400c', 'none', 144, 80),
+    ('278', 'webm', 'vp9', 'none', 144, 90), ('133', 'mp4', 'avc1.4d4015', 'none', 240, 180),
+    ('242', 'webm', 'vp9', 'none', 240, 160), ('134', 'mp4', 'avc1.4d401e', 'none', 360, 400),
+    ('243', 'webm', 'vp9', 'none', 360, 300), ('18', 'mp4', 'avc1.42001E', 'mp4a.40.2', 360, 600),
+    ('135', 'mp4', 'avc1.4d401f', 'none', 480, 700), ('244', 'webm', 'vp9', 'none', 480, 550),
+    ('136', 'mp4', 'avc1.4d401f', 'none', 720, 1400), ('247', 'webm', 'vp9', 'none', 720, 1100),
+    ('137', 'mp4', 'avc1.640028', 'none', 1080, 4000), ('248', 'webm', 'vp9', 'none', 1080, 2500),
+    ('399', 'mp4', 'av01.0.08M.08', 'none', 1080, 2200), ('271', 'webm', 'vp9', 'none', 1440, 9000),
+    ('313', 'webm', 'vp9', 'none', 2160, 18000),
+]
+LANGUAGES = [a + b for a in 'abcdefghijklmn' for b in 'aeiou'][:150]
+
+
+def noise(n):
+    return ''.join(random.choices(string.ascii_letters + string.digits, k=n))
+
+
+def fake_info(index):
+    """Info com a mesma forma (e ordem de grandeza) do extract_info de um vídeo do YouTube"""
+    video_id = f'{index:011d}'
+    formats = []
+    for format_id, ext, vcodec, acodec, height, tbr in FORMAT_TEMPLATES:
+        url = f'https://rr3---sn-{noise(8)}.googlevideo.com/videoplayback?expire=1700000000&id={video_id}&itag={format_id}&{noise(900)}'
+        formats.append({
+            'format_id': format_id, 'format_note': f'{height}p' if height else 'medium', 'ext': ext,
+            'protocol': 'https', 'vcodec': vcodec, 'acodec': acodec, 'height': height,
+            'width': height * 16 // 9 if height else None, 'fps': 30 if height else None, 'tbr': tbr,
+            'filesize': tbr * 212 * 125, 'url': url, 'asr': 48000 if acodec != 'none' else None,
+            'http_headers': {'User-Agent': 'Mozilla/5.0 ' + noise(80), 'Accept': '*/*', 'Accept-Language': 'en-us'},
+            'downloader_options': {'http_chunk_size': 10485760}, 'container': f'{ext}_dash',
+            'quality': tbr, 'has_drm': False, 'source_preference': -1, 'language': None,
+            'format': f'{format_id} - {height}p' if height else f'{format_id} - audio only',
+            'resolution': f'{height * 16 // 9}x{height}' if height else 'audio only',
+            'fragments': [{'url': f'{url}&sq={n}', 'duration': 5.0} for n in range(3)] if tbr > 5000 else None,
+        })
+    formats.append({'format_id': 'sb0', 'ext': 'mhtml', 'vcodec': 'none', 'acodec': 'none', 'protocol': 'mhtml',
+                    'fragments': [{'url': f'https://i.ytimg.com/sb/{video_id}/{n}.jpg?{noise(60)}'} for n in range(40)]})
+    captions = {lang: [{'ext': ext, 'url': f'https://www.youtube.com/api/timedtext?v={video_id}&lang={lang}&fmt={ext}&{noise(200)}', 'name': lang}
+                       for ext in ('json3', 'srv1', 'srv2', 'srv3', 'ttml', 'vtt')] for lang in LANGUAGES}
+    return {
+        'id': video_id, 'title': f'Vídeo {index} ' + noise(40), 'duration': 212,
+        'thumbnail': f'https://i.ytimg.com/vi/{video_id}/maxresdefault.jpg',
+        'description': noise(3000), 'tags': [noise(10) for _ in range(20)], 'formats': formats,
+        'thumbnails': [{'url': f'https://i.ytimg.com/vi/{video_id}/{n}.jpg?{noise(40)}', 'id': str(n), 'preference': -n}
+                       for n in range(40)],
+        'automatic_captions': captions,
+        'subtitles': {'en': captions[LANGUAGES[0]]},
+        'heatmap': [{'start_time': n * 2.0, 'end_time': n * 2.0 + 2, 'value': random.random()} for n in range(100)],
+        'channel': noise(20), 'uploader': noise(20), 'view_count': 10 ** 9, 'like_count': 10 ** 7,
+    }
+
+
+def measure(name, build):
+    """Pico de memória alocada para manter ENTRIES entradas vivas"""
+    tracemalloc.start()
+    entries = [build(i) for i in range(ENTRIES)]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    per_entry = size / len(entries)
+    print(f"  {name:<28}{per_entry / 1024:>10.1f} KB/entrada{1024 ** 2 / per_entry:>10.0f} entradas/MB")
+    return per_entry, entries
+
+
+def main():
+    """Executa o benchmark"""
+    print("🚀 Benchmark do cache de metadados")
+    print("=" * 50)
+    random.seed(42)
+
+    infos = [fake_info(i) for i in range(ENTRIES)]
+    raw, _ = measure('info completo (dict)', fake_info)
+    compact, records = measure('MetadataRecord', lambda i: MetadataRecord.from_info(infos[i]))
+    packed, packed_records = measure('MetadataRecord + zlib', lambda i: MetadataRecord.from_info(infos[i], compress=True))
+
+    if records[0].formats != packed_records[0].formats or len(records[0].formats) != len(FORMAT_TEMPLATES):
+        print("❌ Registros compactos não preservam a tabela de formatos")
+        return 1
+
+    print("\n" + "=" * 50)
+    gain = raw / compact
+    print(f"📊 {gain:.0f}x mais entradas por MB ({raw / packed:.0f}x com zlib)")
+    if gain < MIN_GAIN:
+        print(f"❌ Ganho abaixo do mínimo de {MIN_GAIN:.0f}x")
+        return 1
+    print("🎉 Registro compacto dentro do esperado")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
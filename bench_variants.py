@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Benchmark de CPU por saída: uma execução do FFmpeg por variante vs. um FFmpeg com várias saídas
+"""
+
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+from app import FFMPEG_BIN, FORMAT_PROFILES, encode_args, run_ffmpeg, run_ffmpeg_outputs
+from variants import plan_variants, variant_encode_args
+
+DURATION = int(os.environ.get('BENCH_DURATION', 60))
+# Folga para ruído de medição: no áudio o decode é barato perto do encode do LAME e o ganho é pequeno
+TOLERANCE = float(os.environ.get('BENCH_TOLERANCE', 0.10))
+CASES = [
+    ('mp3', ['128k', '192k', '320k']),
+    ('mp4', ['360p', '720p']),
+]
+
+
+def cpu_seconds():
+    """CPU (usuário + sistema) dos processos filhos (FFmpeg)"""
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return children.ru_utime + children.ru_stime
+
+
+def make_source(workdir):
+    """Fonte sintética 1080p H.264 + AAC, como o formato 'best' de um vídeo"""
+    path = os.path.join(workdir, 'fonte.mp4')
+    subprocess.run([
+        FFMPEG_BIN, '-y', '-hide_banner', '-loglevel', 'error',
+        '-f', 'lavfi', '-i', f'testsrc2=size=1920x1080:rate=30:duration={DURATION}',
+        '-f', 'lavfi', '-i', f'sine=frequency=440:duration={DURATION}',
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-c:a', 'aac', '-shortest', path,
+    ], check=True)
+    return path
+
+
+def bench_case(source, workdir, format_type, variants):
+    """CPU total das N execuções separadas e da execução única com N saídas"""
+    profile = FORMAT_PROFILES[format_type]
+    video = bool(profile.get('video'))
+    encode = encode_args(profile)
+
+    start = cpu_seconds()
+    for variant in variants:
+        if video:
+            args = ['-vf', f"scale=w=-2:h='min({variant[:-1]},ih)'"] + variant_encode_args(encode, variant, True, True)
+        else:
+            args = ['-vn'] + variant_encode_args(encode, variant, False)
+        run_ffmpeg(source, os.path.join(workdir, f'separado-{variant}.{profile["ext"]}'), args, profile['muxer'])
+    separate = cpu_seconds() - start
+
+    start = cpu_seconds()
+    filter_graph, outputs_args = plan_variants(encode, variants, video, copy_audio=video)
+    run_ffmpeg_outputs(source, [(os.path.join(workdir, f'unico-{variant}.{profile["ext"]}'), args, profile['muxer'])
+                                for variant, args in zip(variants, outputs_args)], filter_graph=filter_graph)
+    single = cpu_seconds() - start
+    return separate, single
+
+
+def main():
+    """Executa o benchmark"""
+    print("🚀 Benchmark de variantes (um decode, vários encodes)")
+    print("=" * 50)
+    workdir = tempfile.mkdtemp(prefix='bench_variants_')
+    source = make_source(workdir)
+    print(f"Fonte: 1080p, {DURATION}s")
+
+    print(f"\n{'formato':<8}{'variantes':<20}{'separado (CPU-s)':>18}{'único (CPU-s)':>16}{'economia':>10}")
+    worse = False
+    for format_type, variants in CASES:
+        separate, single = bench_case(source, workdir, format_type, variants)
+        saving = 1 - single / separate if separate else 0
+        worse = worse or single > separate * (1 + TOLERANCE)
+        print(f"{format_type:<8}{','.join(variants):<20}{separate:>18.2f}{single:>16.2f}{saving:>10.0%}")
+
+    print("\n" + "=" * 50)
+    if worse:
+        print("❌ A execução única gastou mais CPU que as separadas")
+        return 1
+    print("🎉 Uma decodificação para todas as variantes")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
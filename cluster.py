@@ -0,0 +1,83 @@
+"""
+Modo cluster: distribui os vídeos entre os nós com hashing consistente
+
+Cada instância conhece a lista de nós (CLUSTER_NODES) e a própria URL
+(CLUSTER_SELF). O ID do vídeo define o nó dono; os demais redirecionam ou
+fazem proxy para ele, de modo que cada vídeo seja baixado e cacheado em um
+único lugar. Com nós virtuais, adicionar ou remover um nó move apenas cerca
+de 1/N das chaves.
+"""
+
+import bisect
+import hashlib
+import os
+
+
+class HashRing:
+    """Anel de hashing consistente com nós virtuais"""
+
+    def __init__(self, nodes=(), replicas=160):
+        self.replicas = replicas
+        self._points = []
+        self._owners = {}
+        self.nodes = set()
+        for node in nodes:
+            self.add_node(node)
+
+    @staticmethod
+    def _hash(value):
+        return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], 'big')
+
+    def add_node(self, node):
+        if node in self.nodes:
+            return
+        self.nodes.add(node)
+        for i in range(self.replicas):
+            point = self._hash(f'{node}#{i}')
+            bisect.insort(self._points, point)
+            self._owners[point] = node
+
+    def remove_node(self, node):
+        if node not in self.nodes:
+            return
+        self.nodes.discard(node)
+        for i in range(self.replicas):
+            point = self._hash(f'{node}#{i}')
+            self._points.remove(point)
+            del self._owners[point]
+
+    def get_node(self, key):
+        """Retorna o nó dono da chave"""
+        if not self._points:
+            return None
+        index = bisect.bisect(self._points, self._hash(key)) % len(self._points)
+        return self._owners[self._points[index]]
+
+
+class Cluster:
+    """Configuração do cluster e resolução do nó dono de cada vídeo"""
+
+    def __init__(self, self_url, nodes, routing='redirect'):
+        self.self_url = self_url.rstrip('/')
+        nodes = {node.rstrip('/') for node in nodes}
+        nodes.add(self.self_url)
+        self.ring = HashRing(sorted(nodes))
+        self.routing = routing
+
+    @classmethod
+    def from_env(cls):
+        """Cria o cluster a partir do ambiente; retorna None se o modo cluster estiver desligado"""
+        nodes = [node.strip() for node in os.environ.get('CLUSTER_NODES', '').split(',') if node.strip()]
+        self_url = os.environ.get('CLUSTER_SELF')
+        if not nodes or not self_url:
+            return None
+        routing = os.environ.get('CLUSTER_ROUTING', 'redirect')
+        if routing not in ('redirect', 'proxy'):
+            raise ValueError(f'CLUSTER_ROUTING inválido: {routing}')
+        return cls(self_url, nodes, routing)
+
+    def owner(self, video_id):
+        return self.ring.get_node(video_id)
+
+    def is_local(self, video_id):
+        return self.owner(video_id) == self.self_url
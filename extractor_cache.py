@@ -0,0 +1,197 @@
+"""
+Cache HTTP do extrator (páginas, player JS, API interna e manifests do YouTube)
+
+Cada extract_info busca de novo a página do vídeo, o player JS e a resposta da
+API do player, mesmo quando outro pedido do mesmo vídeo acabou de fazer isso.
+CachingYoutubeDL intercepta essas requisições e guarda as respostas com TTLs
+curtos (o player JS, que muda raramente e tem URL versionada, fica um dia).
+O cache fica em memória e em disco, compartilhado pelos workers da máquina.
+As funções de assinatura já decodificadas pelo yt-dlp vão para `cachedir`,
+também compartilhado. Mídia nunca passa por aqui.
+"""
+
+import hashlib
+import io
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import yt_dlp
+from yt_dlp.networking import Request, Response
+
+# (tipo, padrão da URL, variável de ambiente do TTL, TTL padrão em segundos)
+CACHE_RULES = (
+    ('player_js', re.compile(r'/s/player/[\w-]+/.+\.js'), 'EXTRACTOR_CACHE_PLAYER_TTL', 86400),
+    ('page', re.compile(r'^https?://(?:www\.|m\.)?youtube\.com/(?:watch|embed/|shorts/)'), 'EXTRACTOR_CACHE_PAGE_TTL', 60),
+    ('api', re.compile(r'^https?://(?:www\.)?youtube\.com/youtubei/v1/(?:player|next)'), 'EXTRACTOR_CACHE_API_TTL', 60),
+    ('manifest', re.compile(r'manifest\.googlevideo\.com|\.m3u8(?:\?|$)|\.mpd(?:\?|$)'), 'EXTRACTOR_CACHE_MANIFEST_TTL', 30),
+)
+# Headers que mudam a resposta da API para a mesma URL/corpo
+KEY_HEADERS = ('X-Youtube-Client-Name', 'X-Youtube-Client-Version', 'User-Agent')
+# Headers que não valem para o corpo já decodificado
+DROPPED_HEADERS = ('content-encoding', 'content-length', 'transfer-encoding')
+MAX_ENTRY_BYTES = 8 * 1024 * 1024
+
+
+class ExtractorResponseCache:
+    """Cache de respostas HTTP em memória (LRU) com camada em disco"""
+
+    def __init__(self, directory, max_memory_bytes=64 * 1024 * 1024):
+        self.directory = directory
+        self.sig_cache_dir = os.path.join(directory, 'yt-dlp')
+        os.makedirs(self.sig_cache_dir, exist_ok=True)
+        self.enabled = os.environ.get('EXTRACTOR_CACHE', '1') != '0'
+        self.rules = [(kind, pattern, int(os.environ.get(env, default))) for kind, pattern, env, default in CACHE_RULES]
+        self.max_memory_bytes = max_memory_bytes
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {kind: {'hits': 0, 'misses': 0} for kind, _, _, _ in CACHE_RULES}
+
+    def rule_for(self, req):
+        """Retorna (tipo, ttl) se a requisição pode ser cacheada"""
+        if not self.enabled or req.method not in ('GET', 'POST'):
+            return None
+        for kind, pattern, ttl in self.rules:
+            if ttl > 0 and pattern.search(req.url):
+                return kind, ttl
+        return None
+
+    @staticmethod
+    def key_for(req):
+        digest = hashlib.sha256()
+        digest.update(f'{req.method} {req.url}\n'.encode())
+        for name in KEY_HEADERS:
+            digest.update(f'{name}: {req.headers.get(name, "")}\n'.encode())
+        if req.data:
+            digest.update(req.data if isinstance(req.data, bytes) else str(req.data).encode())
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and entry['expires_at'] > now:
+                self._memory.move_to_end(key)
+                return entry
+        path = self._path(key)
+        try:
+            with open(path + '.json') as f:
+                meta = json.load(f)
+            if meta['expires_at'] <= now:
+                return None
+            with open(path + '.body', 'rb') as f:
+                meta['body'] = f.read()
+        except (OSError, ValueError, KeyError):
+            return None
+        self._remember(key, meta)
+        return meta
+
+    def put(self, key, ttl, url, status, headers, body):
+        entry = {
+            'url': url,
+            'status': status,
+            'headers': headers,
+            'expires_at': time.time() + ttl,
+            'body': body,
+        }
+        self._remember(key, entry)
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Escrita atômica: outro worker pode estar lendo a mesma entrada
+        temp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temp, 'wb') as f:
+            f.write(body)
+        os.replace(temp, path + '.body')
+        meta = {k: v for k, v in entry.items() if k != 'body'}
+        with open(temp, 'w') as f:
+            json.dump(meta, f)
+        os.replace(temp, path + '.json')
+
+    def _remember(self, key, entry):
+        size = len(entry['body'])
+        with self._lock:
+            old = self._memory.pop(key, None)
+            if old:
+                self._memory_bytes -= len(old['body'])
+            self._memory[key] = entry
+            self._memory_bytes += size
+            while self._memory_bytes > self.max_memory_bytes and self._memory:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted['body'])
+
+    def cleanup(self):
+        """Remove entradas expiradas do disco"""
+        now = time.time()
+        for root, _, files in os.walk(self.directory):
+            if root.startswith(self.sig_cache_dir):
+                continue
+            for name in files:
+                if not name.endswith('.json'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    with open(path) as f:
+                        expired = json.load(f)['expires_at'] <= now
+                except (OSError, ValueError, KeyError):
+                    expired = True
+                if expired:
+                    for suffix in ('.json', '.body'):
+                        try:
+                            os.remove(path[:-5] + suffix)
+                        except OSError:
+                            pass
+
+
+_response_cache = None
+
+
+def configure(directory):
+    """Define o diretório do cache usado por todas as instâncias de CachingYoutubeDL"""
+    global _response_cache
+    _response_cache = ExtractorResponseCache(directory)
+    return _response_cache
+
+
+class CachingYoutubeDL(yt_dlp.YoutubeDL):
+    """YoutubeDL que reaproveita páginas, player JS, API e manifests entre requisições"""
+
+    def __init__(self, params=None, *args, **kwargs):
+        params = dict(params or {})
+        if _response_cache is not None:
+            # Funções de assinatura/nsig decodificadas ficam no disco para todos os workers
+            params.setdefault('cachedir', _response_cache.sig_cache_dir)
+        super().__init__(params, *args, **kwargs)
+
+    def urlopen(self, req):
+        cache = _response_cache
+        if isinstance(req, str):
+            req = Request(req)
+        if cache is None or not isinstance(req, Request):
+            return super().urlopen(req)
+
+        rule = cache.rule_for(req)
+        if rule is None:
+            return super().urlopen(req)
+        kind, ttl = rule
+
+        key = cache.key_for(req)
+        entry = cache.get(key)
+        if entry is not None:
+            cache.stats[kind]['hits'] += 1
+            return Response(io.BytesIO(entry['body']), entry['url'], entry['headers'], entry['status'])
+
+        cache.stats[kind]['misses'] += 1
+        response = super().urlopen(req)
+        body = response.read()
+        response.close()
+        headers = {k: v for k, v in response.headers.items() if k.lower() not in DROPPED_HEADERS}
+        if response.status == 200 and len(body) <= MAX_ENTRY_BYTES:
+            cache.put(key, ttl, response.url, response.status, headers, body)
+        return Response(io.BytesIO(body), response.url, headers, response.status)
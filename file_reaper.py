@@ -0,0 +1,61 @@
+"""
+Remoção agendada de arquivos entregues
+
+Sem cache, cada arquivo entregue era removido por uma thread própria que
+dormia 30 s: sob carga eram centenas de threads paradas (cada uma com sua
+pilha) só esperando. Aqui uma única thread guarda os prazos num heap e
+acorda apenas quando o próximo arquivo vence.
+"""
+
+import heapq
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class FileReaper:
+    """Fila de remoções (heap por prazo) atendida por uma única thread daemon"""
+
+    def __init__(self, name='file-reaper'):
+        self.name = name
+        self.stats = {'scheduled': 0, 'removed': 0, 'errors': 0}
+        self._heap = []  # (prazo, sequência, caminho)
+        self._sequence = 0
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def schedule(self, path, delay):
+        """Agenda a remoção de path daqui a delay segundos"""
+        with self._condition:
+            self._sequence += 1
+            heapq.heappush(self._heap, (time.time() + delay, self._sequence, path))
+            self.stats['scheduled'] += 1
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def pending(self):
+        with self._condition:
+            return len(self._heap)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._heap or self._heap[0][0] > time.time():
+                    self._condition.wait(self._heap[0][0] - time.time() if self._heap else None)
+                _, _, path = heapq.heappop(self._heap)
+            self._remove(path)
+
+    def _remove(self, path):
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+                self.stats['removed'] += 1
+                logger.info("Arquivo removido após delay: %s", os.path.basename(path))
+        except Exception as e:
+            self.stats['errors'] += 1
+            logger.error("Erro ao remover arquivo %s: %s", path, e)
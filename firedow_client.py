@@ -0,0 +1,488 @@
+"""
+Cliente Python da API (SDK e linha de comando)
+
+test_api.py, test_production.py e os serviços que chamam a API usavam
+requests.get avulsos: uma conexão TCP (e TLS) nova por chamada, retries e
+polling de jobs reimplementados em cada lugar, downloads grandes recomeçados
+do zero quando a conexão caía. Este cliente concentra isso:
+
+- sessão com pool de conexões (keep-alive) e retries com backoff para GETs
+  (429/502/503/504, respeitando o Retry-After)
+- cache local das respostas JSON pelo Cache-Control/ETag do servidor: dentro
+  do max-age não há requisição; depois, a revalidação custa um 304 sem corpo
+- chamadas idênticas simultâneas (mesmo /info, mesmo download) viram uma só
+- downloads retomados com Range + If-Range a partir do arquivo .part
+- espera de jobs por Server-Sent Events (/jobs/<id>/events), com polling
+  com backoff em servidores sem o endpoint
+- AsyncClient: os mesmos métodos como corrotinas (o Client roda em threads)
+
+Uso:
+
+    url = 'https://www.youtube.com/watch?v=dQw4w9WgXcQ'
+    with Client('http://localhost:5000') as client:
+        info = client.info(url)
+        path = client.download(url, 'mp3', dest='musicas/')
+
+    python firedow_client.py download URL -f mp3 -o musicas/
+"""
+
+import argparse
+import asyncio
+import collections
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+import urllib.parse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_BASE_URL = os.environ.get('FIREDOW_URL', 'http://localhost:5000')
+TERMINAL_STATUSES = ('finished', 'failed')
+# Leituras pequenas: se a conexão cair, o urllib3 descarta o bloco incompleto, e só ele é baixado de novo
+CHUNK_SIZE = 64 * 1024
+
+
+class FiredowError(Exception):
+    """Erro retornado pela API: status HTTP e o corpo JSON (estimativa do 413, Retry-After do 503...)"""
+
+    def __init__(self, message, status=None, payload=None, retry_after=None):
+        self.status = status
+        self.payload = payload or {}
+        self.retry_after = retry_after
+        super().__init__(message)
+
+
+class JobFailed(FiredowError):
+    """O job terminou com status failed"""
+
+
+def _raise_for_error(response):
+    if response.status_code < 400:
+        return
+    try:
+        payload = response.json()
+    except ValueError:
+        payload = {}
+    message = payload.get('error') if isinstance(payload, dict) else None
+    retry_after = response.headers.get('Retry-After')
+    raise FiredowError(message or f'HTTP {response.status_code}', response.status_code, payload,
+                       int(retry_after) if retry_after and retry_after.isdigit() else None)
+
+
+def _max_age(cache_control):
+    """Segundos em que a resposta pode ser reusada sem revalidar; None se não pode ser guardada"""
+    directives = [d.strip().lower() for d in (cache_control or '').split(',')]
+    if 'no-store' in directives:
+        return None
+    if 'no-cache' in directives:
+        return 0
+    for directive in directives:
+        if directive.startswith('max-age='):
+            try:
+                return int(directive[8:])
+            except ValueError:
+                return 0
+    return 0
+
+
+def _download_name(response):
+    """Nome do arquivo pelo Content-Disposition (filename* do RFC 5987 tem preferência)"""
+    header = response.headers.get('Content-Disposition', '')
+    match = re.search(r"filename\*=UTF-8''([^;]+)", header, re.IGNORECASE)
+    if match:
+        name = urllib.parse.unquote(match.group(1))
+    else:
+        match = re.search(r'filename="?([^";]+)"?', header, re.IGNORECASE)
+        name = match.group(1) if match else None
+    if not name:
+        name = os.path.basename(urllib.parse.urlparse(response.url).path) or 'download'
+    return os.path.basename(name.replace('\\', '/'))
+
+
+class SingleFlight:
+    """Chamadas com a mesma chave em andamento viram uma: as demais esperam e recebem o mesmo resultado"""
+
+    def __init__(self):
+        self.stats = {'calls': 0, 'shared': 0}
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func):
+        with self._lock:
+            self.stats['calls'] += 1
+            flight = self._calls.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._calls[key] = {'done': threading.Event(), 'result': None, 'error': None}
+            else:
+                self.stats['shared'] += 1
+        if not leader:
+            flight['done'].wait()
+            if flight['error'] is not None:
+                raise flight['error']
+            return flight['result']
+        try:
+            flight['result'] = func()
+            return flight['result']
+        except BaseException as e:
+            flight['error'] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            flight['done'].set()
+
+
+class ResponseCache:
+    """LRU das respostas JSON com ETag e validade (max-age), para GETs condicionais"""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.stats = {'hits': 0, 'revalidated': 0, 'misses': 0}
+        self._entries = collections.OrderedDict()  # chave -> (etag, payload, expira_em)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, etag, payload, max_age):
+        if self.max_entries <= 0 or max_age is None or (not etag and not max_age):
+            return
+        with self._lock:
+            self._entries[key] = (etag, payload, time.monotonic() + max_age)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class Client:
+    """Cliente da API com pool de conexões, cache condicional, deduplicação e downloads retomáveis"""
+
+    def __init__(self, base_url=DEFAULT_BASE_URL, timeout=(10, 300), retries=3, backoff=0.5, pool_size=10,
+                 cache_entries=256, chunk_size=CHUNK_SIZE):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.chunk_size = chunk_size
+        self.session = requests.Session()
+        # Só GETs são repetidos automaticamente; POST /jobs não é idempotente
+        retry = Retry(total=retries, read=0, status=retries, backoff_factor=backoff,
+                      status_forcelist=(429, 502, 503, 504), allowed_methods=frozenset({'GET', 'HEAD'}),
+                      respect_retry_after_header=True, raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.cache = ResponseCache(cache_entries)
+        self.inflight = SingleFlight()
+        self.stats = {'requests': 0, 'downloaded_bytes': 0, 'resumed': 0}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.session.close()
+
+    def _request(self, method, path, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        self.stats['requests'] += 1
+        return self.session.request(method, path if '://' in path else self.base_url + path, **kwargs)
+
+    def get_json(self, path, params=None):
+        """GET de um endpoint JSON pelo cache local (max-age/ETag) e pela deduplicação. Não altere o retorno."""
+        query = urllib.parse.urlencode(sorted((k, v) for k, v in (params or {}).items() if v is not None))
+        key = f'{path}?{query}'
+        return self.inflight.do(('GET', key), lambda: self._conditional_get(key))
+
+    def _conditional_get(self, key):
+        entry = self.cache.get(key)
+        if entry is not None and entry[2] > time.monotonic():
+            self.cache.stats['hits'] += 1
+            return entry[1]
+        headers = {'If-None-Match': entry[0]} if entry is not None and entry[0] else {}
+        response = self._request('GET', key, headers=headers)
+        max_age = _max_age(response.headers.get('Cache-Control'))
+        if response.status_code == 304 and entry is not None:
+            self.cache.stats['revalidated'] += 1
+            self.cache.put(key, entry[0], entry[1], max_age or 0)
+            return entry[1]
+        _raise_for_error(response)
+        self.cache.stats['misses'] += 1
+        payload = response.json()
+        self.cache.put(key, response.headers.get('ETag'), payload, max_age)
+        return payload
+
+    def health(self):
+        return self.get_json('/health')
+
+    def status(self):
+        return self.get_json('/status')
+
+    def info(self, url):
+        return self.get_json('/info', {'url': url})
+
+    def formats(self, url, **query):
+        """/formats com os filtros do endpoint (audio_only, max_height, sort, limit, fields...)"""
+        return self.get_json('/formats', dict(query, url=url))
+
+    def estimate(self, url, format='mp4', **params):
+        """Tamanho e custo estimados antes de baixar (start, end, preset, variants)"""
+        return self.get_json('/estimate', dict(params, url=url, format=format))
+
+    def download(self, url, format='mp4', dest='.', **params):
+        """Baixa para dest (diretório ou caminho do arquivo), retomando de onde parou; retorna o caminho final"""
+        params = dict(params, url=url, format=format)
+        return self._fetch_file('/download', params, dest)
+
+    def submit_job(self, url, format='mp4', **fields):
+        """Cria um job (start, end, preset, callback_url) e retorna o id"""
+        response = self._request('POST', '/jobs', json=dict(fields, url=url, format=format))
+        _raise_for_error(response)
+        return response.json()['id']
+
+    def job(self, job_id):
+        return self.get_json(f'/jobs/{job_id}')
+
+    def wait_job(self, job_id, timeout=600, poll_interval=1.0, events=True):
+        """Espera o job terminar (SSE, ou polling com backoff) e retorna o estado final; JobFailed se falhar"""
+        deadline = time.monotonic() + timeout
+        job = None
+        if events:
+            job = self._wait_events(job_id, deadline)
+        interval = poll_interval
+        while job is None or job['status'] not in TERMINAL_STATUSES:
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f'Job {job_id} não terminou em {timeout}s')
+            if job is not None:
+                time.sleep(min(interval, max(deadline - time.monotonic(), 0)))
+                interval = min(interval * 1.5, 10)
+            job = self.job(job_id)
+        if job['status'] == 'failed':
+            raise JobFailed(job.get('error') or 'Job falhou', payload=job)
+        return job
+
+    def _wait_events(self, job_id, deadline):
+        """Acompanha /jobs/<id>/events até um estado final; None se o servidor não tiver o endpoint"""
+        job = None
+        while time.monotonic() < deadline:
+            try:
+                response = self._request('GET', f'/jobs/{job_id}/events', stream=True,
+                                         headers={'Accept': 'text/event-stream'},
+                                         timeout=(self.timeout[0], max(deadline - time.monotonic(), 1)))
+            except requests.RequestException:
+                return job
+            with response:
+                if response.status_code in (404, 405):
+                    # Servidor sem o endpoint (ou job inexistente, que o polling reporta): cai no polling
+                    return job
+                _raise_for_error(response)
+                event, data = None, []
+                try:
+                    for line in response.iter_lines(decode_unicode=True):
+                        if line:
+                            field, _, value = line.partition(':')
+                            if field == 'event':
+                                event = value.strip()
+                            elif field == 'data':
+                                data.append(value.lstrip())
+                            continue
+                        if event == 'job' and data:
+                            job = json.loads('\n'.join(data))
+                            if job['status'] in TERMINAL_STATUSES:
+                                return job
+                        elif event == 'gone':
+                            raise FiredowError('Job expirou', 404)
+                        event, data = None, []
+                except requests.RequestException:
+                    pass
+            # Conexão encerrada antes do fim (duração máxima do servidor ou rede): reconecta como o EventSource
+            time.sleep(min(1, max(deadline - time.monotonic(), 0)))
+        return job
+
+    def download_job(self, job_id, dest='.'):
+        """Baixa o arquivo de um job concluído (segue o redirect do object store), retomando se cair"""
+        return self._fetch_file(f'/jobs/{job_id}/file', {}, dest)
+
+    def run_job(self, url, format='mp4', dest='.', timeout=600, **fields):
+        """Cria o job, espera terminar e baixa o arquivo"""
+        job_id = self.submit_job(url, format, **fields)
+        self.wait_job(job_id, timeout)
+        return self.download_job(job_id, dest)
+
+    def _fetch_file(self, path, params, dest):
+        key = (path, tuple(sorted(params.items())), os.path.abspath(dest))
+        return self.inflight.do(('FILE',) + key, lambda: self._resumable_get(path, params, dest))
+
+    def _resumable_get(self, path, params, dest):
+        to_directory = os.path.isdir(dest) or dest.endswith(os.sep)
+        directory = dest if to_directory else os.path.dirname(dest) or '.'
+        os.makedirs(directory, exist_ok=True)
+        if to_directory:
+            # Nome do .part derivado do pedido: uma nova chamada com os mesmos parâmetros encontra o parcial
+            digest = hashlib.sha1(json.dumps([path, sorted(params.items())]).encode()).hexdigest()[:16]
+            part = os.path.join(directory, f'.firedow-{digest}.part')
+        else:
+            part = dest + '.part'
+        validator_path = part + '.etag'
+
+        for attempt in range(self.retries + 1):
+            offset = os.path.getsize(part) if os.path.exists(part) else 0
+            etag = None
+            if offset and os.path.exists(validator_path):
+                with open(validator_path) as f:
+                    etag = f.read().strip()
+            headers = {}
+            if offset and etag:
+                # If-Range: se o arquivo no servidor mudou, vem 200 com o arquivo novo inteiro
+                headers = {'Range': f'bytes={offset}-', 'If-Range': etag}
+            try:
+                response = self._request('GET', path, params=params, headers=headers, stream=True)
+                with response:
+                    if response.status_code == 416:
+                        os.remove(part)
+                        continue
+                    _raise_for_error(response)
+                    resumed = response.status_code == 206 and response.headers.get(
+                        'Content-Range', '').startswith(f'bytes {offset}-')
+                    if resumed:
+                        self.stats['resumed'] += 1
+                    else:
+                        offset = 0
+                    new_etag = response.headers.get('ETag')
+                    if new_etag and not new_etag.startswith('W/'):
+                        with open(validator_path, 'w') as f:
+                            f.write(new_etag)
+                    elif os.path.exists(validator_path):
+                        os.remove(validator_path)
+                    expected = response.headers.get('Content-Length')
+                    written = 0
+                    with open(part, 'ab' if resumed else 'wb') as f:
+                        for chunk in response.iter_content(self.chunk_size):
+                            f.write(chunk)
+                            written += len(chunk)
+                            self.stats['downloaded_bytes'] += len(chunk)
+                    if expected is not None and written < int(expected):
+                        raise requests.ConnectionError(f'Corpo incompleto: {written} de {expected} bytes')
+                    final = os.path.join(directory, _download_name(response)) if to_directory else dest
+            except (requests.ConnectionError, requests.exceptions.ChunkedEncodingError, requests.Timeout):
+                # Conexão caiu no meio: a próxima tentativa continua do tamanho atual do .part
+                if attempt >= self.retries:
+                    raise
+                time.sleep(self.backoff * 2 ** attempt)
+                continue
+            os.replace(part, final)
+            if os.path.exists(validator_path):
+                os.remove(validator_path)
+            return final
+        raise FiredowError(f'Download de {path} não concluído após {self.retries + 1} tentativas')
+
+
+class AsyncClient:
+    """Variante asyncio: os métodos do Client como corrotinas, executados em threads sobre a mesma sessão"""
+
+    def __init__(self, *args, **kwargs):
+        self.client = Client(*args, **kwargs)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        await asyncio.to_thread(self.client.close)
+
+    async def get_json(self, path, params=None):
+        return await asyncio.to_thread(self.client.get_json, path, params)
+
+    async def health(self):
+        return await asyncio.to_thread(self.client.health)
+
+    async def info(self, url):
+        return await asyncio.to_thread(self.client.info, url)
+
+    async def formats(self, url, **query):
+        return await asyncio.to_thread(self.client.formats, url, **query)
+
+    async def estimate(self, url, format='mp4', **params):
+        return await asyncio.to_thread(self.client.estimate, url, format, **params)
+
+    async def download(self, url, format='mp4', dest='.', **params):
+        return await asyncio.to_thread(self.client.download, url, format, dest, **params)
+
+    async def submit_job(self, url, format='mp4', **fields):
+        return await asyncio.to_thread(self.client.submit_job, url, format, **fields)
+
+    async def job(self, job_id):
+        return await asyncio.to_thread(self.client.job, job_id)
+
+    async def wait_job(self, job_id, timeout=600, poll_interval=1.0, events=True):
+        return await asyncio.to_thread(self.client.wait_job, job_id, timeout, poll_interval, events)
+
+    async def download_job(self, job_id, dest='.'):
+        return await asyncio.to_thread(self.client.download_job, job_id, dest)
+
+    async def run_job(self, url, format='mp4', dest='.', timeout=600, **fields):
+        return await asyncio.to_thread(self.client.run_job, url, format, dest, timeout, **fields)
+
+
+def main(argv=None):
+    """Linha de comando: info, formats, estimate, download e job"""
+    parser = argparse.ArgumentParser(description='Cliente da API de download')
+    parser.add_argument('--server', default=DEFAULT_BASE_URL, help='URL da API (padrão: $FIREDOW_URL)')
+    commands = parser.add_subparsers(dest='command', required=True)
+    for name in ('info', 'formats'):
+        commands.add_parser(name).add_argument('url')
+    for name in ('estimate', 'download', 'job'):
+        command = commands.add_parser(name)
+        command.add_argument('url')
+        command.add_argument('-f', '--format', default='mp4')
+        command.add_argument('--start')
+        command.add_argument('--end')
+        command.add_argument('--preset')
+        if name != 'job':
+            command.add_argument('--variants')
+        if name != 'estimate':
+            command.add_argument('-o', '--output', default='.', help='Diretório ou arquivo de destino')
+    args = parser.parse_args(argv)
+
+    with Client(args.server) as client:
+        try:
+            if args.command in ('info', 'formats'):
+                result = getattr(client, args.command)(args.url)
+            else:
+                params = {name: getattr(args, name, None) for name in ('start', 'end', 'preset', 'variants')}
+                params = {name: value for name, value in params.items() if value is not None}
+                if args.command == 'estimate':
+                    result = client.estimate(args.url, args.format, **params)
+                elif args.command == 'download':
+                    result = {'file': client.download(args.url, args.format, args.output, **params)}
+                else:
+                    result = {'file': client.run_job(args.url, args.format, args.output, **params)}
+        except FiredowError as e:
+            print(json.dumps(dict(e.payload, status=e.status) if e.payload else {'error': str(e)},
+                             ensure_ascii=False, indent=2), file=sys.stderr)
+            return 1
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
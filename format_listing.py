@@ -0,0 +1,111 @@
+"""
+Listagem de formatos a partir dos metadados em cache
+
+O info do yt-dlp traz dezenas de formatos com URLs, headers e fragmentos que o
+cliente não usa. Aqui cada formato é reduzido a poucos campos escalares
+(projeção guardada no cache de metadados) e as consultas filtram, ordenam e
+paginam essa projeção, devolvendo só as colunas pedidas.
+"""
+
+# Campos guardados por formato; o resto do dict do yt-dlp é descartado
+FIELDS = (
+    'format_id', 'ext', 'protocol', 'vcodec', 'acodec', 'width', 'height', 'fps',
+    'tbr', 'abr', 'vbr', 'asr', 'filesize', 'filesize_approx', 'format_note', 'dynamic_range',
+)
+DEFAULT_FIELDS = ('format_id', 'ext', 'vcodec', 'acodec', 'height', 'tbr', 'filesize')
+SORT_KEYS = {
+    'size': lambda f: f.get('filesize') or f.get('filesize_approx'),
+    'bitrate': lambda f: f.get('tbr'),
+    'height': lambda f: f.get('height'),
+}
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+
+def project(formats):
+    """Reduz os formatos do yt-dlp aos FIELDS, mantendo a ordem (pior -> melhor) usada na seleção"""
+    projected = []
+    for f in formats or []:
+        if f.get('ext') == 'mhtml':
+            continue  # storyboards: só imagens de preview
+        projected.append({field: f[field] for field in FIELDS if f.get(field) is not None})
+    return projected
+
+
+def is_audio_only(f):
+    return f.get('vcodec') == 'none' and f.get('acodec') not in (None, 'none')
+
+
+def parse_query(args):
+    """Valida os parâmetros de /formats; levanta ValueError com a mensagem para o cliente"""
+    def integer(name, default):
+        value = args.get(name)
+        if value in (None, ''):
+            return default
+        try:
+            number = int(value)
+        except ValueError:
+            raise ValueError(f'{name} deve ser um inteiro')
+        if number < 0:
+            raise ValueError(f'{name} não pode ser negativo')
+        return number
+
+    fields = tuple(f for f in (args.get('fields') or '').split(',') if f) or DEFAULT_FIELDS
+    unknown = [f for f in fields if f not in FIELDS]
+    if unknown:
+        raise ValueError(f"Campos desconhecidos: {', '.join(unknown)}. Disponíveis: {', '.join(FIELDS)}")
+    sort = args.get('sort') or None
+    if sort is not None and sort not in SORT_KEYS:
+        raise ValueError(f"sort deve ser um de: {', '.join(SORT_KEYS)}")
+    order = args.get('order') or 'desc'
+    if order not in ('asc', 'desc'):
+        raise ValueError('order deve ser asc ou desc')
+    limit = integer('limit', DEFAULT_LIMIT)
+    if limit < 1:
+        # Página vazia nunca avança o next_offset: um cliente que o segue ficaria em loop
+        raise ValueError('limit deve ser ao menos 1')
+    return {
+        'audio_only': (args.get('audio_only') or '').lower() in ('1', 'true', 'yes'),
+        'max_height': integer('max_height', None),
+        'codec': (args.get('codec') or '').lower() or None,
+        'ext': tuple(e for e in (args.get('ext') or '').lower().split(',') if e) or None,
+        'sort': sort,
+        'order': order,
+        'offset': integer('offset', 0),
+        'limit': min(limit, MAX_LIMIT),
+        'fields': fields,
+    }
+
+
+def query(formats, audio_only=False, max_height=None, codec=None, ext=None, sort=None, order='desc',
+          offset=0, limit=DEFAULT_LIMIT, fields=DEFAULT_FIELDS):
+    """Filtra, ordena e pagina a projeção; o resultado é colunar ({campo: [valores]})"""
+    selected = []
+    for f in formats:
+        if audio_only and not is_audio_only(f):
+            continue
+        if max_height is not None and (f.get('height') or 0) > max_height:
+            continue
+        if codec and not (f.get('vcodec', '').lower().startswith(codec) or
+                          f.get('acodec', '').lower().startswith(codec)):
+            continue
+        if ext and f.get('ext') not in ext:
+            continue
+        selected.append(f)
+
+    if sort:
+        key = SORT_KEYS[sort]
+        known = [f for f in selected if key(f) is not None]
+        # Formatos sem o valor (tamanho desconhecido, por exemplo) ficam sempre no fim
+        selected = sorted(known, key=key, reverse=order == 'desc') + [f for f in selected if key(f) is None]
+
+    page = selected[offset:offset + limit]
+    next_offset = offset + len(page)
+    return {
+        'total': len(selected),
+        'offset': offset,
+        'limit': limit,
+        'next_offset': next_offset if page and next_offset < len(selected) else None,
+        'fields': list(fields),
+        'formats': {field: [f.get(field) for f in page] for field in fields},
+    }
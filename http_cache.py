@@ -0,0 +1,65 @@
+"""
+Compressão e revalidação das respostas JSON
+
+Frontends consultam /info, /status e afins repetidamente e recebem o mesmo
+JSON a cada vez. Aqui cada resposta JSON ganha um ETag forte (do conteúdo, ou
+da versão dos metadados quando a rota informa) e vira 304 se o cliente já tem
+essa versão; acima de um tamanho mínimo o corpo é comprimido com brotli
+(se o pacote estiver instalado) ou gzip, conforme o Accept-Encoding.
+"""
+
+import gzip
+import hashlib
+
+try:
+    import brotli
+except ImportError:  # opcional: sem o pacote, só gzip
+    brotli = None
+
+
+def negotiate_encoding(accept_encodings):
+    """Escolhe br ou gzip a partir do Accept-Encoding (werkzeug Accept); None = sem compressão"""
+    candidates = (['br'] if brotli is not None else []) + ['gzip']
+    best = None
+    for encoding in candidates:
+        quality = accept_encodings[encoding]
+        if quality > 0 and (best is None or quality > best[1]):
+            best = (encoding, quality)
+    return best[0] if best else None
+
+
+def compress(data, encoding, level=6):
+    if encoding == 'br':
+        return brotli.compress(data, quality=min(level, 11))
+    return gzip.compress(data, compresslevel=min(level, 9), mtime=0)
+
+
+def finalize_json(response, request, cache_control=None, min_size=1024, level=6):
+    """ETag + 304, Cache-Control e compressão negociada de uma resposta JSON"""
+    if (response.mimetype != 'application/json' or response.direct_passthrough or
+            response.status_code != 200 or 'Content-Encoding' in response.headers):
+        return response
+    if cache_control and 'Cache-Control' not in response.headers:
+        response.headers['Cache-Control'] = cache_control
+
+    data = response.get_data()
+    encoding = negotiate_encoding(request.accept_encodings) if len(data) >= min_size else None
+    if len(data) >= min_size:
+        response.vary.add('Accept-Encoding')
+
+    etag, _ = response.get_etag()
+    if etag is None:
+        etag = hashlib.sha1(data).hexdigest()[:20]
+    if encoding:
+        # Cada codificação é uma representação diferente: ETag forte distinto
+        etag = f'{etag}-{encoding}'
+    response.set_etag(etag)
+    if request.method in ('GET', 'HEAD'):
+        response.make_conditional(request)
+        if response.status_code == 304:
+            return response
+
+    if encoding:
+        response.set_data(compress(data, encoding, level))
+        response.headers['Content-Encoding'] = encoding
+    return response
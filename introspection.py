@@ -0,0 +1,130 @@
+"""
+Introspecção de memória, descritores de arquivo e threads do processo
+
+Workers de longa duração que crescem devagar em RSS ou esgotam o limite de
+FDs (conexões HTTP do yt-dlp, pipes do FFmpeg, threads esquecidas) são
+difíceis de diagnosticar por fora. Aqui ficam leituras baratas do próprio
+processo (via /proc no Linux) para o endpoint de introspecção e para o soak
+test: RSS, FDs abertos por tipo, threads vivas agrupadas por nome e, quando
+ligado, os maiores alocadores segundo o tracemalloc.
+"""
+
+import gc
+import os
+import re
+import resource
+import sys
+import threading
+import tracemalloc
+
+FD_DIR = '/proc/self/fd'
+
+
+def rss_bytes():
+    """Memória residente atual (VmRSS); fora do Linux, o pico informado pelo getrusage"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _fd_type(target):
+    if target.startswith('socket:'):
+        return 'socket'
+    if target.startswith('pipe:'):
+        return 'pipe'
+    if target.startswith('anon_inode:'):
+        return 'anon_inode'
+    if target.startswith('/dev/'):
+        return 'device'
+    if target.startswith('/'):
+        return 'file'
+    return 'other'
+
+
+def fd_counts():
+    """FDs abertos por tipo (socket, pipe, file...), total e limite do processo"""
+    soft_limit = resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+    counts = {}
+    try:
+        fds = os.listdir(FD_DIR)
+    except OSError:
+        return {'total': None, 'limit': soft_limit, 'by_type': {}}
+    for fd in fds:
+        try:
+            kind = _fd_type(os.readlink(os.path.join(FD_DIR, fd)))
+        except OSError:
+            # Fechado entre o listdir e o readlink (incluindo o FD do próprio listdir)
+            continue
+        counts[kind] = counts.get(kind, 0) + 1
+    return {'total': sum(counts.values()), 'limit': soft_limit, 'by_type': counts}
+
+
+def open_files(kind='file', limit=50):
+    """Caminhos dos FDs de um tipo, para achar o que ficou aberto"""
+    targets = []
+    for fd in os.listdir(FD_DIR):
+        try:
+            target = os.readlink(os.path.join(FD_DIR, fd))
+        except OSError:
+            continue
+        if _fd_type(target) == kind:
+            targets.append(target)
+    return sorted(targets)[:limit]
+
+
+def thread_counts():
+    """Threads vivas agrupadas pelo nome sem o número sequencial (Thread-12 (run_job) -> Thread (run_job))"""
+    groups = {}
+    daemon = 0
+    threads = threading.enumerate()
+    for thread in threads:
+        name = re.sub(r'[-_]?\d+', '', thread.name) or thread.name
+        groups[name] = groups.get(name, 0) + 1
+        daemon += thread.daemon
+    return {'total': len(threads), 'daemon': daemon,
+            'by_name': dict(sorted(groups.items(), key=lambda item: -item[1]))}
+
+
+def start_tracing(frames=1):
+    """Liga o tracemalloc (custa CPU e memória em cada alocação; só quando configurado)"""
+    if frames > 0 and not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+
+
+def top_allocations(limit=20, group_by='lineno'):
+    """Maiores alocadores vivos segundo o tracemalloc; None se ele estiver desligado"""
+    if not tracemalloc.is_tracing():
+        return None
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    ))
+    current, peak = tracemalloc.get_traced_memory()
+    stats = snapshot.statistics(group_by)
+    return {
+        'traced_bytes': current,
+        'peak_bytes': peak,
+        'top': [{'location': str(stat.traceback[0]), 'size': stat.size, 'count': stat.count}
+                for stat in stats[:limit]],
+    }
+
+
+def snapshot(top=20, collect=False):
+    """Todas as métricas do processo; collect=True roda o GC antes (separa lixo de vazamento)"""
+    if collect:
+        gc.collect()
+    return {
+        'pid': os.getpid(),
+        'rss_bytes': rss_bytes(),
+        'fds': fd_counts(),
+        'threads': thread_counts(),
+        'gc': {'objects': len(gc.get_objects()), 'garbage': len(gc.garbage), 'counts': gc.get_count()},
+        'tracemalloc': top_allocations(top),
+    }
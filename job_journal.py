@@ -0,0 +1,93 @@
+"""
+Journal persistente de downloads (append-only, em SQLite)
+
+Cada download registra eventos `started`, `finished`, `failed` ou `abandoned`
+(interrompido sem ninguém para receber o resultado). Após um
+restart ou crash, as entradas que ficaram só com `started` indicam downloads
+interrompidos, que podem ser retomados a partir dos arquivos .part do yt-dlp.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class JobJournal:
+    """Journal append-only de downloads"""
+
+    TERMINAL_EVENTS = ('finished', 'failed', 'abandoned')
+    _TERMINAL_PLACEHOLDERS = ', '.join('?' * len(TERMINAL_EVENTS))
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS events ('
+            ' seq INTEGER PRIMARY KEY AUTOINCREMENT,'
+            ' job_id TEXT NOT NULL,'
+            ' event TEXT NOT NULL,'
+            ' payload TEXT NOT NULL,'
+            ' created_at REAL NOT NULL)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS events_job_id ON events (job_id)')
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            # FULL garante que o evento está no disco antes de seguir com o download
+            conn.execute('PRAGMA synchronous=FULL')
+            self._local.conn = conn
+        return conn
+
+    def append(self, job_id, event, **payload):
+        self._connection().execute(
+            'INSERT INTO events (job_id, event, payload, created_at) VALUES (?, ?, ?, ?)',
+            (job_id, event, json.dumps(payload), time.time())
+        )
+
+    def pending(self):
+        """Retorna [(job_id, payload do último started)] dos downloads sem evento final"""
+        rows = self._connection().execute(
+            'SELECT e.job_id, e.payload FROM events e'
+            ' WHERE e.seq IN (SELECT MAX(seq) FROM events WHERE event = ? GROUP BY job_id)'
+            f' AND NOT EXISTS (SELECT 1 FROM events t WHERE t.job_id = e.job_id AND t.event IN ({self._TERMINAL_PLACEHOLDERS}))'
+            ' ORDER BY e.seq',
+            ('started',) + self.TERMINAL_EVENTS
+        ).fetchall()
+        return [(job_id, json.loads(payload)) for job_id, payload in rows]
+
+    def attempts(self, job_id):
+        """Quantas vezes o download já foi iniciado (o original mais as retomadas)"""
+        return self._connection().execute(
+            'SELECT COUNT(*) FROM events WHERE job_id = ? AND event = ?', (job_id, 'started')
+        ).fetchone()[0]
+
+    def is_pending(self, job_id):
+        """True se o último evento do download é um `started`"""
+        row = self._connection().execute(
+            'SELECT event FROM events WHERE job_id = ? ORDER BY seq DESC LIMIT 1', (job_id,)
+        ).fetchone()
+        return row is not None and row[0] == 'started'
+
+    def history(self, job_id):
+        rows = self._connection().execute(
+            'SELECT event, payload, created_at FROM events WHERE job_id = ? ORDER BY seq', (job_id,)
+        ).fetchall()
+        return [{'event': event, 'created_at': created_at, **json.loads(payload)} for event, payload, created_at in rows]
+
+    def compact(self, max_age):
+        """Remove os eventos de downloads concluídos há mais de max_age segundos"""
+        self._connection().execute(
+            'DELETE FROM events WHERE job_id IN ('
+            f' SELECT job_id FROM events WHERE event IN ({self._TERMINAL_PLACEHOLDERS})'
+            ' GROUP BY job_id HAVING MAX(created_at) < ?)',
+            self.TERMINAL_EVENTS + (time.time() - max_age,)
+        )
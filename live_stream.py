@@ -0,0 +1,181 @@
+"""
+Transmissões ao vivo e estreias
+
+O fluxo normal assume um vídeo com fim (VOD): com uma live o yt-dlp baixaria
+até a transmissão acabar, prendendo um worker por horas. Aqui ficam a
+detecção (pelo live_status dos metadados) e a leitura incremental da playlist
+HLS: os segmentos são entregues à medida que aparecem, sempre com um limite
+de duração e de tempo de relógio, então uma live nunca segura um worker
+indefinidamente.
+"""
+
+import re
+import time
+import urllib.parse
+import urllib.request
+
+# live_status do yt-dlp que não podem seguir o fluxo de VOD
+LIVE_STATUSES = ('is_live', 'is_upcoming')
+
+
+class LiveStreamError(Exception):
+    """Live ou estreia pedida no modo de download normal (VOD)"""
+
+    status = 409
+
+    def __init__(self, live_status, release_timestamp=None):
+        self.live_status = live_status
+        self.release_timestamp = release_timestamp
+        if live_status == 'is_upcoming':
+            message = 'Transmissão ainda não começou'
+            if release_timestamp:
+                message += f" (início previsto: {time.strftime('%Y-%m-%d %H:%M:%S UTC', time.gmtime(release_timestamp))})"
+        else:
+            message = 'Transmissão ao vivo: use live=stream ou live=record'
+        super().__init__(message)
+
+    @property
+    def retry_after(self):
+        if self.live_status == 'is_upcoming' and self.release_timestamp:
+            return max(int(self.release_timestamp - time.time()), 1)
+        return None
+
+
+class LiveModeUnavailable(LiveStreamError):
+    """Modo ao vivo pedido para algo que não é uma live HLS em andamento"""
+
+    status = 400
+
+    def __init__(self, live_status, message):
+        self.live_status = live_status
+        self.release_timestamp = None
+        Exception.__init__(self, message)
+
+
+def check_not_live(info):
+    """Levanta LiveStreamError se o info do yt-dlp for de uma live ou estreia futura"""
+    live_status = info.get('live_status') or ('is_live' if info.get('is_live') else None)
+    if live_status in LIVE_STATUSES:
+        raise LiveStreamError(live_status, info.get('release_timestamp'))
+
+
+def parse_playlist(text, base_url):
+    """Interpreta uma playlist HLS: variantes (master) ou segmentos (media)"""
+    playlist = {'variants': [], 'segments': [], 'media_sequence': 0, 'target_duration': 6.0,
+                'ended': False, 'init': None}
+    duration = None
+    bandwidth = None
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith('#EXT-X-STREAM-INF'):
+            match = re.search(r'BANDWIDTH=(\d+)', line)
+            bandwidth = int(match.group(1)) if match else 0
+        elif line.startswith('#EXT-X-MEDIA-SEQUENCE:'):
+            playlist['media_sequence'] = int(line.split(':', 1)[1])
+        elif line.startswith('#EXT-X-TARGETDURATION:'):
+            playlist['target_duration'] = float(line.split(':', 1)[1])
+        elif line.startswith('#EXT-X-ENDLIST'):
+            playlist['ended'] = True
+        elif line.startswith('#EXT-X-MAP:'):
+            match = re.search(r'URI="([^"]+)"', line)
+            if match:
+                playlist['init'] = urllib.parse.urljoin(base_url, match.group(1))
+        elif line.startswith('#EXTINF:'):
+            duration = float(line.split(':', 1)[1].split(',', 1)[0])
+        elif not line.startswith('#'):
+            url = urllib.parse.urljoin(base_url, line)
+            if bandwidth is not None:
+                playlist['variants'].append((bandwidth, url))
+                bandwidth = None
+            else:
+                sequence = playlist['media_sequence'] + len(playlist['segments'])
+                playlist['segments'].append((sequence, duration or 0.0, url))
+                duration = None
+    return playlist
+
+
+class HlsLiveReader:
+    """Segue uma playlist HLS ao vivo e produz os bytes dos segmentos novos"""
+
+    def __init__(self, playlist_url, headers=None, max_duration=600, edge_segments=3, timeout=10, stall_timeout=None):
+        self.playlist_url = playlist_url
+        self.headers = headers or {}
+        self.max_duration = max_duration
+        self.edge_segments = edge_segments
+        self.timeout = timeout
+        self.stall_timeout = stall_timeout
+        self.stats = {'segments': 0, 'seconds': 0.0, 'bytes': 0, 'skipped': 0}
+        self.stopped = False
+        self.container = None
+        self._probed = None
+
+    def _get(self, url):
+        request = urllib.request.Request(url, headers=self.headers)
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return response.read()
+
+    def _playlist(self):
+        url = self.playlist_url
+        playlist = parse_playlist(self._get(url).decode('utf-8', 'replace'), url)
+        if playlist['variants']:
+            # Playlist master: segue a variante de maior bitrate
+            url = max(playlist['variants'])[1]
+            self.playlist_url = url
+            playlist = parse_playlist(self._get(url).decode('utf-8', 'replace'), url)
+        return playlist
+
+    def probe(self):
+        """Carrega a playlist para saber o container dos segmentos: fMP4 (com EXT-X-MAP) ou MPEG-TS"""
+        self._probed = self._playlist()
+        self.container = 'mp4' if self._probed['init'] else 'ts'
+        return self.container
+
+    def stop(self):
+        self.stopped = True
+
+    def segments(self):
+        """Gera os bytes de cada segmento até max_duration, fim da transmissão, travamento ou stop()"""
+        started = time.time()
+        next_sequence = None
+        last_progress = started
+        init_sent = False
+        while not self.stopped:
+            playlist, self._probed = self._probed or self._playlist(), None
+            target = playlist['target_duration']
+            stall_timeout = self.stall_timeout or max(3 * target, 30)
+            # Teto de relógio: a duração pedida + folga para a playlist atrasar um pouco
+            if time.time() - started > self.max_duration + stall_timeout:
+                return
+            segments = playlist['segments']
+            if next_sequence is None:
+                # Começa perto da borda ao vivo, como os players
+                next_sequence = segments[-self.edge_segments][0] if len(segments) >= self.edge_segments else (
+                    segments[0][0] if segments else playlist['media_sequence'])
+            elif segments and segments[0][0] > next_sequence:
+                # Ficamos para trás e a janela da playlist já descartou segmentos
+                self.stats['skipped'] += segments[0][0] - next_sequence
+                next_sequence = segments[0][0]
+
+            fresh = [segment for segment in segments if segment[0] >= next_sequence]
+            if playlist['init'] and not init_sent:
+                yield self._get(playlist['init'])
+                init_sent = True
+            for sequence, duration, url in fresh:
+                if self.stopped or self.stats['seconds'] >= self.max_duration:
+                    return
+                data = self._get(url)
+                self.stats['segments'] += 1
+                self.stats['seconds'] += duration
+                self.stats['bytes'] += len(data)
+                next_sequence = sequence + 1
+                last_progress = time.time()
+                yield data
+            if self.stats['seconds'] >= self.max_duration or playlist['ended']:
+                return
+            if time.time() - last_progress > stall_timeout:
+                # A playlist parou de andar: a transmissão provavelmente caiu
+                return
+            # Recarrega a playlist a cada metade da duração alvo (RFC 8216 §6.3.4)
+            time.sleep(target / 2)
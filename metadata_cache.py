@@ -0,0 +1,152 @@
+"""
+Cache compacto dos metadados de vídeos
+
+O info do yt-dlp de um vídeo ocupa centenas de KB em memória (formatos com
+URLs, headers e fragmentos, dezenas de thumbnails, legendas e legendas
+automáticas em todas as línguas). O app só usa título, duração, thumbnail e a
+tabela de formatos (mais o live_status, para desviar lives e estreias), então
+cada entrada guarda apenas isso:
+
+- MetadataRecord usa __slots__ (sem __dict__ por instância)
+- a tabela de formatos é uma tupla de linhas (tuplas na ordem de FIELDS), com
+  os textos repetidos (ext, codecs, protocolo) internados e compartilhados
+- opcionalmente a tabela fica comprimida com zlib e só é expandida na consulta
+
+Na frente do estado compartilhado fica um LRU em memória por worker, para não
+decodificar o JSON do SQLite/Redis a cada pedido.
+"""
+
+import hashlib
+import json
+import sys
+import threading
+import zlib
+from collections import OrderedDict
+
+from format_listing import FIELDS, project
+
+# Colunas de texto com poucos valores distintos: uma única cópia por processo
+_INTERNED = {'ext', 'protocol', 'vcodec', 'acodec', 'format_note', 'dynamic_range'}
+
+
+def _row(f):
+    return tuple(sys.intern(f[field]) if field in _INTERNED and isinstance(f.get(field), str) else f.get(field)
+                 for field in FIELDS)
+
+
+class MetadataRecord:
+    """Título, duração, thumbnail e tabela de formatos de um vídeo"""
+
+    __slots__ = ('id', 'title', 'duration', 'thumbnail', 'live_status', 'release_timestamp', 'version',
+                 '_rows', '_packed')
+
+    def __init__(self, video_id, title, duration, thumbnail, rows, compress=False, live_status=None,
+                 release_timestamp=None):
+        self.id = video_id
+        self.title = title
+        self.duration = duration
+        self.thumbnail = thumbnail
+        self.live_status = live_status
+        self.release_timestamp = release_timestamp
+        packed = json.dumps(rows, separators=(',', ':')).encode()
+        # Versão do conteúdo: base dos ETags das respostas montadas a partir deste registro
+        self.version = hashlib.sha1(json.dumps(
+            [video_id, title, duration, thumbnail, live_status, release_timestamp]).encode() + packed).hexdigest()[:16]
+        if compress:
+            self._rows = None
+            self._packed = zlib.compress(packed, 6)
+        else:
+            self._rows = tuple(rows)
+            self._packed = None
+
+    @classmethod
+    def from_info(cls, info, compress=False):
+        """Extrai do info do yt-dlp só o que o app usa"""
+        return cls(info.get('id'), info.get('title', 'Unknown'), info.get('duration', 0), info.get('thumbnail', ''),
+                   [_row(f) for f in project(info.get('formats'))], compress,
+                   info.get('live_status'), info.get('release_timestamp'))
+
+    @classmethod
+    def from_state(cls, value, compress=False):
+        """Reconstrói a partir do formato guardado no estado compartilhado (None se for de outra versão)"""
+        if not isinstance(value, dict) or 'rows' not in value:
+            return None
+        # Mapeia pelas colunas gravadas, então mudanças em FIELDS não desalinham entradas antigas
+        rows = [_row(dict(zip(value['fields'], row))) for row in value['rows']]
+        return cls(value['id'], value['title'], value['duration'], value['thumbnail'], rows, compress,
+                   value.get('live_status'), value.get('release_timestamp'))
+
+    def to_state(self):
+        """Forma serializável em JSON: colunas uma vez e linhas como listas"""
+        return {
+            'id': self.id,
+            'title': self.title,
+            'duration': self.duration,
+            'thumbnail': self.thumbnail,
+            'live_status': self.live_status,
+            'release_timestamp': self.release_timestamp,
+            'fields': list(FIELDS),
+            'rows': [list(row) for row in self.rows],
+        }
+
+    @property
+    def rows(self):
+        if self._rows is not None:
+            return self._rows
+        return tuple(tuple(row) for row in json.loads(zlib.decompress(self._packed)))
+
+    @property
+    def formats(self):
+        """Formatos como dicts (só com os campos presentes), na ordem pior -> melhor do yt-dlp"""
+        return [{field: value for field, value in zip(FIELDS, row) if value is not None} for row in self.rows]
+
+
+class MetadataCache:
+    """LRU em memória na frente do estado compartilhado (namespace 'metadata')"""
+
+    def __init__(self, state, ttl, max_entries=1000, compress=False):
+        self.state = state
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.compress = compress
+        self.stats = {'hits': 0, 'shared_hits': 0, 'misses': 0}
+        self._entries = OrderedDict()  # chave -> (expira_em, MetadataRecord)
+        self._lock = threading.Lock()
+
+    def get(self, key, now):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return entry[1]
+        record = MetadataRecord.from_state(self.state.get('metadata', key), self.compress)
+        if record is None:
+            self.stats['misses'] += 1
+            return None
+        # Veio de outro worker; o TTL local é conservador porque não sabemos quando foi gravado
+        self.stats['shared_hits'] += 1
+        self._remember(key, record, now + self.ttl / 2)
+        return record
+
+    def put(self, key, info, now):
+        """Guarda o info do yt-dlp (já reduzido) e retorna o registro"""
+        return self.put_record(key, MetadataRecord.from_info(info, self.compress), now)
+
+    def put_record(self, key, record, now):
+        """Guarda um registro já reduzido (por exemplo, vindo de um processo do pool de tarefas)"""
+        # Live e estreia mudam de estado (começa, termina): validade curta
+        ttl = min(self.ttl, 60) if record.live_status in ('is_live', 'is_upcoming') else self.ttl
+        self.state.set('metadata', key, record.to_state(), ttl=ttl)
+        self._remember(key, record, now + ttl)
+        return record
+
+    def _remember(self, key, record, expires_at):
+        with self._lock:
+            self._entries[key] = (expires_at, record)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,219 @@
+"""
+Publicação dos arquivos gerados num object store compatível com S3
+
+Depois do download o arquivo pode ser enviado para um bucket (S3, MinIO, R2...)
+e o cliente é redirecionado para uma URL pré-assinada: o tráfego de saída deixa
+de passar pelos workers e o arquivo sobrevive ao disco efêmero da instância.
+
+Cliente mínimo com assinatura AWS SigV4 sobre http.client, sem dependências.
+Arquivos grandes usam multipart upload com partes enviadas em paralelo. As
+partes já confirmadas ficam registradas no estado compartilhado, então um
+upload interrompido (erro de rede, restart) continua de onde parou.
+"""
+
+import hashlib
+import hmac
+import http.client
+import os
+import re
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from xml.sax.saxutils import escape
+
+MIN_PART_SIZE = 5 * 1024 * 1024  # mínimo do S3 para todas as partes menos a última
+
+
+class ObjectStoreError(Exception):
+    """Resposta de erro do object store"""
+
+    def __init__(self, status, body):
+        super().__init__(f'Object store respondeu {status}: {body[:300]!r}')
+        self.status = status
+
+
+def _quote(value, safe='-_.~'):
+    return urllib.parse.quote(value, safe=safe)
+
+
+class ObjectStore:
+    """Bucket S3-compatível endereçado por path-style (endpoint/bucket/chave)"""
+
+    def __init__(self, endpoint, bucket, access_key, secret_key, state, region='us-east-1',
+                 part_size=8 * 1024 * 1024, concurrency=4, url_ttl=3600, public_url=None, timeout=60):
+        parsed = urllib.parse.urlparse(endpoint)
+        self.scheme = parsed.scheme or 'https'
+        self.host = parsed.netloc
+        self.bucket = bucket
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.state = state
+        self.region = region
+        self.part_size = max(part_size, MIN_PART_SIZE)
+        self.concurrency = concurrency
+        self.url_ttl = url_ttl
+        self.public_url = public_url.rstrip('/') if public_url else None
+        self.timeout = timeout
+
+    @classmethod
+    def from_env(cls, state):
+        """Cria o cliente a partir de OBJECT_STORE_*; None se a publicação não estiver configurada"""
+        endpoint = os.environ.get('OBJECT_STORE_ENDPOINT')
+        bucket = os.environ.get('OBJECT_STORE_BUCKET')
+        if not endpoint or not bucket:
+            return None
+        return cls(
+            endpoint, bucket,
+            os.environ.get('OBJECT_STORE_ACCESS_KEY', ''),
+            os.environ.get('OBJECT_STORE_SECRET_KEY', ''),
+            state,
+            region=os.environ.get('OBJECT_STORE_REGION', 'us-east-1'),
+            part_size=int(float(os.environ.get('OBJECT_STORE_PART_SIZE_MB', 8)) * 1024 * 1024),
+            concurrency=int(os.environ.get('OBJECT_STORE_CONCURRENCY', 4)),
+            url_ttl=int(os.environ.get('OBJECT_STORE_URL_TTL', 3600)),
+            public_url=os.environ.get('OBJECT_STORE_PUBLIC_URL'),
+        )
+
+    # Assinatura SigV4
+
+    def _path(self, key):
+        return f'/{self.bucket}/{_quote(key, safe="-_.~/")}'
+
+    def _signing_key(self, date):
+        key = ('AWS4' + self.secret_key).encode()
+        for part in (date, self.region, 's3', 'aws4_request'):
+            key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+        return key
+
+    def _signature(self, amz_date, canonical_request):
+        scope = f'{amz_date[:8]}/{self.region}/s3/aws4_request'
+        string_to_sign = '\n'.join([
+            'AWS4-HMAC-SHA256', amz_date, scope,
+            hashlib.sha256(canonical_request.encode()).hexdigest(),
+        ])
+        return scope, hmac.new(self._signing_key(amz_date[:8]), string_to_sign.encode(), hashlib.sha256).hexdigest()
+
+    @staticmethod
+    def _canonical_query(query):
+        return '&'.join(f'{_quote(k)}={_quote(str(v))}' for k, v in sorted(query.items()))
+
+    def _request(self, method, key, query=None, body=b'', headers=None):
+        query = query or {}
+        amz_date = time.strftime('%Y%m%dT%H%M%SZ', time.gmtime())
+        payload_hash = hashlib.sha256(body).hexdigest()
+        headers = dict(headers or {})
+        headers.update({'host': self.host, 'x-amz-date': amz_date, 'x-amz-content-sha256': payload_hash})
+        signed = sorted(name.lower() for name in headers)
+        lower = {name.lower(): str(value).strip() for name, value in headers.items()}
+        canonical_request = '\n'.join([
+            method, self._path(key), self._canonical_query(query),
+            ''.join(f'{name}:{lower[name]}\n' for name in signed),
+            ';'.join(signed), payload_hash,
+        ])
+        scope, signature = self._signature(amz_date, canonical_request)
+        headers['Authorization'] = (f'AWS4-HMAC-SHA256 Credential={self.access_key}/{scope}, '
+                                    f'SignedHeaders={";".join(signed)}, Signature={signature}')
+
+        connection_class = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+        conn = connection_class(self.host, timeout=self.timeout)
+        try:
+            target = self._path(key) + (f'?{self._canonical_query(query)}' if query else '')
+            conn.request(method, target, body=body, headers=headers)
+            response = conn.getresponse()
+            data = response.read()
+        finally:
+            conn.close()
+        if response.status >= 300 and not (method == 'HEAD' and response.status == 404):
+            raise ObjectStoreError(response.status, data)
+        return response.status, response, data
+
+    def presigned_url(self, key, download_name=None, expires=None):
+        """URL de GET válida por `expires` segundos (ou a URL pública, se houver CDN/bucket público)"""
+        if self.public_url:
+            return f'{self.public_url}/{_quote(key, safe="-_.~/")}'
+        amz_date = time.strftime('%Y%m%dT%H%M%SZ', time.gmtime())
+        scope = f'{amz_date[:8]}/{self.region}/s3/aws4_request'
+        query = {
+            'X-Amz-Algorithm': 'AWS4-HMAC-SHA256',
+            'X-Amz-Credential': f'{self.access_key}/{scope}',
+            'X-Amz-Date': amz_date,
+            'X-Amz-Expires': str(expires or self.url_ttl),
+            'X-Amz-SignedHeaders': 'host',
+        }
+        if download_name:
+            query['response-content-disposition'] = f"attachment; filename*=UTF-8''{_quote(download_name)}"
+        canonical_request = '\n'.join([
+            'GET', self._path(key), self._canonical_query(query),
+            f'host:{self.host}\n', 'host', 'UNSIGNED-PAYLOAD',
+        ])
+        _, signature = self._signature(amz_date, canonical_request)
+        return (f'{self.scheme}://{self.host}{self._path(key)}?{self._canonical_query(query)}'
+                f'&X-Amz-Signature={signature}')
+
+    def exists(self, key):
+        status, _, _ = self._request('HEAD', key)
+        return status == 200
+
+    # Upload
+
+    def upload_file(self, path, key, content_type='application/octet-stream'):
+        """Envia o arquivo para `key`; arquivos maiores que uma parte vão por multipart retomável"""
+        size = os.path.getsize(path)
+        if size <= self.part_size:
+            with open(path, 'rb') as f:
+                self._request('PUT', key, body=f.read(), headers={'Content-Type': content_type})
+            return key
+        self._upload_multipart(path, key, size, content_type)
+        return key
+
+    def _upload_multipart(self, path, key, size, content_type):
+        stat = os.stat(path)
+        fingerprint = [size, stat.st_mtime, self.part_size]
+        record = self.state.get('uploads', key)
+        if record and record['fingerprint'] != fingerprint:
+            # O arquivo mudou desde o upload interrompido: descarta as partes antigas
+            self._abort(key, record['upload_id'])
+            record = None
+        if record is None:
+            _, _, data = self._request('POST', key, query={'uploads': ''}, headers={'Content-Type': content_type})
+            upload_id = re.search(rb'<UploadId>(.+?)</UploadId>', data).group(1).decode()
+            record = {'upload_id': upload_id, 'fingerprint': fingerprint, 'parts': {}}
+            self.state.set('uploads', key, record, ttl=7 * 86400)
+
+        part_count = (size + self.part_size - 1) // self.part_size
+        missing = [n for n in range(1, part_count + 1) if str(n) not in record['parts']]
+        lock = threading.Lock()
+
+        def upload_part(number):
+            offset = (number - 1) * self.part_size
+            with open(path, 'rb') as f:
+                chunk = os.pread(f.fileno(), self.part_size, offset)
+            _, response, _ = self._request('PUT', key, body=chunk, query={
+                'partNumber': str(number), 'uploadId': record['upload_id'],
+            })
+            with lock:
+                # Registra cada parte confirmada para retomar daqui se o upload cair
+                record['parts'][str(number)] = response.getheader('ETag')
+                self.state.set('uploads', key, record, ttl=7 * 86400)
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            # list() propaga a primeira falha depois que as outras partes terminarem
+            list(pool.map(upload_part, missing))
+
+        parts_xml = ''.join(
+            f'<Part><PartNumber>{n}</PartNumber><ETag>{escape(record["parts"][str(n)])}</ETag></Part>'
+            for n in range(1, part_count + 1)
+        )
+        body = f'<CompleteMultipartUpload>{parts_xml}</CompleteMultipartUpload>'.encode()
+        _, _, data = self._request('POST', key, query={'uploadId': record['upload_id']}, body=body)
+        if b'<Error>' in data:
+            # S3 pode responder 200 com erro no corpo do Complete
+            raise ObjectStoreError(200, data)
+        self.state.delete('uploads', key)
+
+    def _abort(self, key, upload_id):
+        try:
+            self._request('DELETE', key, query={'uploadId': upload_id})
+        except ObjectStoreError:
+            pass
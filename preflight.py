@@ -0,0 +1,131 @@
+"""
+Estimativa prévia (pre-flight) de tamanho e custo de um pedido
+
+O download_video() se compromete com o download inteiro antes de saber o
+tamanho do resultado: um vídeo de 10 horas ou um stream 4K de 8 GB só falha
+quando o disco enche ou o worker estoura o prazo. Aqui, a partir dos
+metadados em cache (duração, filesize/filesize_approx, bitrate do formato que
+o seletor do yt-dlp escolheria), estimamos os bytes baixados, os bytes
+gerados e o CPU da conversão, e recusamos o pedido antes de buscar qualquer
+byte de mídia se algum teto for excedido.
+
+Os custos de CPU são ordens de grandeza (CPU-s por segundo de mídia num
+núcleo x86 atual; bench_audio.py e bench_variants.py medem os reais) e servem
+para comparar formatos, não como promessa.
+"""
+
+import re
+
+# CPU-s por segundo de mídia
+COST_COPY = 0.002
+COST_AUDIO_ENCODE = 0.02
+# x264 no preset medium em 720p; escala com a área do quadro
+COST_VIDEO_ENCODE_720P = 0.5
+PRESET_COST = {'fast': 0.5, 'balanced': 1.0, 'small': 2.0}
+# Bitrate médio (kbps) do VBR do LAME por nível de -q:a
+LAME_VBR_KBPS = {0: 245, 1: 225, 2: 190, 3: 175, 4: 165, 5: 130, 6: 115, 7: 100, 8: 85, 9: 65}
+# Fator de tamanho do reencode de vídeo em relação à fonte (CRF 23 ~ fonte; CRF 28 ~ 60%)
+VIDEO_ENCODE_SIZE = {'fast': 1.0, 'balanced': 1.0, 'small': 0.6}
+
+
+class PreflightRejected(Exception):
+    """Pedido acima de um dos tetos, recusado antes de baixar mídia"""
+
+    status = 413
+
+    def __init__(self, message, estimate, alternatives=None):
+        self.estimate = estimate
+        self.alternatives = alternatives or []
+        super().__init__(message)
+
+
+def format_bytes(f, duration):
+    """Tamanho de um formato: filesize, filesize_approx ou bitrate x duração; None se não houver dados"""
+    size = f.get('filesize') or f.get('filesize_approx')
+    if size:
+        return int(size)
+    tbr = f.get('tbr') or (f.get('abr') or 0) + (f.get('vbr') or 0)
+    if tbr and duration:
+        return int(tbr * 1000 / 8 * duration)
+    return None
+
+
+def encode_kbps(args):
+    """Bitrate de áudio de argumentos de encode (-b:a 192k, ou o VBR do LAME em -q:a)"""
+    for option, value in zip(args, args[1:]):
+        if option == '-b:a':
+            match = re.match(r'^(\d+)k$', value)
+            if match:
+                return int(match.group(1))
+        if option == '-q:a':
+            return LAME_VBR_KBPS.get(int(value), 130)
+    return 128
+
+
+def estimate(selected, duration, args, clip=None, preset='balanced', variants=None, video=False):
+    """Estima bytes baixados, bytes gerados e CPU (args de build_output_args; None = a fonte serve como está)"""
+    parts = selected.get('requested_formats') or [selected]
+    full_duration = duration or 0
+    media = full_duration
+    fraction = 1.0
+    if clip and full_duration:
+        end = min(clip[1], full_duration) if clip[1] is not None else full_duration
+        media = max(end - clip[0], 0)
+        fraction = media / full_duration
+    sizes = [format_bytes(f, full_duration) for f in parts]
+    download = int(sum(sizes) * fraction) if None not in sizes else None
+    exact = all(f.get('filesize') for f in parts)
+    height = max((f.get('height') or 0 for f in parts), default=0)
+    preset_cost = PRESET_COST.get(preset, 1.0)
+
+    copy = args is None or 'copy' in args
+    if variants:
+        mode = 'encode'
+        outputs = []
+        cpu = COST_COPY * media  # um decode para todas as saídas
+        for variant in variants:
+            if video:
+                target = min(int(variant[:-1]), height or int(variant[:-1]))
+                ratio = target / height if height else 1.0
+                # O bitrate cresce menos que a área do quadro
+                outputs.append(download * ratio ** 1.5 * VIDEO_ENCODE_SIZE.get(preset, 1.0) if download else None)
+                cpu += COST_VIDEO_ENCODE_720P * (target / 720) ** 2 * preset_cost * media
+            else:
+                outputs.append(int(variant[:-1]) * 1000 / 8 * media)
+                cpu += COST_AUDIO_ENCODE * preset_cost * media
+        output = sum(outputs) if None not in outputs else None
+    elif copy:
+        mode = 'copy'
+        output = download
+        cpu = COST_COPY * media
+    elif video:
+        mode = 'encode'
+        output = download * VIDEO_ENCODE_SIZE.get(preset, 1.0) if download else None
+        cpu = COST_VIDEO_ENCODE_720P * ((height or 720) / 720) ** 2 * preset_cost * media
+    else:
+        mode = 'encode'
+        output = encode_kbps(args) * 1000 / 8 * media
+        cpu = COST_AUDIO_ENCODE * preset_cost * media
+
+    return {
+        'source_format': selected.get('format_id'),
+        'duration': round(media, 1) if media else None,
+        'download_bytes': download,
+        'output_bytes': int(output) if output is not None else None,
+        'cpu_seconds': round(cpu, 1) if media else None,
+        'mode': mode,
+        'exact_size': exact,
+    }
+
+
+def exceeded(estimate, max_duration=0, max_download_bytes=0, max_output_bytes=0):
+    """Mensagem do primeiro teto excedido pela estimativa, ou None (valores desconhecidos não recusam)"""
+    if max_duration and estimate['duration'] and estimate['duration'] > max_duration:
+        return f"Duração de {estimate['duration']:.0f}s acima do limite de {max_duration}s"
+    if max_download_bytes and estimate['download_bytes'] and estimate['download_bytes'] > max_download_bytes:
+        return (f"Download estimado de {estimate['download_bytes'] / 1024 ** 2:.0f} MB acima do limite de "
+                f"{max_download_bytes / 1024 ** 2:.0f} MB")
+    if max_output_bytes and estimate['output_bytes'] and estimate['output_bytes'] > max_output_bytes:
+        return (f"Arquivo estimado de {estimate['output_bytes'] / 1024 ** 2:.0f} MB acima do limite de "
+                f"{max_output_bytes / 1024 ** 2:.0f} MB")
+    return None
@@ -0,0 +1,194 @@
+"""
+Prazos por etapa, retry com backoff exponencial e circuit breaker para a origem
+
+Quando o YouTube começa a limitar (429) ou bloquear (403) as requisições,
+insistir só piora: cada pedido gasta todo o orçamento de retries e prende um
+worker. O breaker acompanha a taxa desses erros numa janela deslizante; acima
+do limite ele abre e novos pedidos que precisam da origem falham na hora com
+503 e Retry-After. Depois do cooldown uma única requisição de teste passa; se
+der certo o breaker fecha, senão volta a abrir.
+"""
+
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+
+# Status da origem que contam como limitação/bloqueio para o breaker
+THROTTLE_STATUSES = (403, 429)
+# Status que valem uma nova tentativa
+RETRYABLE_STATUSES = (403, 429, 500, 502, 503, 504)
+RETRYABLE_MESSAGES = ('timed out', 'connection reset', 'connection refused', 'remote end closed', 'temporary failure')
+HTTP_STATUS_RE = re.compile(r'HTTP Error (\d{3})')
+
+
+class DeadlineExceeded(Exception):
+    """Uma etapa do download passou do prazo"""
+
+    def __init__(self, stage, seconds):
+        super().__init__(f'Prazo esgotado na etapa {stage} ({seconds:g}s)')
+        self.stage = stage
+        self.seconds = seconds
+
+
+class CircuitOpen(Exception):
+    """Origem indisponível: o breaker está aberto (mesma interface de AdmissionRejected)"""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.status = 503
+        self.retry_after = retry_after
+
+
+class Deadline:
+    """Prazo de uma etapa; check() levanta DeadlineExceeded quando vence"""
+
+    def __init__(self, stage, seconds):
+        self.stage = stage
+        self.seconds = seconds
+        self.expires_at = time.time() + seconds if seconds else None
+
+    def remaining(self):
+        if self.expires_at is None:
+            return None
+        return max(self.expires_at - time.time(), 0)
+
+    def check(self):
+        if self.expires_at is not None and time.time() >= self.expires_at:
+            raise DeadlineExceeded(self.stage, self.seconds)
+
+
+def upstream_status(error):
+    """Extrai o status HTTP da origem de uma exceção do yt-dlp (None se não houver)"""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        status = getattr(error, 'status', None)
+        if isinstance(status, int) and 100 <= status < 600:
+            return status
+        match = HTTP_STATUS_RE.search(str(error))
+        if match:
+            return int(match.group(1))
+        exc_info = getattr(error, 'exc_info', None)
+        error = getattr(error, 'cause', None) or (exc_info[1] if exc_info else None) or error.__cause__
+    return None
+
+
+def is_retryable(error):
+    """Erros transitórios da origem valem nova tentativa; vídeo indisponível etc. não"""
+    if isinstance(error, (DeadlineExceeded, CircuitOpen)):
+        return False
+    status = upstream_status(error)
+    if status is not None:
+        return status in RETRYABLE_STATUSES
+    message = str(error).lower()
+    return any(text in message for text in RETRYABLE_MESSAGES)
+
+
+def backoff_delay(attempt, base=1.0, cap=30.0):
+    """Backoff exponencial com jitter completo: uniforme em [0, min(cap, base * 2^tentativa)]"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def retry_with_backoff(func, attempts=3, base=1.0, cap=30.0, deadline=None, retryable=is_retryable):
+    """Executa func() com novas tentativas espaçadas por backoff, sem ultrapassar o prazo"""
+    for attempt in range(attempts):
+        if deadline:
+            deadline.check()
+        try:
+            return func()
+        except Exception as e:
+            if attempt == attempts - 1 or not retryable(e):
+                raise
+            delay = backoff_delay(attempt, base, cap)
+            if deadline and deadline.remaining() is not None:
+                if deadline.remaining() <= delay:
+                    raise
+            time.sleep(delay)
+
+
+class CircuitBreaker:
+    """Breaker (fechado → aberto → meio-aberto) sobre a taxa de 403/429 da origem"""
+
+    def __init__(self, name='origem'):
+        self.name = name
+        self.window = float(os.environ.get('BREAKER_WINDOW', 120))
+        self.min_requests = int(os.environ.get('BREAKER_MIN_REQUESTS', 5))
+        self.failure_rate = float(os.environ.get('BREAKER_FAILURE_RATE', 0.5))
+        self.cooldown = float(os.environ.get('BREAKER_COOLDOWN', 60))
+        self.state = 'closed'
+        self.opened_at = None
+        self.trips = 0
+        self._events = deque()
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def _prune(self, now):
+        while self._events and now - self._events[0][0] > self.window:
+            self._events.popleft()
+
+    def _rate(self):
+        if not self._events:
+            return 0.0
+        return sum(1 for _, throttled in self._events if throttled) / len(self._events)
+
+    def allow(self):
+        """Libera a chamada à origem ou levanta CircuitOpen"""
+        with self._lock:
+            if self.state == 'closed':
+                return
+            now = time.time()
+            remaining = self.opened_at + self.cooldown - now
+            if self.state == 'open' and remaining <= 0:
+                self.state = 'half_open'
+            if self.state == 'half_open' and not self._probe_in_flight:
+                # Só uma requisição de teste por vez
+                self._probe_in_flight = True
+                return
+            retry_after = max(int(remaining), 1)
+        raise CircuitOpen(f'Origem limitando requisições; tente novamente em {retry_after}s', retry_after)
+
+    def record(self, error=None):
+        """Registra o resultado de uma chamada à origem (error=None para sucesso)"""
+        throttled = error is not None and upstream_status(error) in THROTTLE_STATUSES
+        with self._lock:
+            now = time.time()
+            if self.state == 'half_open':
+                self._probe_in_flight = False
+                if throttled:
+                    self.state = 'open'
+                    self.opened_at = now
+                    self.trips += 1
+                else:
+                    self.state = 'closed'
+                    self._events.clear()
+                return
+            self._events.append((now, throttled))
+            self._prune(now)
+            if (self.state == 'closed' and len(self._events) >= self.min_requests
+                    and self._rate() >= self.failure_rate):
+                self.state = 'open'
+                self.opened_at = now
+                self.trips += 1
+
+    def release(self):
+        """A chamada terminou sem resposta da origem (erro local): não conta, mas libera o teste do meio-aberto"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def snapshot(self):
+        """Estado atual para /health"""
+        with self._lock:
+            self._prune(time.time())
+            snapshot = {
+                'state': self.state,
+                'requests_in_window': len(self._events),
+                'throttle_rate': round(self._rate(), 2),
+                'trips': self.trips,
+            }
+            if self.state != 'closed':
+                snapshot['retry_after'] = max(int(self.opened_at + self.cooldown - time.time()), 0)
+            return snapshot
@@ -0,0 +1,264 @@
+"""
+Estado compartilhado entre workers do gunicorn (e entre nós)
+
+Guarda o índice do cache de arquivos, os locks de downloads em andamento e o
+estado dos jobs. Por padrão usa um arquivo SQLite local, que todos os workers
+da mesma máquina enxergam. Com STATE_BACKEND=redis usa qualquer servidor que
+fale o protocolo do Redis (RESP), permitindo coordenar vários nós.
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import urllib.parse
+import uuid
+
+
+class SQLiteStateBackend:
+    """Backend local baseado em SQLite (WAL), compartilhado por todos os workers do nó"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS kv ('
+            ' namespace TEXT NOT NULL,'
+            ' key TEXT NOT NULL,'
+            ' value TEXT NOT NULL,'
+            ' expires_at REAL,'
+            ' PRIMARY KEY (namespace, key))'
+        )
+        conn.commit()
+
+    def _connection(self):
+        # sqlite3 não permite compartilhar conexões entre threads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA busy_timeout=30000')
+            self._local.conn = conn
+        return conn
+
+    def get(self, namespace, key):
+        row = self._connection().execute(
+            'SELECT value FROM kv WHERE namespace = ? AND key = ? AND (expires_at IS NULL OR expires_at > ?)',
+            (namespace, key, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, namespace, key, value, ttl=None):
+        expires_at = time.time() + ttl if ttl else None
+        self._connection().execute(
+            'INSERT OR REPLACE INTO kv (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)',
+            (namespace, key, json.dumps(value), expires_at)
+        )
+
+    def delete(self, namespace, key):
+        self._connection().execute('DELETE FROM kv WHERE namespace = ? AND key = ?', (namespace, key))
+
+    def incr(self, namespace, key, amount=1, ttl=None):
+        conn = self._connection()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                'SELECT value, expires_at FROM kv WHERE namespace = ? AND key = ? AND (expires_at IS NULL OR expires_at > ?)',
+                (namespace, key, now)
+            ).fetchone()
+            if row:
+                value = json.loads(row[0]) + amount
+                expires_at = row[1]
+            else:
+                value = amount
+                expires_at = now + ttl if ttl else None
+            conn.execute(
+                'INSERT OR REPLACE INTO kv (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)',
+                (namespace, key, json.dumps(value), expires_at)
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return value
+
+    def items(self, namespace):
+        rows = self._connection().execute(
+            'SELECT key, value FROM kv WHERE namespace = ? AND (expires_at IS NULL OR expires_at > ?)',
+            (namespace, time.time())
+        ).fetchall()
+        return [(key, json.loads(value)) for key, value in rows]
+
+    def acquire_lock(self, name, ttl):
+        """Tenta obter o lock; retorna um token ou None se outro worker já o possui"""
+        token = uuid.uuid4().hex
+        conn = self._connection()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Locks expirados (ex.: worker morto no meio do download) são descartados
+            conn.execute(
+                "DELETE FROM kv WHERE namespace = 'locks' AND key = ? AND expires_at <= ?",
+                (name, now)
+            )
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO kv (namespace, key, value, expires_at) VALUES ('locks', ?, ?, ?)",
+                (name, json.dumps(token), now + ttl)
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return token if cursor.rowcount == 1 else None
+
+    def release_lock(self, name, token):
+        self._connection().execute(
+            "DELETE FROM kv WHERE namespace = 'locks' AND key = ? AND value = ?",
+            (name, json.dumps(token))
+        )
+
+    def cleanup(self):
+        """Remove entradas expiradas"""
+        self._connection().execute('DELETE FROM kv WHERE expires_at IS NOT NULL AND expires_at <= ?', (time.time(),))
+
+
+# Scripts Lua executados atomicamente no servidor (EVAL): nada de outro cliente entre a leitura e a escrita
+# Libera o lock só se ainda for o dono (o lock pode ter expirado e sido pego por outro worker)
+RELEASE_LOCK_SCRIPT = (
+    "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+)
+# Incrementa e, na criação do contador, define a validade no mesmo passo (sem contador eterno se o processo morrer)
+INCR_SCRIPT = (
+    "local value = redis.call('incrby', KEYS[1], ARGV[1]) "
+    "if tonumber(ARGV[2]) > 0 and value == tonumber(ARGV[1]) then redis.call('pexpire', KEYS[1], ARGV[2]) end "
+    "return value"
+)
+
+
+class RedisStateBackend:
+    """Backend para servidores que falam o protocolo do Redis (RESP), sem dependências extras"""
+
+    def __init__(self, url):
+        parsed = urllib.parse.urlparse(url)
+        self.host = parsed.hostname or 'localhost'
+        self.port = parsed.port or 6379
+        self.password = urllib.parse.unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.lstrip('/') or 0)
+        self.prefix = 'firedow:'
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            sock = socket.create_connection((self.host, self.port), timeout=10)
+            conn = (sock, sock.makefile('rb'))
+            self._local.conn = conn
+            if self.password:
+                self._command('AUTH', self.password)
+            if self.db:
+                self._command('SELECT', self.db)
+        return conn
+
+    def _command(self, *args):
+        sock, reader = self._connection()
+        payload = [f'*{len(args)}\r\n'.encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            payload.append(f'${len(data)}\r\n'.encode() + data + b'\r\n')
+        try:
+            sock.sendall(b''.join(payload))
+            return self._read_reply(reader)
+        except (OSError, ConnectionError):
+            # Conexão quebrada: descarta para reconectar na próxima chamada
+            self._local.conn = None
+            sock.close()
+            raise
+
+    def _read_reply(self, reader):
+        line = reader.readline()
+        if not line:
+            raise ConnectionError('Conexão com o servidor de estado encerrada')
+        kind, rest = line[:1], line[1:-2]
+        if kind == b'+':
+            return rest.decode()
+        if kind == b'-':
+            raise RuntimeError(f'Erro do servidor de estado: {rest.decode()}')
+        if kind == b':':
+            return int(rest)
+        if kind == b'$':
+            length = int(rest)
+            if length == -1:
+                return None
+            data = reader.read(length + 2)
+            return data[:-2]
+        if kind == b'*':
+            count = int(rest)
+            if count == -1:
+                return None
+            return [self._read_reply(reader) for _ in range(count)]
+        raise RuntimeError(f'Resposta inválida do servidor de estado: {line!r}')
+
+    def _key(self, namespace, key):
+        return f'{self.prefix}{namespace}:{key}'
+
+    def get(self, namespace, key):
+        value = self._command('GET', self._key(namespace, key))
+        return json.loads(value) if value is not None else None
+
+    def set(self, namespace, key, value, ttl=None):
+        args = ['SET', self._key(namespace, key), json.dumps(value)]
+        if ttl:
+            args += ['PX', int(ttl * 1000)]
+        self._command(*args)
+
+    def delete(self, namespace, key):
+        self._command('DEL', self._key(namespace, key))
+
+    def incr(self, namespace, key, amount=1, ttl=None):
+        return self._command('EVAL', INCR_SCRIPT, 1, self._key(namespace, key), amount, int(ttl * 1000) if ttl else 0)
+
+    def items(self, namespace):
+        prefix = self._key(namespace, '')
+        keys = []
+        cursor = '0'
+        while True:
+            cursor, batch = self._command('SCAN', cursor, 'MATCH', prefix + '*', 'COUNT', 500)
+            keys.extend(batch)
+            cursor = cursor.decode() if isinstance(cursor, bytes) else cursor
+            if cursor == '0':
+                break
+        result = []
+        for full_key in keys:
+            value = self._command('GET', full_key)
+            if value is not None:
+                result.append((full_key.decode()[len(prefix):], json.loads(value)))
+        return result
+
+    def acquire_lock(self, name, ttl):
+        token = uuid.uuid4().hex
+        reply = self._command('SET', self._key('locks', name), json.dumps(token), 'NX', 'PX', int(ttl * 1000))
+        return token if reply == 'OK' else None
+
+    def release_lock(self, name, token):
+        self._command('EVAL', RELEASE_LOCK_SCRIPT, 1, self._key('locks', name), json.dumps(token))
+
+    def cleanup(self):
+        # O próprio servidor expira as chaves
+        pass
+
+
+def create_state_backend(state_dir):
+    """Cria o backend configurado em STATE_BACKEND (sqlite ou redis)"""
+    backend = os.environ.get('STATE_BACKEND', 'sqlite')
+    if backend == 'redis':
+        return RedisStateBackend(os.environ.get('REDIS_URL', 'redis://localhost:6379/0'))
+    if backend != 'sqlite':
+        raise ValueError(f'STATE_BACKEND inválido: {backend}')
+    return SQLiteStateBackend(os.environ.get('STATE_DB_PATH', os.path.join(state_dir, 'state.db')))
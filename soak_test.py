@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Soak test - milhares de downloads contra uma origem falsa local, acompanhando RSS, FDs e threads
+
+Falha se alguma dessas métricas subir de forma sustentada depois do aquecimento.
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PORT = 9400
+REQUESTS = int(os.environ.get('SOAK_REQUESTS', 2000))
+CONCURRENCY = int(os.environ.get('SOAK_CONCURRENCY', 4))
+SAMPLE_EVERY = int(os.environ.get('SOAK_SAMPLE_EVERY', 100))
+# Fração inicial descartada (caches, pools e o alocador ainda enchendo)
+WARMUP_FRACTION = 0.2
+# Crescimento tolerado entre o início e o fim da parte medida
+RSS_SLACK_MB = float(os.environ.get('SOAK_RSS_SLACK_MB', 25))
+FD_SLACK = int(os.environ.get('SOAK_FD_SLACK', 8))
+THREAD_SLACK = int(os.environ.get('SOAK_THREAD_SLACK', 4))
+FORMATS = ['mp3', 'm4a', 'opus', 'mp4']
+
+os.environ.update({
+    'STATE_DIR': tempfile.mkdtemp(prefix='soak_state_'),
+    'WARMUP_ENABLED': '0',
+    # Sem cache: todo pedido passa pela origem e pelo FFmpeg, e os arquivos vão para o reaper
+    'ARTIFACT_CACHE_TTL': '0',
+    'SOURCE_CACHE_TTL': '0',
+    'INTROSPECTION_ENABLED': '1',
+})
+
+import app  # noqa: E402  (lê as variáveis acima na importação)
+
+MEDIA_DIR = tempfile.mkdtemp(prefix='soak_origin_')
+MEDIA_PATH = os.path.join(MEDIA_DIR, 'media.mp4')
+
+
+def make_media():
+    """Vídeo curto (H.264 + AAC) servido pela origem falsa"""
+    subprocess.run([
+        app.FFMPEG_BIN, '-y', '-hide_banner', '-loglevel', 'error',
+        '-f', 'lavfi', '-i', 'testsrc=size=160x90:rate=10:duration=3',
+        '-f', 'lavfi', '-i', 'sine=frequency=440:duration=3',
+        '-c:v', 'libx264', '-c:a', 'aac', '-shortest', MEDIA_PATH,
+    ], check=True)
+
+
+class OriginHandler(BaseHTTPRequestHandler):
+    """Serve o mesmo mp4 em qualquer /media/<n>.mp4 (cada n é um vídeo diferente para o app)"""
+
+    body = b''
+
+    def log_message(self, *args):
+        pass
+
+    def _headers(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'video/mp4')
+        self.send_header('Content-Length', str(len(self.body)))
+        self.end_headers()
+
+    def do_HEAD(self):
+        self._headers()
+
+    def do_GET(self):
+        self._headers()
+        self.wfile.write(self.body)
+
+
+def sample(client):
+    data = client.get('/introspect', query_string={'gc': '1'}).get_json()
+    return data['rss_bytes'] / 1024 ** 2, data['fds']['total'], data['threads']['total'], data
+
+
+def run_download(client, n):
+    response = client.get('/download', query_string={
+        'url': f'http://127.0.0.1:{PORT}/media/{n}.mp4', 'format': FORMATS[n % len(FORMATS)],
+    })
+    response.get_data()
+    response.close()
+    return response.status_code
+
+
+def slope(values):
+    """Inclinação da reta de mínimos quadrados (unidade por amostra)"""
+    n = len(values)
+    mean_x = (n - 1) / 2
+    mean_y = sum(values) / n
+    denominator = sum((x - mean_x) ** 2 for x in range(n)) or 1
+    return sum((x - mean_x) * (y - mean_y) for x, y in enumerate(values)) / denominator
+
+
+def check_trend(name, values, slack, unit):
+    """Crescimento projetado pela tendência ao longo da parte medida, comparado com a folga"""
+    growth = slope(values) * (len(values) - 1)
+    ok = growth <= slack
+    print(f"{'✅' if ok else '❌'} {name}: {values[0]:.1f} -> {values[-1]:.1f} {unit} "
+          f"(tendência {growth:+.1f} {unit}, folga {slack} {unit})")
+    return ok
+
+
+def main():
+    """Executa o soak test"""
+    print("🚀 Soak test (origem falsa local)")
+    print("=" * 50)
+    print(f"{REQUESTS} downloads, {CONCURRENCY} em paralelo, amostra a cada {SAMPLE_EVERY}")
+
+    make_media()
+    with open(MEDIA_PATH, 'rb') as f:
+        OriginHandler.body = f.read()
+    server = ThreadingHTTPServer(('127.0.0.1', PORT), OriginHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    client = app.app.test_client()
+    samples = []
+    errors = 0
+    started = time.time()
+    print(f"\n{'pedidos':>8}{'RSS (MB)':>10}{'FDs':>6}{'threads':>9}{'reaper':>8}{'pedidos/s':>11}")
+    try:
+        with ThreadPoolExecutor(CONCURRENCY) as pool:
+            for batch_start in range(0, REQUESTS, SAMPLE_EVERY):
+                batch = range(batch_start, min(batch_start + SAMPLE_EVERY, REQUESTS))
+                errors += sum(1 for status in pool.map(lambda n: run_download(client, n), batch) if status != 200)
+                rss, fds, threads, data = sample(client)
+                samples.append((rss, fds, threads))
+                done = batch.stop
+                print(f"{done:>8}{rss:>10.1f}{fds:>6}{threads:>9}{data['file_reaper']['pending']:>8}"
+                      f"{done / (time.time() - started):>11.1f}")
+    finally:
+        server.shutdown()
+
+    print("\n" + "=" * 50)
+    measured = samples[int(len(samples) * WARMUP_FRACTION):]
+    if len(measured) < 3:
+        print("❌ Poucas amostras: aumente SOAK_REQUESTS ou reduza SOAK_SAMPLE_EVERY")
+        return 1
+    results = [
+        check_trend('RSS', [s[0] for s in measured], RSS_SLACK_MB, 'MB'),
+        check_trend('FDs', [s[1] for s in measured], FD_SLACK, 'FDs'),
+        check_trend('Threads', [s[2] for s in measured], THREAD_SLACK, 'threads'),
+    ]
+    error_rate = errors / REQUESTS
+    results.append(error_rate <= 0.01)
+    print(f"{'✅' if error_rate <= 0.01 else '❌'} Erros: {errors}/{REQUESTS}")
+
+    if all(results):
+        print("🎉 Sem crescimento sustentado de memória, FDs ou threads")
+        return 0
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+"""
+Logging estruturado e de baixo custo
+
+- LOG_FORMAT=json emite uma linha JSON por evento (texto continua o padrão)
+- Cada linha leva o id de correlação da requisição (header X-Request-ID)
+- Linhas frequentes de debug podem ser amostradas: só 1 a cada N é emitida
+- Os handlers rodam numa thread própria (QueueHandler/QueueListener), então
+  as threads de requisição nunca esperam pela escrita no stdout
+"""
+
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+
+request_id_var = contextvars.ContextVar('request_id', default='-')
+
+# Atributos padrão do LogRecord; o resto veio de extra= e vai para o JSON
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'request_id'}
+
+
+def bind_request_id(request_id):
+    """Associa o id de correlação à thread/contexto atual"""
+    request_id_var.set(request_id)
+
+
+class RequestIdFilter(logging.Filter):
+    """Copia o id de correlação para o registro (roda na thread que fez o log)"""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Emite 1 a cada N registros marcados com extra={'sample_rate': ...}, por mensagem"""
+
+    def __init__(self):
+        super().__init__()
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        rate = getattr(record, 'sample_rate', None)
+        if rate is None or rate >= 1:
+            return True
+        if rate <= 0:
+            return False
+        every = round(1 / rate)
+        with self._lock:
+            count = self._counts.get(record.msg, 0)
+            self._counts[record.msg] = count + 1
+        return count % every == 0
+
+
+class JsonFormatter(logging.Formatter):
+    """Uma linha JSON por registro, com os campos passados em extra="""
+
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            'request_id': getattr(record, 'request_id', '-'),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and key != 'sample_rate':
+                entry[key] = value if isinstance(value, (str, int, float, bool, type(None))) else str(value)
+        # Vindo da fila, o traceback já chega formatado em exc_text (exc_info não atravessa a fila)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = record.stack_info
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def sampled(rate):
+    """Atalho para extra= de linhas amostradas: logger.debug('...', x, extra=sampled(0.01))"""
+    return {'sample_rate': rate}
+
+
+class YtDlpLogger:
+    """Adapta as mensagens do yt-dlp ao logging (substitui a saída direta no stdout)"""
+
+    def __init__(self, progress_sample_rate=0.01):
+        self.logger = logging.getLogger('yt_dlp')
+        self.progress_extra = sampled(progress_sample_rate)
+
+    def debug(self, message):
+        if not self.logger.isEnabledFor(logging.DEBUG):
+            return
+        if message.startswith('[download]'):
+            # Linhas de progresso chegam dezenas de vezes por segundo
+            self.logger.debug('%s', message, extra=self.progress_extra)
+        else:
+            self.logger.debug('%s', message)
+
+    def info(self, message):
+        self.logger.info('%s', message)
+
+    def warning(self, message):
+        self.logger.warning('%s', message)
+
+    def error(self, message):
+        self.logger.error('%s', message)
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler que conta e descarta registros quando a fila está cheia"""
+
+    dropped = 0
+    _exc_formatter = logging.Formatter()
+
+    def prepare(self, record):
+        """Resolve a mensagem na thread do log, mas mantém o traceback em exc_text em vez de colá-lo no msg"""
+        # O prepare padrão formata tudo no msg e zera exc_info: o JsonFormatter perderia o campo exc
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = record.exc_text or self._exc_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _DroppingQueueHandler.dropped += 1
+
+
+_listener = None
+
+
+def setup_logging():
+    """Configura o logging raiz a partir de LOG_FORMAT, LOG_LEVEL e LOG_QUEUE_SIZE"""
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    if os.environ.get('LOG_FORMAT', 'text') == 'json':
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter('%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s')
+        formatter.converter = time.gmtime
+    output = logging.StreamHandler()
+    output.setFormatter(formatter)
+
+    # Fila limitada: se o stdout travar, descarta em vez de bloquear as requisições
+    log_queue = queue.Queue(int(os.environ.get('LOG_QUEUE_SIZE', 10000)))
+    handler = _DroppingQueueHandler(log_queue)
+    handler.addFilter(SamplingFilter())
+    handler.addFilter(RequestIdFilter())
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(os.environ.get('LOG_LEVEL', 'INFO').upper())
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+    return _listener
+
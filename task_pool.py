@@ -0,0 +1,304 @@
+"""
+Pool de subprocessos para isolar extrações e downloads
+
+Um vídeo patológico pode fazer o extract_info girar CPU ou vazar memória
+dentro do worker do gunicorn, degradando todos os pedidos seguintes desse
+worker. Com EXECUTION_MODE=subprocess, cada tarefa roda num processo filho
+reaproveitável (o import do yt-dlp é pago uma vez por processo, não por
+tarefa), com:
+
+- limite de memória (RLIMIT_AS) no processo filho
+- limite de CPU por tarefa (RLIMIT_CPU com o soft limit recalculado antes de
+  cada tarefa, já que o rlimit conta o CPU acumulado do processo)
+- kill do grupo de processos (o filho e seus FFmpeg) ao estourar o prazo
+- reciclagem do processo depois de N tarefas ou de um MemoryError
+
+O filho importa o módulo do app com FIREDOW_TASK_WORKER=1 (sem threads de
+manutenção nem aquecimento) e executa as funções pelo nome. Locks do estado
+compartilhado que a tarefa adquire são informados ao pai (hold_lock/drop_lock):
+se o filho for morto segurando algum, o pai o libera em vez de deixá-lo
+travado até expirar.
+"""
+
+import importlib
+import importlib.util
+import logging
+import os
+import pickle
+import resource
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import types
+from multiprocessing.connection import Connection
+
+from resilience import DeadlineExceeded
+
+logger = logging.getLogger(__name__)
+
+WORKER_ENV = 'FIREDOW_TASK_WORKER'
+
+
+class TaskTimeout(DeadlineExceeded):
+    """A tarefa passou do prazo e o processo foi morto"""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        super().__init__('tarefa isolada', seconds)
+
+
+class TaskCrashed(Exception):
+    """O processo da tarefa morreu (limite de CPU/memória, sinal ou erro fatal)"""
+
+
+def _describe_exit(returncode):
+    if returncode is None:
+        return 'conexão perdida'
+    if returncode < 0:
+        signum = -returncode
+        if signum == signal.SIGXCPU:
+            return 'limite de CPU da tarefa excedido'
+        if signum == signal.SIGKILL:
+            return 'processo morto (SIGKILL, possivelmente falta de memória)'
+        return f'sinal {signal.Signals(signum).name}'
+    return f'código de saída {returncode}'
+
+
+def _transportable(value):
+    # exc_info de erros do yt-dlp: o traceback não atravessa o pipe, a exceção de origem sim
+    if isinstance(value, tuple) and len(value) == 3 and isinstance(value[2], types.TracebackType):
+        value = (value[0], value[1], None)
+    try:
+        pickle.dumps(value)
+    except Exception:
+        return None, False
+    return value, True
+
+
+def _pack_error(error):
+    """Exceção em forma transportável: a classe, a mensagem e os atributos serializáveis (sem chamar __init__)"""
+    attributes = {}
+    for key, value in getattr(error, '__dict__', {}).items():
+        value, ok = _transportable(value)
+        if ok:
+            attributes[key] = value
+    return type(error), str(error), attributes
+
+
+def _unpack_error(cls, message, attributes):
+    try:
+        error = cls.__new__(cls)
+        error.args = (message,)
+        error.__dict__.update(attributes)
+        return error
+    except Exception:
+        return Exception(message)
+
+
+class _Worker:
+    def __init__(self, module, memory_mb, cwd):
+        parent_socket, child_socket = socket.socketpair()
+        env = dict(os.environ, **{WORKER_ENV: '1'})
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'task_pool', module, str(child_socket.fileno()), str(memory_mb)],
+            pass_fds=[child_socket.fileno()], env=env, cwd=cwd,
+            # Grupo próprio: o kill por prazo leva junto os FFmpeg iniciados pela tarefa
+            start_new_session=True,
+        )
+        child_socket.close()
+        self.conn = Connection(parent_socket.detach())
+        self.tasks = 0
+
+    def kill(self):
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+        self.process.wait()
+        self.conn.close()
+
+    def retire(self):
+        """Encerra um processo ocioso: pede para sair e mata se não obedecer"""
+        try:
+            self.conn.send(None)
+            self.process.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            pass
+        self.kill()
+
+
+class TaskPool:
+    """Processos filhos reaproveitáveis, com rlimits, prazo por tarefa e reciclagem"""
+
+    def __init__(self, module, size=2, max_tasks=50, cpu_seconds=0, memory_mb=0, timeout=0, cwd=None,
+                 release_lock=None):
+        self.module = module
+        # release_lock(nome, token): libera locks que um filho morto deixou para trás
+        self.release_lock = release_lock
+        self.size = size
+        self.max_tasks = max_tasks
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.timeout = timeout
+        self.cwd = cwd or os.path.dirname(os.path.abspath(importlib.util.find_spec(module).origin))
+        self.stats = {'tasks': 0, 'spawned': 0, 'recycled': 0, 'timeouts': 0, 'crashes': 0}
+        self._idle = []
+        self._running = 0
+        self._condition = threading.Condition()
+
+    def _acquire(self):
+        with self._condition:
+            while not self._idle and self._running + len(self._idle) >= self.size:
+                self._condition.wait()
+            self._running += 1
+            if self._idle:
+                return self._idle.pop()
+        try:
+            worker = _Worker(self.module, self.memory_mb, self.cwd)
+        except Exception:
+            self._release(None)
+            raise
+        self.stats['spawned'] += 1
+        return worker
+
+    def _release(self, worker):
+        with self._condition:
+            self._running -= 1
+            if worker is not None:
+                self._idle.append(worker)
+            self._condition.notify()
+
+    def run(self, func_name, args=(), timeout=None):
+        """Executa module.func_name(*args) num processo do pool e retorna o resultado (ou relança o erro)"""
+        timeout = timeout or self.timeout or None
+        expires_at = time.time() + timeout if timeout else None
+        worker = self._acquire()
+        keep = False
+        held = {}
+        try:
+            worker.conn.send((func_name, tuple(args), self.cpu_seconds))
+            while True:
+                remaining = max(expires_at - time.time(), 0) if expires_at else None
+                if not worker.conn.poll(remaining):
+                    self.stats['timeouts'] += 1
+                    logger.error("Tarefa %s passou de %ss: matando o processo %s", func_name, timeout,
+                                 worker.process.pid)
+                    worker.kill()
+                    self._release_orphans(held)
+                    raise TaskTimeout(timeout)
+                try:
+                    message = worker.conn.recv()
+                except (EOFError, OSError):
+                    worker.process.wait()
+                    self.stats['crashes'] += 1
+                    reason = _describe_exit(worker.process.returncode)
+                    logger.error("Processo da tarefa %s morreu: %s", func_name, reason)
+                    worker.kill()
+                    self._release_orphans(held)
+                    raise TaskCrashed(f'Processo da tarefa morreu: {reason}')
+                if message[0] == 'lock':
+                    held[message[1]] = message[2]
+                elif message[0] == 'unlock':
+                    held.pop(message[1], None)
+                else:
+                    break
+            status, payload, recycle = message
+            worker.tasks += 1
+            self.stats['tasks'] += 1
+            keep = not recycle and worker.tasks < self.max_tasks
+            if not keep:
+                self.stats['recycled'] += 1
+                worker.retire()
+            if status == 'error':
+                raise _unpack_error(*payload)
+            return payload
+        finally:
+            self._release(worker if keep else None)
+
+    def _release_orphans(self, held):
+        for name, token in held.items():
+            logger.info("Liberando lock %s deixado pelo processo morto", name)
+            try:
+                self.release_lock(name, token)
+            except Exception as e:
+                logger.error("Erro ao liberar lock %s: %s", name, e)
+
+    def shutdown(self):
+        with self._condition:
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            worker.retire()
+
+    def info(self):
+        with self._condition:
+            return dict(self.stats, idle=len(self._idle), running=self._running, size=self.size)
+
+
+def _set_cpu_limit(cpu_seconds):
+    """Soft limit de CPU = CPU já usado pelo processo + o orçamento da tarefa (SIGXCPU ao passar)"""
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    if not cpu_seconds:
+        soft = hard
+    else:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        soft = int(usage.ru_utime + usage.ru_stime + cpu_seconds) + 1
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+_conn = None  # conexão com o pai, só dentro do processo filho
+
+
+def hold_lock(name, token):
+    """Dentro de uma tarefa: avisa o pai que este processo segura o lock (no-op fora do pool)"""
+    if _conn is not None:
+        _conn.send(('lock', name, token))
+
+
+def drop_lock(name):
+    """Dentro de uma tarefa: avisa o pai que o lock foi liberado"""
+    if _conn is not None:
+        _conn.send(('unlock', name, None))
+
+
+def serve(module_name, fd, memory_mb):
+    """Laço do processo filho: recebe (função, args, cpu), executa e devolve ('ok'|'error', valor, reciclar)"""
+    global _conn
+    conn = _conn = Connection(fd)
+    if memory_mb:
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        limit = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit if hard == resource.RLIM_INFINITY else min(limit, hard), hard))
+    module = importlib.import_module(module_name)
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            return
+        if message is None:
+            return
+        func_name, args, cpu_seconds = message
+        _set_cpu_limit(cpu_seconds)
+        recycle = False
+        try:
+            result = ('ok', getattr(module, func_name)(*args))
+        except MemoryError as e:
+            # Heap possivelmente inconsistente: devolve o erro e pede a troca do processo
+            recycle = True
+            result = ('error', _pack_error(e))
+        except Exception as e:
+            result = ('error', _pack_error(e))
+        _set_cpu_limit(0)
+        try:
+            conn.send(result + (recycle,))
+        except Exception as e:
+            conn.send(('error', (Exception, f'Resultado não serializável: {e}', {}), recycle))
+
+
+if __name__ == '__main__':
+    # Pela cópia importada do módulo (não __main__): é ela que o app usa em hold_lock/drop_lock
+    importlib.import_module('task_pool').serve(sys.argv[1], int(sys.argv[2]), int(sys.argv[3]))
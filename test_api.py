@@ -3,9 +3,11 @@
 Script de teste para a API de YouTube Download
 """
 
+import io
 import requests
 import json
 import time
+import zipfile
 
 # URL base da API (mude para sua URL do Render quando estiver deployada)
 BASE_URL = "http://localhost:5000"
@@ -59,6 +61,72 @@ def test_test_endpoint():
         print(f"❌ Erro no teste: {e}")
         return False
 
+def test_formats():
+    """Testa a listagem de formatos com filtros e paginação"""
+    print("\n🔍 Testando listagem de formatos...")
+    url = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+    try:
+        params = {'url': url, 'audio_only': '1', 'sort': 'bitrate', 'limit': 2, 'fields': 'format_id,ext,tbr'}
+        response = requests.get(f"{BASE_URL}/formats", params=params)
+        if response.status_code != 200:
+            print(f"❌ Falha na listagem: {response.status_code}")
+            return False
+        data = response.json()
+        print(f"✅ {data['total']} formatos de áudio; primeiros: {data['formats']['format_id']}")
+        if set(data['formats']) == {'format_id', 'ext', 'tbr'} and len(data['formats']['format_id']) <= 2:
+            return True
+        print("❌ Campos ou paginação inesperados")
+        return False
+    except Exception as e:
+        print(f"❌ Erro na listagem: {e}")
+        return False
+
+def test_conditional_info():
+    """Testa ETag/304 e compressão das respostas JSON"""
+    print("\n🔍 Testando ETag e compressão do /info...")
+    url = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+    try:
+        response = requests.get(f"{BASE_URL}/info", params={'url': url}, headers={'Accept-Encoding': 'gzip'})
+        if response.status_code != 200 or not response.headers.get('ETag'):
+            print(f"❌ Falha ao obter informações: {response.status_code}")
+            return False
+        print(f"✅ Content-Encoding: {response.headers.get('Content-Encoding')}, "
+              f"Cache-Control: {response.headers.get('Cache-Control')}")
+        
+        cached = requests.get(f"{BASE_URL}/info", params={'url': url},
+                              headers={'Accept-Encoding': 'gzip', 'If-None-Match': response.headers['ETag']})
+        if cached.status_code == 304:
+            print("✅ Revalidação com ETag retornou 304")
+            return True
+        else:
+            print(f"❌ Esperava 304, recebeu {cached.status_code}")
+            return False
+    except Exception as e:
+        print(f"❌ Erro no ETag: {e}")
+        return False
+
+def test_estimate():
+    """Testa a estimativa de tamanho/custo antes do download"""
+    print("\n🔍 Testando estimativa pre-flight...")
+    url = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+    try:
+        response = requests.get(f"{BASE_URL}/estimate", params={'url': url, 'format': 'mp3'})
+        if response.status_code != 200:
+            print(f"❌ Falha na estimativa: {response.status_code}")
+            return False
+        data = response.json()
+        estimate = data['estimate']
+        print(f"✅ mp3: {estimate['duration']}s, download {estimate['download_bytes']} bytes, "
+              f"saída {estimate['output_bytes']} bytes, {estimate['cpu_seconds']} CPU-s (cabe: {data['fits']})")
+        formats = [alternative['format'] for alternative in data['alternatives']]
+        if estimate['output_bytes'] and 'mp4' in formats:
+            return True
+        print(f"❌ Estimativa ou alternativas incompletas: {formats}")
+        return False
+    except Exception as e:
+        print(f"❌ Erro na estimativa: {e}")
+        return False
+
 def test_download_mp3():
     """Testa download MP3"""
     print("\n🔍 Testando download MP3...")
@@ -105,6 +173,110 @@ def test_download_mp4():
         print(f"❌ Erro no download MP4: {e}")
         return False
 
+def test_download_clip():
+    """Testa download de um trecho do vídeo"""
+    print("\n🔍 Testando download de trecho...")
+    url = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+    try:
+        response = requests.get(f"{BASE_URL}/download?url={url}&format=m4a&start=30&end=60", stream=True)
+        if response.status_code == 200:
+            size = sum(len(chunk) for chunk in response.iter_content(chunk_size=8192))
+            print(f"✅ Download de trecho OK ({size} bytes)")
+            return True
+        else:
+            print(f"❌ Falha no download de trecho: {response.status_code}")
+            return False
+    except Exception as e:
+        print(f"❌ Erro no download de trecho: {e}")
+        return False
+
+def test_download_variants():
+    """Testa várias qualidades de mp3 em um único zip"""
+    print("\n🔍 Testando variantes (128k + 320k)...")
+    url = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+    try:
+        response = requests.get(f"{BASE_URL}/download",
+                                params={'url': url, 'format': 'mp3', 'variants': '128k,320k', 'preset': 'fast'})
+        if response.status_code != 200 or response.headers.get('content-type') != 'application/zip':
+            print(f"❌ Falha nas variantes: {response.status_code}")
+            return False
+        with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+            names = archive.namelist()
+        if len(names) == 2:
+            print(f"✅ Variantes OK: {names}")
+            return True
+        else:
+            print(f"❌ Esperava 2 arquivos, recebeu {names}")
+            return False
+    except Exception as e:
+        print(f"❌ Erro nas variantes: {e}")
+        return False
+
+def test_jobs():
+    """Testa o fluxo de jobs assíncronos"""
+    print("\n🔍 Testando jobs...")
+    url = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+    try:
+        response = requests.post(f"{BASE_URL}/jobs", json={'url': url, 'format': 'mp3'})
+        if response.status_code != 202:
+            print(f"❌ Falha ao criar job: {response.status_code}")
+            return False
+        job_id = response.json()['id']
+        for _ in range(120):
+            job = requests.get(f"{BASE_URL}/jobs/{job_id}").json()
+            if job['status'] in ('finished', 'failed'):
+                break
+            time.sleep(1)
+        if job['status'] == 'finished':
+            print("✅ Job concluído")
+            return True
+        else:
+            print(f"❌ Job não concluído: {job}")
+            return False
+    except Exception as e:
+        print(f"❌ Erro nos jobs: {e}")
+        return False
+
+def test_thumbnail():
+    """Testa o proxy de thumbnails e a revalidação por ETag"""
+    print("\n🔍 Testando thumbnails...")
+    try:
+        url = f"{BASE_URL}/thumbnail/dQw4w9WgXcQ?size=small"
+        response = requests.get(url, headers={'Accept': 'image/webp'})
+        if response.status_code != 200:
+            print(f"❌ Falha no thumbnail: {response.status_code}")
+            return False
+        print(f"✅ Thumbnail {response.headers.get('Content-Type')} ({len(response.content)} bytes)")
+        
+        cached = requests.get(url, headers={'Accept': 'image/webp', 'If-None-Match': response.headers.get('ETag', '')})
+        if cached.status_code == 304:
+            print("✅ Revalidação com ETag retornou 304")
+            return True
+        else:
+            print(f"❌ Esperava 304, recebeu {cached.status_code}")
+            return False
+    except Exception as e:
+        print(f"❌ Erro no thumbnail: {e}")
+        return False
+
+def test_warmup():
+    """Testa o agendamento de aquecimento do cache"""
+    print("\n🔍 Testando aquecimento do cache...")
+    url = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+    try:
+        response = requests.post(f"{BASE_URL}/warmup", json={'urls': [url], 'format': 'mp3'})
+        if response.status_code != 202:
+            print(f"❌ Falha ao agendar aquecimento: {response.status_code}")
+            return False
+        print(f"✅ Itens agendados: {response.json().get('queued')}")
+        
+        status = requests.get(f"{BASE_URL}/warmup").json()
+        print(f"✅ Fila: {len(status['queue'])} itens, máquina ociosa: {status['idle']}")
+        return True
+    except Exception as e:
+        print(f"❌ Erro no aquecimento: {e}")
+        return False
+
 def test_status():
     """Testa o endpoint de status"""
     print("\n🔍 Testando endpoint de status...")
@@ -145,8 +317,16 @@ def main():
         test_health,
         test_info,
         test_test_endpoint,
+        test_formats,
+        test_conditional_info,
+        test_estimate,
         test_download_mp3,
         test_download_mp4,
+        test_download_clip,
+        test_download_variants,
+        test_jobs,
+        test_thumbnail,
+        test_warmup,
         test_status,
         test_cleanup
     ]
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Script de teste do firedow_client contra o app servido localmente (origem de mídia também local)
+"""
+
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from werkzeug.serving import make_server
+
+PORT = 9600
+ORIGIN_PORT = 9601
+BASE_URL = f'http://127.0.0.1:{PORT}'
+MEDIA_URL = f'http://127.0.0.1:{ORIGIN_PORT}/media/{{}}.mp4'
+
+os.environ.update({
+    'STATE_DIR': tempfile.mkdtemp(prefix='client_state_'),
+    'WARMUP_ENABLED': '0',
+    'JOB_EVENTS_INTERVAL': '0.1',
+})
+
+import app  # noqa: E402  (lê as variáveis acima na importação)
+from firedow_client import AsyncClient, Client, FiredowError  # noqa: E402
+
+MEDIA_PATH = os.path.join(tempfile.mkdtemp(prefix='client_origin_'), 'media.mp4')
+
+
+class OriginHandler(BaseHTTPRequestHandler):
+    body = b''
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'video/mp4')
+        self.send_header('Content-Length', str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    do_HEAD = do_GET
+
+
+class Recorder:
+    """Middleware WSGI: registra os pedidos e pode cortar a próxima resposta de download no meio"""
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+        self.requests = []
+        self.cut_next_download = None  # bytes entregues antes de derrubar a conexão
+        self.hide_events = False
+
+    def count(self, path, status=None):
+        return sum(1 for p, s, _ in self.requests if p == path and (status is None or s == status))
+
+    def __call__(self, environ, start_response):
+        path = environ['PATH_INFO']
+        if self.hide_events and path.endswith('/events'):
+            start_response('404 NOT FOUND', [('Content-Type', 'text/plain')])
+            return [b'not found']
+        record = [path, None, environ.get('HTTP_RANGE')]
+        self.requests.append(record)
+
+        def recording_start_response(status, headers, exc_info=None):
+            record[1] = int(status.split()[0])
+            return start_response(status, headers, exc_info)
+
+        body = self.wsgi_app(environ, recording_start_response)
+        if path != '/download' or self.cut_next_download is None:
+            return body
+        limit, self.cut_next_download = self.cut_next_download, None
+        return self._cut(body, limit)
+
+    @staticmethod
+    def _cut(body, limit):
+        sent = 0
+        try:
+            for chunk in body:
+                if sent + len(chunk) >= limit:
+                    yield chunk[:limit - sent]
+                    raise ConnectionAbortedError('conexão derrubada pelo teste')
+                sent += len(chunk)
+                yield chunk
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+
+
+recorder = Recorder(app.app.wsgi_app)
+
+
+def test_conditional_cache():
+    """Dentro do max-age não há requisição; vencido, a revalidação é um 304"""
+    print("🔍 Testando cache condicional de metadados...")
+    client = Client(BASE_URL)
+    url = MEDIA_URL.format(1)
+    first = client.info(url)
+    second = client.info(url)
+    for key, (etag, payload, _) in list(client.cache._entries.items()):
+        client.cache._entries[key] = (etag, payload, 0)  # força o vencimento
+    third = client.info(url)
+    client.close()
+    print(f"  /info no servidor: {recorder.count('/info')} (304: {recorder.count('/info', 304)}), "
+          f"cache {client.cache.stats}")
+    if first == second == third and recorder.count('/info') == 2 and recorder.count('/info', 304) == 1:
+        print("✅ Cache condicional OK")
+        return True
+    print("❌ Requisições inesperadas")
+    return False
+
+
+def test_singleflight():
+    """Oito chamadas idênticas simultâneas viram um pedido ao servidor"""
+    print("\n🔍 Testando deduplicação de chamadas em andamento...")
+    client = Client(BASE_URL)
+    url = MEDIA_URL.format(2)
+    before = recorder.count('/formats')
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(lambda _: client.formats(url), range(8)))
+    client.close()
+    sent = recorder.count('/formats') - before
+    print(f"  8 chamadas, {sent} pedido(s) ao servidor, {client.inflight.stats}")
+    if sent == 1 and all(result == results[0] for result in results):
+        print("✅ Deduplicação OK")
+        return True
+    print("❌ Chamadas não foram agrupadas")
+    return False
+
+
+def test_resume():
+    """Conexão derrubada no meio do download: a nova tentativa pede só o que falta (Range + If-Range)"""
+    print("\n🔍 Testando retomada de download...")
+    client = Client(BASE_URL, backoff=0.1)
+    dest = tempfile.mkdtemp(prefix='client_dest_')
+    url = MEDIA_URL.format(3)
+    whole = client.download(url, 'mp4', dest)  # gera o artefato no cache
+    with open(whole, 'rb') as f:
+        expected = f.read()
+    size = len(expected)
+    os.remove(whole)
+    recorder.cut_next_download = size // 2
+    client.stats.update(downloaded_bytes=0, resumed=0)
+    path = client.download(url, 'mp4', dest)
+    ranges = [r for p, _, r in recorder.requests if p == '/download' and r]
+    client.close()
+    print(f"  {size} bytes, transferidos {client.stats['downloaded_bytes']}, Range {ranges}")
+    with open(path, 'rb') as f:
+        same = f.read() == expected
+    if same and client.stats['resumed'] == 1 and client.stats['downloaded_bytes'] == size:
+        print("✅ Retomada OK")
+        return True
+    print("❌ O download não foi retomado do ponto certo")
+    return False
+
+
+def test_job_events():
+    """wait_job acompanha o job por SSE, sem polling do /jobs/<id>"""
+    print("\n🔍 Testando espera de job por SSE...")
+    client = Client(BASE_URL)
+    job_id = client.submit_job(MEDIA_URL.format(4), 'mp3')
+    job = client.wait_job(job_id, timeout=60)
+    path = client.download_job(job_id, tempfile.mkdtemp(prefix='client_job_'))
+    client.close()
+    events = recorder.count(f'/jobs/{job_id}/events')
+    polls = recorder.count(f'/jobs/{job_id}')
+    print(f"  {job['status']}, {events} conexão(ões) SSE, {polls} polls, arquivo {os.path.basename(path)}")
+    if job['status'] == 'finished' and events >= 1 and polls == 0 and os.path.getsize(path) > 0:
+        print("✅ SSE OK")
+        return True
+    print("❌ Job não acompanhado por SSE")
+    return False
+
+
+def test_polling_fallback():
+    """Sem o endpoint de eventos (servidor antigo), wait_job cai no polling com backoff"""
+    print("\n🔍 Testando fallback para polling...")
+    client = Client(BASE_URL)
+    recorder.hide_events = True
+    try:
+        job_id = client.submit_job(MEDIA_URL.format(5), 'm4a')
+        job = client.wait_job(job_id, timeout=60, poll_interval=0.2)
+    finally:
+        recorder.hide_events = False
+        client.close()
+    polls = recorder.count(f'/jobs/{job_id}')
+    print(f"  {job['status']} após {polls} polls")
+    if job['status'] == 'finished' and polls >= 1:
+        print("✅ Polling OK")
+        return True
+    print("❌ Fallback falhou")
+    return False
+
+
+def test_async_and_errors():
+    """AsyncClient em paralelo e erros da API como FiredowError com status"""
+    print("\n🔍 Testando AsyncClient e erros...")
+
+    async def run():
+        async with AsyncClient(BASE_URL) as client:
+            infos = await asyncio.gather(*(client.info(MEDIA_URL.format(n)) for n in (6, 7, 8)))
+            try:
+                await client.estimate(MEDIA_URL.format(6), 'wav')
+                return infos, None
+            except FiredowError as e:
+                return infos, e
+
+    infos, error = asyncio.run(run())
+    print(f"  {len(infos)} infos, erro {error.status if error else None}: {error}")
+    if all(info.get('title') for info in infos) and error is not None and error.status == 400:
+        print("✅ AsyncClient OK")
+        return True
+    print("❌ Falha no AsyncClient")
+    return False
+
+
+def main():
+    """Executa os testes do cliente"""
+    print("🚀 Testando firedow_client")
+    print("=" * 50)
+
+    subprocess.run([
+        app.FFMPEG_BIN, '-y', '-hide_banner', '-loglevel', 'error',
+        '-f', 'lavfi', '-i', 'testsrc=size=640x360:rate=25:duration=10',
+        '-f', 'lavfi', '-i', 'sine=frequency=440:duration=10',
+        '-c:v', 'libx264', '-c:a', 'aac', '-shortest', MEDIA_PATH,
+    ], check=True)
+    with open(MEDIA_PATH, 'rb') as f:
+        OriginHandler.body = f.read()
+    origin = ThreadingHTTPServer(('127.0.0.1', ORIGIN_PORT), OriginHandler)
+    origin.daemon_threads = True
+    threading.Thread(target=origin.serve_forever, daemon=True).start()
+    server = make_server('127.0.0.1', PORT, recorder, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    time.sleep(0.2)
+    try:
+        tests = [
+            test_conditional_cache,
+            test_singleflight,
+            test_resume,
+            test_job_events,
+            test_polling_fallback,
+            test_async_and_errors,
+        ]
+        passed = sum(1 for test in tests if test())
+    finally:
+        server.shutdown()
+        origin.shutdown()
+
+    print("\n" + "=" * 50)
+    print(f"📊 Resultados: {passed}/{len(tests)} testes passaram")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Script de teste do modo cluster - sobe vários processos locais da API
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+from cluster import HashRing
+
+PORTS = [5101, 5102, 5103]
+NODES = [f"http://127.0.0.1:{port}" for port in PORTS]
+VIDEO_IDS = ["dQw4w9WgXcQ", "Dc4z7WvUPyE", "9bZkp7q19f0", "kJQP7kiw5Fk", "JGwWNGJdvx8", "OPf0YbXqDm0"]
+
+def start_nodes():
+    """Inicia um processo da API para cada nó"""
+    processes = []
+    for port, node in zip(PORTS, NODES):
+        env = dict(os.environ)
+        env.update({
+            'PORT': str(port),
+            'CLUSTER_NODES': ','.join(NODES),
+            'CLUSTER_SELF': node,
+            'STATE_DIR': tempfile.mkdtemp(prefix=f'cluster_{port}_'),
+        })
+        processes.append(subprocess.Popen([sys.executable, 'app.py'], env=env,
+                                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+    # Aguardar os nós ficarem prontos
+    for node in NODES:
+        for _ in range(50):
+            try:
+                requests.get(f"{node}/health", timeout=1)
+                break
+            except Exception:
+                time.sleep(0.2)
+    return processes
+
+def test_owner_agreement():
+    """Todos os nós devem concordar sobre o dono de cada vídeo"""
+    print("🔍 Testando concordância do dono entre nós...")
+    for video_id in VIDEO_IDS:
+        url = f"https://www.youtube.com/watch?v={video_id}"
+        owners = {requests.get(f"{node}/cluster", params={'url': url}).json()['owner'] for node in NODES}
+        if len(owners) != 1:
+            print(f"❌ Nós discordam sobre {video_id}: {owners}")
+            return False
+    print("✅ Todos os nós concordam")
+    return True
+
+def test_redirect_to_owner():
+    """Nós que não são donos devem redirecionar para o dono"""
+    print("\n🔍 Testando redirecionamento para o dono...")
+    for video_id in VIDEO_IDS:
+        url = f"https://www.youtube.com/watch?v={video_id}"
+        owner = requests.get(f"{NODES[0]}/cluster", params={'url': url}).json()['owner']
+        for node in NODES:
+            if node == owner:
+                continue
+            response = requests.get(f"{node}/info", params={'url': url}, allow_redirects=False)
+            if response.status_code != 307 or not response.headers['Location'].startswith(owner):
+                print(f"❌ {node} não redirecionou {video_id} para {owner}: {response.status_code}")
+                return False
+    print("✅ Redirecionamentos OK")
+    return True
+
+def test_minimal_key_movement():
+    """Adicionar um nó deve mover apenas cerca de 1/N das chaves"""
+    print("\n🔍 Testando movimentação de chaves...")
+    keys = [f"video{i}" for i in range(10000)]
+    ring = HashRing(NODES)
+    before = {key: ring.get_node(key) for key in keys}
+    ring.add_node("http://127.0.0.1:5104")
+    moved = sum(1 for key in keys if ring.get_node(key) != before[key])
+    ratio = moved / len(keys)
+    print(f"  Chaves movidas: {ratio:.1%} (ideal: {1 / (len(NODES) + 1):.1%})")
+    if ratio < 0.4:
+        print("✅ Movimentação mínima OK")
+        return True
+    print("❌ Muitas chaves movidas")
+    return False
+
+def main():
+    """Executa os testes do cluster"""
+    print("🚀 Testando modo cluster")
+    print("=" * 50)
+
+    processes = start_nodes()
+    try:
+        tests = [
+            test_owner_agreement,
+            test_redirect_to_owner,
+            test_minimal_key_movement,
+        ]
+        passed = sum(1 for test in tests if test())
+    finally:
+        for process in processes:
+            process.terminate()
+
+    print("\n" + "=" * 50)
+    print(f"📊 Resultados: {passed}/{len(tests)} testes passaram")
+    return 0 if passed == len(tests) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
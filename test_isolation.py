@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Script de teste do modo de execução isolado (EXECUTION_MODE=subprocess) contra uma origem local
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PORT = 9500
+MEDIA_URL = f'http://127.0.0.1:{PORT}/media/{{}}.mp4'
+STALL_URL = f'http://127.0.0.1:{PORT}/stall.mp4'
+# Sem extensão de mídia: passa pelo pre-flight, que extrai metadados antes do download
+STALL_PAGE_URL = f'http://127.0.0.1:{PORT}/stall'
+# A sondagem da extração é respondida; o download da mídia trava (o filho morre segurando o lock da fonte)
+SLOW_MEDIA_URL = f'http://127.0.0.1:{PORT}/slow/orphan.mp4'
+THROTTLED_URL = f'http://127.0.0.1:{PORT}/throttled/{{}}.mp4'
+
+os.environ.update({
+    'STATE_DIR': tempfile.mkdtemp(prefix='isolation_state_'),
+    'WARMUP_ENABLED': '0',
+    'EXECUTION_MODE': 'subprocess',
+    'TASK_POOL_SIZE': '2',
+    'TASK_MAX_TASKS': '2',
+    'TASK_TIMEOUT': '5',
+    'UPSTREAM_RETRIES': '1',
+    'BREAKER_MIN_REQUESTS': '3',
+})
+
+import app  # noqa: E402  (lê as variáveis acima na importação)
+from task_pool import TaskCrashed, TaskPool, TaskTimeout  # noqa: E402
+
+MEDIA_PATH = os.path.join(tempfile.mkdtemp(prefix='isolation_origin_'), 'media.mp4')
+
+
+def worker_pid():
+    """Usada pelos testes diretos do pool: pid do processo que executa a tarefa"""
+    return os.getpid()
+
+
+def spin():
+    """Gira CPU sem parar (extração patológica)"""
+    while True:
+        pass
+
+
+def hog():
+    """Aloca memória até estourar o RLIMIT_AS"""
+    blocks = []
+    while True:
+        blocks.append(bytearray(64 * 1024 * 1024))
+
+
+class OriginHandler(BaseHTTPRequestHandler):
+    body = b''
+    seen = set()
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path in ('/stall.mp4', '/stall') or (self.path.startswith('/slow/') and self.path in self.seen):
+            # Origem que aceita a conexão e nunca responde
+            time.sleep(60)
+            return
+        self.seen.add(self.path)
+        if self.path.startswith('/throttled/'):
+            self.send_response(429)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'video/mp4')
+        self.send_header('Content-Length', str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    do_HEAD = do_GET
+
+
+def test_download_in_subprocess():
+    """/download e /info funcionam com o trabalho pesado fora do worker"""
+    print("🔍 Testando download e info no pool...")
+    client = app.app.test_client()
+    response = client.get('/download', query_string={'url': MEDIA_URL.format(1), 'format': 'mp3'})
+    data = response.get_data()
+    info = client.get('/info', query_string={'url': MEDIA_URL.format(1)})
+    stats = app.task_pool.info()
+    print(f"  mp3 {len(data)} bytes, info {info.status_code}, pool {stats}")
+    if response.status_code == 200 and data and info.status_code == 200 and stats['tasks'] >= 2:
+        print("✅ Download e info isolados OK")
+        return True
+    print(f"❌ Falha ({response.status_code}, {info.status_code})")
+    return False
+
+
+def test_recycling():
+    """Cada processo é trocado depois de TASK_MAX_TASKS tarefas"""
+    print("\n🔍 Testando reciclagem após 2 tarefas...")
+    pool = TaskPool('test_isolation', size=1, max_tasks=2)
+    pids = [pool.run('worker_pid') for _ in range(5)]
+    pool.shutdown()
+    print(f"  pids: {pids}, {pool.info()}")
+    if pids[0] == pids[1] != pids[2] == pids[3] != pids[4] and os.getpid() not in pids:
+        print("✅ Reciclagem OK")
+        return True
+    print("❌ Processos não foram reciclados como esperado")
+    return False
+
+
+def test_timeout_kills():
+    """Origem travada: a tarefa é morta no prazo e o pedido recebe 504"""
+    print("\n🔍 Testando kill por prazo (origem travada)...")
+    start = time.time()
+    response = app.app.test_client().get('/download', query_string={'url': STALL_URL, 'format': 'mp3'})
+    elapsed = time.time() - start
+    print(f"  {response.status_code} em {elapsed:.1f}s: {response.get_json()}")
+    if response.status_code == 504 and elapsed < 15 and app.task_pool.info()['timeouts'] == 1:
+        print("✅ Kill por prazo OK")
+        return True
+    print("❌ A tarefa não foi interrompida no prazo")
+    return False
+
+
+def test_preflight_budget():
+    """O pre-flight de uma origem travada usa um prazo curto próprio e não soma o prazo de extração normal"""
+    print("\n🔍 Testando prazo do pre-flight (origem travada)...")
+    start = time.time()
+    response = app.app.test_client().get('/download', query_string={'url': STALL_PAGE_URL, 'format': 'mp3'})
+    elapsed = time.time() - start
+    print(f"  {response.status_code} em {elapsed:.1f}s (pre-flight até {app.preflight_budget()}s + download)")
+    if response.status_code == 504 and elapsed < 15:
+        print("✅ Prazo do pre-flight OK")
+        return True
+    print("❌ O pre-flight estourou o prazo do pedido")
+    return False
+
+
+def test_orphan_lock_released():
+    """Filho morto por prazo no meio do download: o pai libera o lock da fonte que ele segurava"""
+    print("\n🔍 Testando liberação do lock de um filho morto...")
+    held = []
+
+    def watch():
+        for _ in range(80):
+            held.extend(name for name, _ in app.state.items('locks') if name.startswith('source:'))
+            if held:
+                return
+            time.sleep(0.1)
+
+    watcher = threading.Thread(target=watch)
+    watcher.start()
+    response = app.app.test_client().get('/download', query_string={'url': SLOW_MEDIA_URL, 'format': 'mp3'})
+    watcher.join()
+    left = [name for name, _ in app.state.items('locks') if name.startswith('source:')]
+    print(f"  {response.status_code}; lock durante a tarefa {sorted(set(held))}, depois do kill {left}")
+    if response.status_code == 504 and held and not left:
+        print("✅ Lock órfão liberado")
+        return True
+    print("❌ O lock da fonte ficou preso")
+    return False
+
+
+def test_breaker_in_parent():
+    """429 vistos pelos filhos abrem o breaker do processo pai, o que o /health mostra"""
+    print("\n🔍 Testando breaker com extração no pool...")
+    client = app.app.test_client()
+    statuses = [client.get('/info', query_string={'url': THROTTLED_URL.format(n)}).status_code for n in range(4)]
+    health = client.get('/health').get_json()
+    print(f"  /info {statuses}, /health {health['status']} {health['circuit_breaker']}")
+    if health['status'] == 'degraded' and statuses[-1] == 503:
+        print("✅ Breaker no processo pai OK")
+        return True
+    print("❌ O /health não viu a limitação da origem")
+    return False
+
+
+def test_cpu_limit():
+    """Tarefa que gira CPU recebe SIGXCPU pelo RLIMIT_CPU"""
+    print("\n🔍 Testando limite de CPU...")
+    pool = TaskPool('test_isolation', size=1, cpu_seconds=1, timeout=30)
+    start = time.time()
+    try:
+        pool.run('spin')
+    except TaskCrashed as e:
+        elapsed = time.time() - start
+        print(f"  {e} ({elapsed:.1f}s)")
+        pid = pool.run('worker_pid')  # um processo novo assume
+        pool.shutdown()
+        if elapsed < 10 and pid != os.getpid():
+            print("✅ Limite de CPU OK")
+            return True
+    except TaskTimeout:
+        pass
+    pool.shutdown()
+    print("❌ A tarefa não foi limitada")
+    return False
+
+
+def test_memory_limit():
+    """Tarefa que aloca sem parar recebe MemoryError e o processo é reciclado"""
+    print("\n🔍 Testando limite de memória...")
+    pool = TaskPool('test_isolation', size=1, memory_mb=1024, timeout=60)
+    try:
+        pool.run('hog')
+    except MemoryError:
+        stats = pool.info()
+        pool.shutdown()
+        print(f"  MemoryError, pool {stats}")
+        if stats['recycled'] == 1 and stats['idle'] == 0:
+            print("✅ Limite de memória OK")
+            return True
+    except Exception as e:
+        print(f"  {type(e).__name__}: {e}")
+    pool.shutdown()
+    print("❌ A alocação não foi limitada")
+    return False
+
+
+def main():
+    """Executa os testes do modo isolado"""
+    print("🚀 Testando EXECUTION_MODE=subprocess")
+    print("=" * 50)
+
+    subprocess.run([
+        app.FFMPEG_BIN, '-y', '-hide_banner', '-loglevel', 'error',
+        '-f', 'lavfi', '-i', 'testsrc=size=160x90:rate=10:duration=3',
+        '-f', 'lavfi', '-i', 'sine=frequency=440:duration=3',
+        '-c:v', 'libx264', '-c:a', 'aac', '-shortest', MEDIA_PATH,
+    ], check=True)
+    with open(MEDIA_PATH, 'rb') as f:
+        OriginHandler.body = f.read()
+    server = ThreadingHTTPServer(('127.0.0.1', PORT), OriginHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        tests = [
+            test_download_in_subprocess,
+            test_recycling,
+            test_timeout_kills,
+            test_preflight_budget,
+            test_cpu_limit,
+            test_memory_limit,
+            test_orphan_lock_released,
+            test_breaker_in_parent,  # por último: deixa o breaker aberto
+        ]
+        passed = sum(1 for test in tests if test())
+    finally:
+        app.task_pool.shutdown()
+        server.shutdown()
+
+    print("\n" + "=" * 50)
+    print(f"📊 Resultados: {passed}/{len(tests)} testes passaram")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
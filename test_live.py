@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Script de teste do modo ao vivo - serve uma playlist HLS rolante gerada localmente
+"""
+
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PORT = 9300
+SEGMENT_SECONDS = 1
+SEGMENT_COUNT = 90
+WINDOW = 5
+LIVE_URL = f'http://127.0.0.1:{PORT}/live.m3u8'
+VOD_URL = f'http://127.0.0.1:{PORT}/vod.m3u8'
+
+os.environ.update({
+    'STATE_DIR': tempfile.mkdtemp(prefix='live_state_'),
+    'LIVE_MAX_DURATION': '6',
+    'WARMUP_ENABLED': '0',
+})
+
+import app  # noqa: E402  (lê as variáveis acima na importação)
+
+SEGMENT_DIR = tempfile.mkdtemp(prefix='live_segments_')
+
+
+def make_segments():
+    """Gera segmentos fMP4 de 1 s (vídeo de teste + tom) e o init.mp4 com o FFmpeg"""
+    subprocess.run([
+        app.FFMPEG_BIN, '-y', '-hide_banner', '-loglevel', 'error',
+        '-f', 'lavfi', '-i', f'testsrc=size=160x90:rate=10:duration={SEGMENT_COUNT}',
+        '-f', 'lavfi', '-i', f'sine=frequency=440:duration={SEGMENT_COUNT}',
+        '-c:v', 'libx264', '-g', '10', '-c:a', 'aac', '-shortest',
+        '-f', 'hls', '-hls_time', str(SEGMENT_SECONDS), '-hls_segment_type', 'fmp4',
+        '-hls_playlist_type', 'vod', '-hls_segment_filename', 'seg%d.m4s',
+        'origem.m3u8',
+    ], check=True, cwd=SEGMENT_DIR)
+
+
+class RollingHls:
+    """Janela de WINDOW segmentos que avança um segmento por segundo, como uma live"""
+    started = time.time()
+    requests = 0
+
+    @classmethod
+    def playlist(cls, live):
+        newest = min(int((time.time() - cls.started) / SEGMENT_SECONDS) + WINDOW, SEGMENT_COUNT) - 1
+        first = max(newest - WINDOW + 1, 0) if live else 0
+        lines = ['#EXTM3U', '#EXT-X-VERSION:7', f'#EXT-X-TARGETDURATION:{SEGMENT_SECONDS}',
+                 f'#EXT-X-MEDIA-SEQUENCE:{first}', '#EXT-X-MAP:URI="init.mp4"']
+        for sequence in range(first, newest + 1 if live else SEGMENT_COUNT):
+            lines += [f'#EXTINF:{SEGMENT_SECONDS}.0,', f'seg{sequence}.m4s']
+        if not live:
+            lines.append('#EXT-X-ENDLIST')
+        return ('\n'.join(lines) + '\n').encode()
+
+
+class HlsHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        RollingHls.requests += 1
+        if self.path in ('/live.m3u8', '/vod.m3u8'):
+            body, mimetype = RollingHls.playlist(self.path == '/live.m3u8'), 'application/vnd.apple.mpegurl'
+        else:
+            path = os.path.join(SEGMENT_DIR, os.path.basename(self.path))
+            if not os.path.exists(path):
+                self.send_response(404)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            with open(path, 'rb') as f:
+                body, mimetype = f.read(), 'video/mp4'
+        self.send_response(200)
+        self.send_header('Content-Type', mimetype)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def media_duration(data, suffix):
+    """Duração (s) de uma mídia em memória, lida do cabeçalho do FFmpeg"""
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    result = subprocess.run([app.FFMPEG_BIN, '-hide_banner', '-i', path], capture_output=True, text=True)
+    os.remove(path)
+    match = re.search(r'Duration: (\d+):(\d+):([\d.]+)', result.stderr)
+    if not match:
+        return 0.0
+    return int(match.group(1)) * 3600 + int(match.group(2)) * 60 + float(match.group(3))
+
+
+def test_vod_mode_rejects_live():
+    """O download normal recusa a live na hora em vez de prender o worker"""
+    print("🔍 Testando recusa de live no modo normal...")
+    start = time.time()
+    response = app.app.test_client().get('/download', query_string={'url': LIVE_URL, 'format': 'mp4'})
+    elapsed = time.time() - start
+    data = response.get_json()
+    if response.status_code == 409 and data.get('live_status') == 'is_live' and elapsed < 20:
+        print(f"✅ 409 em {elapsed:.1f}s: {data['error']}")
+        return True
+    print(f"❌ Esperava 409 rápido, recebeu {response.status_code} em {elapsed:.1f}s")
+    return False
+
+
+def test_stream_mode():
+    """live=stream repassa init + segmentos até a duração pedida"""
+    print("\n🔍 Testando live=stream...")
+    start = time.time()
+    response = app.app.test_client().get('/download', query_string={
+        'url': LIVE_URL, 'format': 'mp4', 'live': 'stream', 'duration': 6,
+    })
+    data = response.get_data()
+    elapsed = time.time() - start
+    # Cada segmento fMP4 é um fragmento (moof) de 1 s
+    fragments = data.count(b'moof')
+    print(f"  {len(data)} bytes, {fragments} segmentos em {elapsed:.1f}s")
+    # Começa 3 segmentos antes da borda: o resto chega em tempo real
+    if (response.status_code == 200 and response.mimetype == 'video/mp4' and data[4:8] == b'ftyp'
+            and fragments == 6 and elapsed >= 2):
+        print("✅ Stream OK")
+        return True
+    print(f"❌ Stream inesperado ({response.status_code})")
+    return False
+
+
+def test_stream_audio_transcode():
+    """live=stream com formato de áudio passa os segmentos por um FFmpeg em pipe"""
+    print("\n🔍 Testando live=stream em mp3...")
+    response = app.app.test_client().get('/download', query_string={
+        'url': LIVE_URL, 'format': 'mp3', 'live': 'stream', 'duration': 2,
+    })
+    data = response.get_data()
+    duration = media_duration(data, '.mp3')
+    print(f"  {len(data)} bytes, {duration:.1f}s de áudio")
+    if response.status_code == 200 and 1.5 <= duration <= 3.5:
+        print("✅ Transcodificação em stream OK")
+        return True
+    print(f"❌ Áudio inesperado ({response.status_code})")
+    return False
+
+
+def test_record_mode_cap():
+    """live=record grava uma janela e nunca passa de LIVE_MAX_DURATION"""
+    print("\n🔍 Testando live=record com duração acima do teto...")
+    start = time.time()
+    response = app.app.test_client().get('/download', query_string={
+        'url': LIVE_URL, 'format': 'mp4', 'live': 'record', 'duration': 3600,
+    })
+    data = response.get_data()
+    elapsed = time.time() - start
+    duration = media_duration(data, '.mp4')
+    print(f"  {len(data)} bytes, {duration:.1f}s gravados em {elapsed:.1f}s (teto 6s)")
+    if response.status_code == 200 and 5 <= duration <= 7 and elapsed < 30:
+        print("✅ Gravação limitada OK")
+        return True
+    print(f"❌ Gravação inesperada ({response.status_code})")
+    return False
+
+
+def test_live_mode_on_vod():
+    """Modo ao vivo numa playlist encerrada (VOD) é recusado"""
+    print("\n🔍 Testando live=stream em VOD...")
+    response = app.app.test_client().get('/download', query_string={'url': VOD_URL, 'live': 'stream'})
+    if response.status_code == 400:
+        print(f"✅ 400: {response.get_json()['error']}")
+        return True
+    print(f"❌ Esperava 400, recebeu {response.status_code}")
+    return False
+
+
+def main():
+    """Executa os testes do modo ao vivo"""
+    print("🚀 Testando lives (HLS rolante local)")
+    print("=" * 50)
+
+    make_segments()
+    server = ThreadingHTTPServer(('127.0.0.1', PORT), HlsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    RollingHls.started = time.time()
+    try:
+        tests = [
+            test_vod_mode_rejects_live,
+            test_stream_mode,
+            test_stream_audio_transcode,
+            test_record_mode_cap,
+            test_live_mode_on_vod,
+        ]
+        passed = sum(1 for test in tests if test())
+    finally:
+        server.shutdown()
+
+    print("\n" + "=" * 50)
+    print(f"📊 Resultados: {passed}/{len(tests)} testes passaram")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Script de teste da publicação em object store - sobe um servidor local compatível com S3
+"""
+
+import hashlib
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+PORT = 9100
+BUCKET = 'firedow-test'
+PART_SIZE = 5 * 1024 * 1024
+
+os.environ.update({
+    'STATE_DIR': tempfile.mkdtemp(prefix='object_store_state_'),
+    'OBJECT_STORE_ENDPOINT': f'http://127.0.0.1:{PORT}',
+    'OBJECT_STORE_BUCKET': BUCKET,
+    'OBJECT_STORE_ACCESS_KEY': 'teste',
+    'OBJECT_STORE_SECRET_KEY': 'segredo',
+    'OBJECT_STORE_PART_SIZE_MB': '5',
+    'WARMUP_ENABLED': '0',
+})
+
+import app  # noqa: E402  (lê as variáveis acima na importação)
+
+
+class FakeS3:
+    """Estado do servidor local: objetos, uploads multipart e falhas injetadas"""
+    objects = {}
+    uploads = {}
+    fail_parts = set()
+    part_requests = 0
+    active_parts = 0
+    max_active_parts = 0
+    lock = threading.Lock()
+
+
+class FakeS3Handler(BaseHTTPRequestHandler):
+    """Subconjunto da API S3 usado por object_store.py (path-style, sem validar a assinatura)"""
+
+    def log_message(self, *args):
+        pass
+
+    def _parse(self):
+        parsed = urllib.parse.urlparse(self.path)
+        query = dict(urllib.parse.parse_qsl(parsed.query, keep_blank_values=True))
+        key = urllib.parse.unquote(parsed.path).split('/', 2)[2]
+        return key, query
+
+    def _reply(self, status, body=b'', headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def _signed(self, query):
+        return 'AWS4-HMAC-SHA256' in self.headers.get('Authorization', '') or 'X-Amz-Signature' in query
+
+    def _body(self):
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+    def do_PUT(self):
+        key, query = self._parse()
+        body = self._body()
+        if not self._signed(query):
+            return self._reply(403)
+        if 'partNumber' in query:
+            number = int(query['partNumber'])
+            with FakeS3.lock:
+                FakeS3.part_requests += 1
+                FakeS3.active_parts += 1
+                FakeS3.max_active_parts = max(FakeS3.max_active_parts, FakeS3.active_parts)
+            time.sleep(0.1)
+            with FakeS3.lock:
+                FakeS3.active_parts -= 1
+                if number in FakeS3.fail_parts:
+                    FakeS3.fail_parts.discard(number)
+                    return self._reply(500, b'<Error>falha injetada</Error>')
+            FakeS3.uploads[query['uploadId']][number] = body
+            return self._reply(200, headers={'ETag': f'"{hashlib.md5(body).hexdigest()}"'})
+        FakeS3.objects[key] = body
+        self._reply(200, headers={'ETag': f'"{hashlib.md5(body).hexdigest()}"'})
+
+    def do_POST(self):
+        key, query = self._parse()
+        body = self._body()
+        if 'uploads' in query:
+            upload_id = hashlib.sha1(f'{key}{time.time()}'.encode()).hexdigest()
+            FakeS3.uploads[upload_id] = {}
+            xml = f'<InitiateMultipartUploadResult><UploadId>{upload_id}</UploadId></InitiateMultipartUploadResult>'
+            return self._reply(200, xml.encode())
+        parts = FakeS3.uploads.pop(query['uploadId'])
+        numbers = [int(n) for n in re.findall(rb'<PartNumber>(\d+)</PartNumber>', body)]
+        FakeS3.objects[key] = b''.join(parts[n] for n in numbers)
+        self._reply(200, b'<CompleteMultipartUploadResult></CompleteMultipartUploadResult>')
+
+    def do_DELETE(self):
+        _, query = self._parse()
+        FakeS3.uploads.pop(query.get('uploadId'), None)
+        self._reply(204)
+
+    def do_GET(self):
+        key, query = self._parse()
+        if not self._signed(query):
+            return self._reply(403)
+        if key not in FakeS3.objects:
+            return self._reply(404)
+        headers = {}
+        if 'response-content-disposition' in query:
+            headers['Content-Disposition'] = query['response-content-disposition']
+        self._reply(200, FakeS3.objects[key], headers)
+
+    do_HEAD = do_GET
+
+
+def make_file(size):
+    """Arquivo temporário com conteúdo pseudoaleatório"""
+    fd, path = tempfile.mkstemp(suffix='.mp4')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(os.urandom(size))
+    return path
+
+
+def download(key, name=None):
+    response = requests.get(app.object_store.presigned_url(key, name))
+    response.raise_for_status()
+    return response
+
+
+def test_small_upload():
+    """Arquivo menor que uma parte vai num único PUT"""
+    print("🔍 Testando upload simples...")
+    path = make_file(1024 * 1024)
+    app.object_store.upload_file(path, 'pequeno.mp4')
+    with open(path, 'rb') as f:
+        ok = download('pequeno.mp4').content == f.read()
+    os.remove(path)
+    print("✅ Upload simples OK" if ok else "❌ Conteúdo diferente")
+    return ok
+
+
+def test_parallel_multipart():
+    """Arquivo grande vai em partes enviadas em paralelo"""
+    print("\n🔍 Testando multipart em paralelo...")
+    path = make_file(4 * PART_SIZE + 123)
+    FakeS3.part_requests = FakeS3.max_active_parts = 0
+    app.object_store.upload_file(path, 'grande.mp4')
+    with open(path, 'rb') as f:
+        ok = download('grande.mp4').content == f.read()
+    os.remove(path)
+    print(f"  {FakeS3.part_requests} partes, até {FakeS3.max_active_parts} simultâneas")
+    if ok and FakeS3.part_requests == 5 and FakeS3.max_active_parts > 1:
+        print("✅ Multipart paralelo OK")
+        return True
+    print("❌ Multipart paralelo falhou")
+    return False
+
+
+def test_resume_after_failure():
+    """Um upload interrompido continua das partes já confirmadas"""
+    print("\n🔍 Testando retomada de upload...")
+    path = make_file(4 * PART_SIZE + 123)
+    FakeS3.fail_parts = {3}
+    try:
+        app.object_store.upload_file(path, 'retomado.mp4')
+        print("❌ Upload deveria ter falhado na parte 3")
+        return False
+    except Exception:
+        pass
+    recorded = len(app.state.get('uploads', 'retomado.mp4')['parts'])
+    FakeS3.part_requests = 0
+    app.object_store.upload_file(path, 'retomado.mp4')
+    with open(path, 'rb') as f:
+        ok = download('retomado.mp4').content == f.read()
+    os.remove(path)
+    print(f"  Partes registradas antes da falha: {recorded}; reenviadas depois: {FakeS3.part_requests}")
+    if ok and recorded == 4 and FakeS3.part_requests == 1:
+        print("✅ Retomada OK")
+        return True
+    print("❌ Retomada falhou")
+    return False
+
+
+def test_download_redirect():
+    """/download e jobs redirecionam para a URL pré-assinada do objeto publicado"""
+    print("\n🔍 Testando redirecionamento para o object store...")
+    path = os.path.join(app.DOWNLOAD_DIR, 'Vídeo de teste [abcdefghijk].mp3')
+    with open(path, 'wb') as f:
+        f.write(os.urandom(256 * 1024))
+    with app.app.test_request_context():
+        response = app.deliver_artifact(path)
+    location = response.headers.get('Location', '')
+    if response.status_code != 302 or not location.startswith(os.environ['OBJECT_STORE_ENDPOINT']):
+        print(f"❌ Esperava 302 para o object store, recebeu {response.status_code}")
+        return False
+    published = requests.get(location)
+    with open(path, 'rb') as f:
+        ok = published.content == f.read() and 'filename*=' in published.headers.get('Content-Disposition', '')
+    os.remove(path)
+    print("✅ Redirecionamento OK" if ok else "❌ Objeto publicado diferente")
+    return ok
+
+
+def main():
+    """Executa os testes do object store"""
+    print("🚀 Testando publicação em object store")
+    print("=" * 50)
+
+    server = ThreadingHTTPServer(('127.0.0.1', PORT), FakeS3Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        tests = [
+            test_small_upload,
+            test_parallel_multipart,
+            test_resume_after_failure,
+            test_download_redirect,
+        ]
+        passed = sum(1 for test in tests if test())
+    finally:
+        server.shutdown()
+
+    print("\n" + "=" * 50)
+    print(f"📊 Resultados: {passed}/{len(tests)} testes passaram")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
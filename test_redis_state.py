@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Script de teste do RedisStateBackend contra um servidor RESP mínimo local (sem Redis instalado)
+
+O servidor implementa só os comandos que o backend usa. O EVAL reconhece os dois
+scripts do shared_state e os executa sob um lock global, com a mesma
+atomicidade que o Redis dá a um script Lua.
+"""
+
+import fnmatch
+import socketserver
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from shared_state import INCR_SCRIPT, RELEASE_LOCK_SCRIPT, RedisStateBackend
+
+PORT = 9800
+
+
+class FakeRedis:
+    """Dados do servidor: chave -> (valor, expira_em em ms ou None)"""
+
+    def __init__(self):
+        self.data = {}
+        self.commands = []
+        self.lock = threading.Lock()
+
+    def _alive(self, key):
+        entry = self.data.get(key)
+        if entry and entry[1] is not None and entry[1] <= time.time() * 1000:
+            del self.data[key]
+            return None
+        return entry
+
+    def execute(self, args):
+        name = args[0].decode().upper()
+        with self.lock:
+            self.commands.append(name)
+            return getattr(self, f'cmd_{name.lower()}')(*args[1:])
+
+    def cmd_auth(self, password):
+        return 'OK'
+
+    def cmd_select(self, db):
+        return 'OK'
+
+    def cmd_get(self, key):
+        entry = self._alive(key)
+        return entry[0] if entry else None
+
+    def cmd_set(self, key, value, *options):
+        options = [o.decode().upper() if isinstance(o, bytes) else o for o in options]
+        if 'NX' in options and self._alive(key):
+            return None
+        expires = None
+        if 'PX' in options:
+            expires = time.time() * 1000 + int(options[options.index('PX') + 1])
+        self.data[key] = (value, expires)
+        return 'OK'
+
+    def cmd_del(self, *keys):
+        return sum(1 for key in keys if self._alive(key) and self.data.pop(key))
+
+    def cmd_pttl(self, key):
+        entry = self._alive(key)
+        if not entry:
+            return -2
+        return -1 if entry[1] is None else int(entry[1] - time.time() * 1000)
+
+    def cmd_scan(self, cursor, *options):
+        pattern = options[list(options).index(b'MATCH') + 1].decode() if b'MATCH' in options else '*'
+        keys = [key for key in list(self.data) if self._alive(key) and fnmatch.fnmatchcase(key.decode(), pattern)]
+        return [b'0', keys]
+
+    def cmd_eval(self, script, numkeys, *rest):
+        keys, argv = rest[:int(numkeys)], rest[int(numkeys):]
+        if script.decode() == RELEASE_LOCK_SCRIPT:
+            entry = self._alive(keys[0])
+            if entry and entry[0] == argv[0]:
+                del self.data[keys[0]]
+                return 1
+            return 0
+        if script.decode() == INCR_SCRIPT:
+            entry = self._alive(keys[0])
+            value = (int(entry[0]) if entry else 0) + int(argv[0])
+            expires = entry[1] if entry else None
+            if int(argv[1]) > 0 and value == int(argv[0]):
+                expires = time.time() * 1000 + int(argv[1])
+            self.data[keys[0]] = (str(value).encode(), expires)
+            return value
+        raise ValueError('script desconhecido')
+
+
+class RespHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            args = []
+            for _ in range(int(line[1:-2])):
+                length = int(self.rfile.readline()[1:-2])
+                args.append(self.rfile.read(length + 2)[:-2])
+            try:
+                reply = self.server.store.execute(args)
+            except Exception as e:
+                self.wfile.write(f'-ERR {e}\r\n'.encode())
+                continue
+            self.wfile.write(encode(reply))
+
+
+def encode(value):
+    if value is None:
+        return b'$-1\r\n'
+    if isinstance(value, str):
+        return f'+{value}\r\n'.encode()
+    if isinstance(value, int):
+        return f':{value}\r\n'.encode()
+    if isinstance(value, bytes):
+        return f'${len(value)}\r\n'.encode() + value + b'\r\n'
+    return f'*{len(value)}\r\n'.encode() + b''.join(encode(item) for item in value)
+
+
+class RespServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+def new_backend():
+    return RedisStateBackend(f'redis://:secret@127.0.0.1:{PORT}/1')
+
+
+def test_get_set_items():
+    """get/set/delete, validade por PX e listagem por SCAN"""
+    print("🔍 Testando get/set/items...")
+    backend = new_backend()
+    backend.set('jobs', 'a', {'status': 'queued'})
+    backend.set('jobs', 'b', {'status': 'running'}, ttl=0.2)
+    backend.set('artifacts', 'c', {'path': '/tmp/x'})
+    listed = dict(backend.items('jobs'))
+    time.sleep(0.3)
+    expired = backend.get('jobs', 'b')
+    backend.delete('jobs', 'a')
+    print(f"  items {sorted(listed)}, expirado {expired}, apagado {backend.get('jobs', 'a')}")
+    if listed == {'a': {'status': 'queued'}, 'b': {'status': 'running'}} and expired is None and \
+            backend.get('jobs', 'a') is None and backend.get('artifacts', 'c') == {'path': '/tmp/x'}:
+        print("✅ get/set/items OK")
+        return True
+    print("❌ Valores inesperados")
+    return False
+
+
+def test_incr_atomic_ttl(store):
+    """incr cria o contador já com validade num único comando"""
+    print("\n🔍 Testando incr com validade...")
+    backend = new_backend()
+    before = len(store.commands)
+    values = [backend.incr('demand', 'v1:mp3', ttl=60) for _ in range(3)]
+    sent = [name for name in store.commands[before:] if name not in ('AUTH', 'SELECT')]  # conexão nova
+    ttl = store.execute([b'PTTL', b'firedow:demand:v1:mp3'])
+    print(f"  valores {values}, comandos {sent}, PTTL {ttl} ms")
+    if values == [1, 2, 3] and sent == ['EVAL'] * 3 and 0 < ttl <= 60000:
+        print("✅ incr atômico OK")
+        return True
+    print("❌ Contador sem validade ou em vários comandos")
+    return False
+
+
+def test_lock_contention():
+    """Lock expirado e tomado por outro worker não é apagado pelo dono antigo"""
+    print("\n🔍 Testando liberação de lock sob disputa...")
+    first, second = new_backend(), new_backend()
+    old_token = first.acquire_lock('download:v1:mp3', 0.2)
+    time.sleep(0.3)
+    new_token = second.acquire_lock('download:v1:mp3', 30)
+    first.release_lock('download:v1:mp3', old_token)  # dono antigo, atrasado
+    third = first.acquire_lock('download:v1:mp3', 30)
+    second.release_lock('download:v1:mp3', new_token)
+    after = first.acquire_lock('download:v1:mp3', 30)
+    print(f"  novo dono {bool(new_token)}, terceiro durante o lock {third}, depois da liberação {bool(after)}")
+    if old_token and new_token and third is None and after:
+        print("✅ Compare-and-delete OK")
+        return True
+    print("❌ O dono antigo apagou o lock de outro worker")
+    return False
+
+
+def test_concurrent_acquire():
+    """Vários workers disputando o mesmo lock: exatamente um vence"""
+    print("\n🔍 Testando aquisição concorrente...")
+    backends = [new_backend() for _ in range(16)]
+    with ThreadPoolExecutor(16) as pool:
+        tokens = list(pool.map(lambda backend: backend.acquire_lock('publish:x', 30), backends))
+    winners = [token for token in tokens if token]
+    print(f"  {len(winners)} vencedor(es) entre {len(tokens)}")
+    if len(winners) == 1:
+        print("✅ Aquisição concorrente OK")
+        return True
+    print("❌ Mais de um worker pegou o lock")
+    return False
+
+
+def test_reconnect():
+    """Conexão derrubada pelo servidor: erro nesta chamada, reconexão na próxima"""
+    print("\n🔍 Testando reconexão...")
+    backend = new_backend()
+    backend.set('jobs', 'r', 1)
+    sock, _ = backend._local.conn
+    sock.shutdown(2)  # simula o servidor fechando a conexão
+    try:
+        backend.get('jobs', 'r')
+        failed = False
+    except (OSError, ConnectionError):
+        failed = True
+    value = backend.get('jobs', 'r')
+    print(f"  falhou na conexão quebrada: {failed}, depois: {value}")
+    if value == 1:
+        print("✅ Reconexão OK")
+        return True
+    print("❌ Não reconectou")
+    return False
+
+
+def main():
+    """Executa os testes do backend Redis"""
+    print("🚀 Testando RedisStateBackend (servidor RESP local)")
+    print("=" * 50)
+
+    server = RespServer(('127.0.0.1', PORT), RespHandler)
+    server.store = FakeRedis()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        tests = [
+            test_get_set_items,
+            lambda: test_incr_atomic_ttl(server.store),
+            test_lock_contention,
+            test_concurrent_acquire,
+            test_reconnect,
+        ]
+        passed = sum(1 for test in tests if test())
+    finally:
+        server.shutdown()
+
+    print("\n" + "=" * 50)
+    print(f"📊 Resultados: {passed}/{len(tests)} testes passaram")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
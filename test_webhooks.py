@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Script de teste dos callbacks de jobs - sobe um receptor HTTP local
+"""
+
+import hashlib
+import hmac
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PORT = 9200
+SINK = f'http://127.0.0.1:{PORT}'
+SECRET = 'segredo-de-teste'
+
+os.environ.update({
+    'STATE_DIR': tempfile.mkdtemp(prefix='webhooks_state_'),
+    'WEBHOOK_SECRET': SECRET,
+    'WEBHOOK_ALLOWED_HOSTS': '127.0.0.1',  # o receptor do teste é local
+    'UPSTREAM_RETRIES': '1',
+    'WARMUP_ENABLED': '0',
+})
+
+import app  # noqa: E402  (lê as variáveis acima na importação)
+from webhooks import SIGNATURE_HEADER, WebhookDispatcher, parse_allowed_hosts, valid_callback_url  # noqa: E402
+
+ALLOWED = parse_allowed_hosts('127.0.0.1')
+
+
+class Sink:
+    """O que o receptor recebeu"""
+    events = []
+    requests = 0
+    connections = set()
+    fail_next = 0
+    drop_keepalive = False
+    bad_signatures = 0
+    lock = threading.Lock()
+
+    @classmethod
+    def reset(cls):
+        cls.events, cls.requests, cls.connections, cls.fail_next, cls.bad_signatures = [], 0, set(), 0, 0
+        cls.drop_keepalive = False
+
+
+class SinkHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        with Sink.lock:
+            Sink.requests += 1
+            Sink.connections.add(self.client_address)
+            failing = Sink.fail_next > 0
+            Sink.fail_next -= 1 if failing else 0
+            signature = self.headers.get(SIGNATURE_HEADER)
+            if signature:
+                expected = 'sha256=' + hmac.new(SECRET.encode(), body, hashlib.sha256).hexdigest()
+                if not hmac.compare_digest(signature, expected):
+                    Sink.bad_signatures += 1
+            if not failing:
+                Sink.events.extend(dict(event, path=self.path) for event in json.loads(body)['events'])
+        status = 500 if failing else 204
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+        # Receptor que fecha a conexão ociosa sem avisar (sem Connection: close)
+        self.close_connection = Sink.drop_keepalive
+
+
+def wait_for(condition, timeout=15):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.1)
+    return False
+
+
+def test_batching_and_keepalive():
+    """Eventos próximos para o mesmo host vão em poucos POSTs, numa única conexão"""
+    print("🔍 Testando batching e keep-alive...")
+    Sink.reset()
+    dispatcher = WebhookDispatcher(batch_window=0.3, allowed_hosts=ALLOWED)
+    for i in range(30):
+        dispatcher.enqueue(f'{SINK}/hooks/a', {'n': i})
+    for i in range(5):
+        dispatcher.enqueue(f'{SINK}/hooks/b?token=x', {'n': i})
+    if not wait_for(lambda: len(Sink.events) == 35):
+        print(f"❌ Recebidos {len(Sink.events)} de 35 eventos")
+        return False
+    print(f"  {len(Sink.events)} eventos em {Sink.requests} POSTs e {len(Sink.connections)} conexão(ões)")
+    if Sink.requests <= 3 and len(Sink.connections) == 1:
+        print("✅ Batching e keep-alive OK")
+        return True
+    print("❌ Eventos não foram agrupados ou a conexão não foi reaproveitada")
+    return False
+
+
+def test_retry_and_signature():
+    """Falhas do receptor são repetidas e o corpo vai assinado"""
+    print("\n🔍 Testando retry e assinatura...")
+    Sink.reset()
+    Sink.fail_next = 2
+    dispatcher = WebhookDispatcher(secret=SECRET, batch_window=0.1, allowed_hosts=ALLOWED)
+    dispatcher.enqueue(f'{SINK}/hooks/retry', {'n': 1})
+    if not wait_for(lambda: len(Sink.events) == 1):
+        print("❌ Evento não foi entregue após falhas")
+        return False
+    print(f"  Entregue na tentativa {Sink.requests}")
+    if Sink.requests == 3 and Sink.bad_signatures == 0:
+        print("✅ Retry e assinatura OK")
+        return True
+    print("❌ Tentativas ou assinatura inesperadas")
+    return False
+
+
+def test_stale_connection():
+    """Conexão keep-alive fechada pelo receptor: reconecta na hora, sem contar tentativa; ociosas são fechadas"""
+    print("\n🔍 Testando reconexão e conexões ociosas...")
+    Sink.reset()
+    Sink.drop_keepalive = True
+    dispatcher = WebhookDispatcher(batch_window=0.1, allowed_hosts=ALLOWED, idle_timeout=0.5)
+    dispatcher.enqueue(f'{SINK}/hooks/stale', {'n': 1})
+    wait_for(lambda: len(Sink.events) == 1)
+    time.sleep(0.2)  # o receptor fecha o socket
+    dispatcher.enqueue(f'{SINK}/hooks/stale', {'n': 2})
+    delivered = wait_for(lambda: len(Sink.events) == 2, timeout=3)
+    evicted = wait_for(lambda: not dispatcher._connections, timeout=5)
+    print(f"  entregues {len(Sink.events)}, POSTs {Sink.requests}, retries pendentes {len(dispatcher._retry)}, "
+          f"conexões abertas {dispatcher.stats['connections']}, pool vazio depois {evicted}")
+    if delivered and Sink.requests == 2 and dispatcher.stats['connections'] == 2 and evicted:
+        print("✅ Reconexão imediata OK")
+        return True
+    print("❌ Conexão fechada virou tentativa com backoff ou ficou no pool")
+    return False
+
+
+def test_job_callback():
+    """Um job com callback_url avisa o receptor ao terminar"""
+    print("\n🔍 Testando callback de job...")
+    Sink.reset()
+    client = app.app.test_client()
+    response = client.post('/jobs', json={
+        'url': 'http://127.0.0.1:9/inexistente.mp4',
+        'format': 'mp4',
+        'callback_url': f'{SINK}/hooks/jobs',
+    })
+    if response.status_code != 202:
+        print(f"❌ Falha ao criar job: {response.status_code}")
+        return False
+    job_id = response.get_json()['id']
+    if not wait_for(lambda: any(event.get('job_id') == job_id for event in Sink.events), timeout=60):
+        print("❌ Callback do job não chegou")
+        return False
+    event = next(event for event in Sink.events if event['job_id'] == job_id)
+    wait_for(lambda: client.get(f'/jobs/{job_id}').get_json().get('callback') == 'delivered', timeout=5)
+    job = client.get(f'/jobs/{job_id}').get_json()
+    print(f"  Evento {event['event']}; callback no job: {job.get('callback')}")
+    if event['event'] == 'job.failed' and job.get('callback') == 'delivered':
+        print("✅ Callback de job OK")
+        return True
+    print("❌ Callback de job inesperado")
+    return False
+
+
+def test_invalid_callback_url():
+    """callback_url que não é http(s) é recusada"""
+    print("\n🔍 Testando callback_url inválida...")
+    response = app.app.test_client().post('/jobs', json={
+        'url': 'https://www.youtube.com/watch?v=dQw4w9WgXcQ',
+        'callback_url': 'file:///etc/passwd',
+    })
+    if response.status_code == 400:
+        print("✅ callback_url inválida recusada")
+        return True
+    print(f"❌ Esperava 400, recebeu {response.status_code}")
+    return False
+
+
+def test_internal_destinations():
+    """Destinos na rede interna são recusados, salvo os liberados; o worker também não conecta neles"""
+    print("\n🔍 Testando bloqueio de destinos internos...")
+    internal = ['http://127.0.0.1:9200/x', 'http://localhost/x', 'http://10.0.0.5/x', 'http://[::1]/x',
+                'http://169.254.169.254/latest/meta-data/', 'http://[::ffff:192.168.0.1]/x', 'http://0.0.0.0/x']
+    accepted = [url for url in internal if valid_callback_url(url)]
+    allowed = valid_callback_url('http://10.0.0.5/x', parse_allowed_hosts('hooks.interno, 10.0.0.0/8'))
+    response = app.app.test_client().post('/jobs', json={
+        'url': 'https://www.youtube.com/watch?v=dQw4w9WgXcQ',
+        'callback_url': 'http://169.254.169.254/latest/meta-data/',
+    })
+    Sink.reset()
+    dispatcher = WebhookDispatcher(batch_window=0.1, retries=1)
+    dispatcher.enqueue(f'{SINK}/hooks/blocked', {'n': 1})
+    wait_for(lambda: dispatcher.stats['failed'] == 1, timeout=5)
+    print(f"  aceitos sem liberação {accepted}, rede liberada {allowed}, API {response.status_code}, "
+          f"POSTs do worker {Sink.requests}")
+    if not accepted and allowed and response.status_code == 400 and Sink.requests == 0 \
+            and dispatcher.stats['failed'] == 1:
+        print("✅ Destinos internos bloqueados")
+        return True
+    print("❌ Destino interno aceito")
+    return False
+
+
+def main():
+    """Executa os testes de callbacks"""
+    print("🚀 Testando callbacks de jobs")
+    print("=" * 50)
+
+    server = ThreadingHTTPServer(('127.0.0.1', PORT), SinkHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        tests = [
+            test_batching_and_keepalive,
+            test_retry_and_signature,
+            test_stale_connection,
+            test_job_callback,
+            test_invalid_callback_url,
+            test_internal_destinations,
+        ]
+        passed = sum(1 for test in tests if test())
+    finally:
+        server.shutdown()
+
+    print("\n" + "=" * 50)
+    print(f"📊 Resultados: {passed}/{len(tests)} testes passaram")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
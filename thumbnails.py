@@ -0,0 +1,169 @@
+"""
+Proxy de thumbnails com variantes redimensionadas em cache
+
+A imagem original é buscada na origem uma única vez por vídeo e guardada em
+disco; as variantes (small/medium/large em WebP ou JPEG) são geradas pelo
+FFmpeg na primeira vez que alguém as pede e servidas do disco daí em diante.
+Com max_age, uma original mais velha que isso é buscada de novo no próximo
+pedido, e as variantes geradas a partir da anterior são refeitas.
+"""
+
+import contextlib
+import hashlib
+import os
+import re
+import shutil
+import subprocess
+import threading
+import time
+import urllib.error
+from collections import OrderedDict
+import urllib.request
+
+VIDEO_ID_RE = re.compile(r'^[A-Za-z0-9_-]{11}$')
+# Largura máxima de cada variante (a altura acompanha a proporção; nunca amplia)
+SIZES = {
+    'small': 160,
+    'medium': 320,
+    'large': 640,
+}
+# formato: (extensão, mimetype, argumentos do encoder)
+FORMATS = {
+    'webp': ('webp', 'image/webp', ['-c:v', 'libwebp', '-quality', '75']),
+    'jpeg': ('jpg', 'image/jpeg', ['-c:v', 'mjpeg', '-q:v', '5']),
+}
+# ETags memorizados (caminho -> (mtime, etag)); os menos usados saem primeiro
+ETAG_CACHE_SIZE = 4096
+# Da maior para a menor; maxresdefault não existe para todos os vídeos
+SOURCE_URLS = (
+    'https://i.ytimg.com/vi/{id}/maxresdefault.jpg',
+    'https://i.ytimg.com/vi/{id}/hqdefault.jpg',
+)
+
+
+class ThumbnailNotFound(Exception):
+    """A origem não tem thumbnail para este vídeo"""
+
+
+class ThumbnailStore:
+    """Original + variantes por vídeo em `directory/<video_id>/`"""
+
+    def __init__(self, directory, ffmpeg_bin='ffmpeg', timeout=10, max_age=None):
+        self.directory = directory
+        self.ffmpeg_bin = ffmpeg_bin
+        self.timeout = timeout
+        self.max_age = max_age
+        self.source_urls = SOURCE_URLS
+        self._locks = {}  # chave -> [lock, quantos estão usando/esperando]
+        self._locks_guard = threading.Lock()
+        self._etags = OrderedDict()
+        self._etags_guard = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    @contextlib.contextmanager
+    def _lock(self, key):
+        """Lock por chave, descartado quando a última thread que o usa termina (o dicionário não cresce)"""
+        with self._locks_guard:
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._locks_guard:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[key]
+
+    def _fetch_original(self, video_id, path):
+        for template in self.source_urls:
+            url = template.format(id=video_id)
+            try:
+                with urllib.request.urlopen(url, timeout=self.timeout) as response:
+                    data = response.read()
+            except urllib.error.HTTPError as e:
+                if e.code == 404:
+                    continue
+                raise
+            temp = f'{path}.{os.getpid()}.tmp'
+            with open(temp, 'wb') as f:
+                f.write(data)
+            os.replace(temp, path)
+            return
+        raise ThumbnailNotFound(video_id)
+
+    def _fresh(self, path, newer_than=0):
+        """O arquivo existe, não passou de max_age e não é anterior a newer_than (mtime da original)"""
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return False
+        return mtime >= newer_than and not (self.max_age and time.time() - mtime > self.max_age)
+
+    def original(self, video_id):
+        """Caminho da imagem original, buscando na origem se não estiver em disco ou tiver vencido"""
+        path = os.path.join(self.directory, video_id, 'original.jpg')
+        if self._fresh(path):
+            return path
+        with self._lock(path):
+            if not self._fresh(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                self._fetch_original(video_id, path)
+        return path
+
+    def variant(self, video_id, size, image_format):
+        """Retorna (caminho, mimetype, etag) da variante, gerando-a se faltar ou for de uma original anterior"""
+        ext, mimetype, encoder_args = FORMATS[image_format]
+        path = os.path.join(self.directory, video_id, f'{size}.{ext}')
+        original = self.original(video_id)
+        source_mtime = os.path.getmtime(original)
+        if not self._fresh(path, source_mtime):
+            with self._lock(path):
+                if not self._fresh(path, source_mtime):
+                    self._resize(original, path, SIZES[size], encoder_args)
+        return path, mimetype, self._etag(path)
+
+    def _resize(self, source, path, width, encoder_args):
+        temp = f'{path}.{os.getpid()}.tmp'
+        command = ([self.ffmpeg_bin, '-y', '-hide_banner', '-loglevel', 'error', '-i', source,
+                    '-vf', f"scale='min({width},iw)':-2", '-frames:v', '1'] +
+                   encoder_args + ['-f', 'image2', temp])
+        result = subprocess.run(command, capture_output=True, text=True, timeout=30)
+        if result.returncode != 0:
+            if os.path.exists(temp):
+                os.remove(temp)
+            raise Exception(f"Erro no FFmpeg: {result.stderr.strip()[-500:]}")
+        os.replace(temp, path)
+
+    def _etag(self, path):
+        """ETag forte pelo conteúdo, memorizado por caminho + mtime"""
+        mtime = os.path.getmtime(path)
+        with self._etags_guard:
+            cached = self._etags.get(path)
+            if cached and cached[0] == mtime:
+                self._etags.move_to_end(path)
+                return cached[1]
+        with open(path, 'rb') as f:
+            etag = hashlib.sha1(f.read()).hexdigest()
+        with self._etags_guard:
+            self._etags[path] = (mtime, etag)
+            self._etags.move_to_end(path)
+            while len(self._etags) > ETAG_CACHE_SIZE:
+                self._etags.popitem(last=False)
+        return etag
+
+    def cleanup(self, max_age):
+        """Remove thumbnails buscados há mais de `max_age` segundos (a próxima visita busca de novo)"""
+        now = time.time()
+        for video_id in os.listdir(self.directory):
+            folder = os.path.join(self.directory, video_id)
+            original = os.path.join(folder, 'original.jpg')
+            try:
+                if now - os.path.getmtime(original if os.path.exists(original) else folder) <= max_age:
+                    continue
+            except OSError:
+                continue
+            shutil.rmtree(folder, ignore_errors=True)
+            with self._etags_guard:
+                for path in [p for p in self._etags if p.startswith(folder + os.sep)]:
+                    del self._etags[path]
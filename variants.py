@@ -0,0 +1,85 @@
+"""
+Várias saídas a partir de uma única decodificação
+
+Pedir o mesmo vídeo em 128k e 320k (ou em 360p e 720p) rodava o pipeline
+inteiro uma vez por variante, e cada FFmpeg decodificava a fonte de novo.
+Aqui as variantes viram um único comando com várias saídas: a fonte é lida e
+decodificada uma vez e alimenta um encoder por saída (no vídeo, um filtro
+split seguido de um scale por altura).
+"""
+
+import re
+
+AUDIO_VARIANT = re.compile(r'^(\d{2,3})k$')
+VIDEO_VARIANT = re.compile(r'^(\d{3,4})p$')
+MIN_BITRATE = 32
+MAX_BITRATE = 320
+VIDEO_HEIGHTS = (144, 240, 360, 480, 720, 1080, 1440, 2160)
+# Opções de taxa/qualidade do preset que o bitrate da variante substitui
+AUDIO_RATE_OPTIONS = ('-b:a', '-q:a')
+
+
+def parse_variants(value, video, max_variants):
+    """Valida variants ('128k,320k' no áudio, '360p,720p' no vídeo) e retorna a lista sem repetições"""
+    items = value.split(',') if isinstance(value, str) else list(value or [])
+    variants = []
+    for item in items:
+        item = str(item).strip().lower()
+        if item and item not in variants:
+            variants.append(item)
+    if not variants:
+        raise ValueError('variants não pode ser vazio')
+    if len(variants) > max_variants:
+        raise ValueError(f'Máximo de {max_variants} variantes por pedido')
+    for variant in variants:
+        if video:
+            match = VIDEO_VARIANT.match(variant)
+            if not match or int(match.group(1)) not in VIDEO_HEIGHTS:
+                raise ValueError('Variantes de vídeo devem ser alturas: ' +
+                                 ', '.join(f'{height}p' for height in VIDEO_HEIGHTS))
+        else:
+            match = AUDIO_VARIANT.match(variant)
+            if not match or not MIN_BITRATE <= int(match.group(1)) <= MAX_BITRATE:
+                raise ValueError(f'Variantes de áudio devem ser bitrates entre {MIN_BITRATE}k e {MAX_BITRATE}k '
+                                 '(ex.: 128k,320k)')
+    return variants
+
+
+def _without(args, options):
+    """Remove pares opção/valor de uma lista de argumentos do FFmpeg"""
+    result = []
+    skip = False
+    for arg in args:
+        if skip:
+            skip = False
+        elif arg in options:
+            skip = True
+        else:
+            result.append(arg)
+    return result
+
+
+def variant_encode_args(encode, variant, video, copy_audio=False):
+    """Argumentos de encode de uma variante (sem os -map), base da chave de cache da saída"""
+    if video:
+        args = list(encode)
+        if copy_audio:
+            # O áudio é igual em todas as alturas: cópia em vez de um encode por saída
+            args = _without(args, ('-c:a', '-b:a')) + ['-c:a', 'copy']
+        return args
+    return _without(encode, AUDIO_RATE_OPTIONS) + ['-b:a', variant]
+
+
+def plan_variants(encode, variants, video, copy_audio=False):
+    """Retorna (filter_complex ou None, [argumentos de saída por variante]) para um único FFmpeg"""
+    if not video:
+        return None, [['-map', '0:a:0'] + variant_encode_args(encode, variant, False) for variant in variants]
+    # Um decode do vídeo, dividido em N cópias e redimensionado por saída (sem ampliar além da fonte)
+    labels = ''.join(f'[s{i}]' for i in range(len(variants)))
+    chains = [f'[0:v:0]split={len(variants)}{labels}']
+    outputs = []
+    for i, variant in enumerate(variants):
+        height = int(variant[:-1])
+        chains.append(f"[s{i}]scale=w=-2:h='min({height},ih)'[v{i}]")
+        outputs.append(['-map', f'[v{i}]', '-map', '0:a:0?'] + variant_encode_args(encode, variant, True, copy_audio))
+    return ';'.join(chains), outputs
@@ -0,0 +1,236 @@
+"""
+Entrega de callbacks (webhooks) quando um job termina
+
+Um worker em background envia os eventos por POST. Os eventos que chegam
+juntos são agrupados por destino (esquema + host:porta) e entregues numa
+rodada pela mesma conexão keep-alive, um corpo {"events": [...]} por URL.
+Falhas são repetidas com backoff exponencial; o corpo pode ser assinado com
+HMAC-SHA256 para o receptor validar a origem.
+
+Só destinos públicos são aceitos: o host é resolvido e endereços de loopback,
+rede privada, link-local ou reservados são recusados (o servidor não vira um
+proxy para a rede interna). Hosts ou redes internas liberados explicitamente
+em allowed_hosts passam direto.
+"""
+
+import hashlib
+import hmac
+import http.client
+import ipaddress
+import json
+import logging
+import queue
+import socket
+import threading
+import time
+import urllib.parse
+
+from resilience import backoff_delay
+
+logger = logging.getLogger(__name__)
+
+SIGNATURE_HEADER = 'X-Firedow-Signature'
+
+
+def parse_allowed_hosts(value):
+    """'hooks.interno, 10.0.0.0/8' -> conjunto de hosts e redes liberados"""
+    allowed = set()
+    for item in (value or '').split(','):
+        item = item.strip().lower()
+        if not item:
+            continue
+        try:
+            allowed.add(ipaddress.ip_network(item, strict=False))
+        except ValueError:
+            allowed.add(item)
+    return frozenset(allowed)
+
+
+def is_public_address(address):
+    address = ipaddress.ip_address(address.split('%')[0])
+    if isinstance(address, ipaddress.IPv6Address) and address.ipv4_mapped:
+        address = address.ipv4_mapped
+    return not (address.is_private or address.is_loopback or address.is_link_local or address.is_reserved
+                or address.is_multicast or address.is_unspecified)
+
+
+def valid_callback_url(url, allowed_hosts=frozenset()):
+    """Aceita URLs http(s) absolutas cujo host resolve só para endereços públicos (ou está em allowed_hosts)"""
+    parsed = urllib.parse.urlparse(url or '')
+    if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+        return False
+    host = parsed.hostname.lower()
+    if host in allowed_hosts:
+        return True
+    try:
+        port = parsed.port
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, port or 80, proto=socket.IPPROTO_TCP)}
+    except (OSError, ValueError):
+        return False
+    networks = [item for item in allowed_hosts if not isinstance(item, str)]
+    return bool(addresses) and all(
+        is_public_address(address) or any(ipaddress.ip_address(address.split('%')[0]) in network
+                                           for network in networks)
+        for address in addresses
+    )
+
+
+class WebhookDispatcher:
+    """Fila de eventos + worker de entrega com pool de conexões por destino"""
+
+    def __init__(self, secret=None, batch_size=50, batch_window=0.5, retries=5, timeout=10, on_result=None,
+                 allowed_hosts=frozenset(), idle_timeout=60):
+        self.secret = secret.encode() if secret else None
+        self.allowed_hosts = allowed_hosts
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.retries = retries
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.on_result = on_result
+        self.stats = {'delivered': 0, 'failed': 0, 'requests': 0, 'connections': 0}
+        self._queue = queue.Queue()
+        self._retry = []  # (quando, tentativa, url, eventos)
+        self._connections = {}  # (esquema, host:porta) -> (conexão, último uso)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def enqueue(self, callback_url, event):
+        """Agenda a entrega de um evento; o worker é iniciado no primeiro uso"""
+        self._queue.put((callback_url, event))
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def pending(self):
+        return self._queue.qsize() + sum(len(events) for _, _, _, events in self._retry)
+
+    @staticmethod
+    def _origin(url):
+        parsed = urllib.parse.urlparse(url)
+        return parsed.scheme, parsed.netloc.lower()
+
+    def _collect(self):
+        """Agrupa por destino (esquema + host:porta) os eventos que chegarem dentro da janela de batching"""
+        batches = {}
+        wait = 1.0 if not self._retry else max(min(when for when, _, _, _ in self._retry) - time.time(), 0)
+        try:
+            url, event = self._queue.get(timeout=wait)
+        except queue.Empty:
+            return batches
+        batches.setdefault(self._origin(url), []).append((url, event))
+        deadline = time.time() + self.batch_window
+        count = 1
+        while count < self.batch_size * 10:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                url, event = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batches.setdefault(self._origin(url), []).append((url, event))
+            count += 1
+        return batches
+
+    def _run(self):
+        while True:
+            try:
+                batches = []
+                for items in self._collect().values():
+                    # Mesmo destino: todos os POSTs da rodada saem em sequência pela mesma conexão
+                    by_url = {}
+                    for url, event in items:
+                        by_url.setdefault(url, []).append(event)
+                    batches += [(0, url, events) for url, events in by_url.items()]
+                now = time.time()
+                due = [entry for entry in self._retry if entry[0] <= now]
+                self._retry = [entry for entry in self._retry if entry[0] > now]
+                batches += [(attempt, url, events) for _, attempt, url, events in due]
+                for attempt, url, events in batches:
+                    for start in range(0, len(events), self.batch_size):
+                        self._deliver(url, events[start:start + self.batch_size], attempt)
+                self._close_idle()
+            except Exception as e:
+                logger.error("Erro no worker de callbacks: %s", e)
+
+    def _close_idle(self):
+        """Fecha as conexões sem uso há idle_timeout: o pool não cresce com cada host que já recebeu callback"""
+        now = time.time()
+        for key, (conn, last_used) in list(self._connections.items()):
+            if now - last_used > self.idle_timeout:
+                conn.close()
+                del self._connections[key]
+
+    def _connection(self, parsed):
+        """Retorna (chave, conexão, reaproveitada)"""
+        key = (parsed.scheme, parsed.netloc.lower())
+        if key in self._connections:
+            return key, self._connections[key][0], True
+        # Revalida na hora de conectar: o DNS pode ter mudado desde que a URL foi aceita
+        if not valid_callback_url(parsed.geturl(), self.allowed_hosts):
+            raise ValueError(f'destino não permitido: {parsed.hostname}')
+        connection_class = http.client.HTTPSConnection if parsed.scheme == 'https' else http.client.HTTPConnection
+        conn = connection_class(parsed.hostname, parsed.port, timeout=self.timeout)
+        self._connections[key] = (conn, time.time())
+        self.stats['connections'] += 1
+        return key, conn, False
+
+    def _post(self, url, body):
+        parsed = urllib.parse.urlparse(url)
+        path = parsed.path or '/'
+        if parsed.query:
+            path += '?' + parsed.query
+        headers = {'Content-Type': 'application/json', 'Connection': 'keep-alive'}
+        if self.secret:
+            digest = hmac.new(self.secret, body, hashlib.sha256).hexdigest()
+            headers[SIGNATURE_HEADER] = f'sha256={digest}'
+        while True:
+            key, conn, reused = self._connection(parsed)
+            try:
+                conn.request('POST', path, body=body, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                break
+            except (http.client.HTTPException, OSError) as e:
+                conn.close()
+                self._connections.pop(key, None)
+                # Conexão ociosa que o receptor já fechou: reconecta na hora, sem gastar tentativa nem backoff
+                if reused and isinstance(e, (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError)):
+                    continue
+                raise
+        self.stats['requests'] += 1
+        if response.will_close:
+            conn.close()
+            self._connections.pop(key, None)
+        else:
+            self._connections[key] = (conn, time.time())
+        return response.status
+
+    def _deliver(self, url, events, attempt):
+        body = json.dumps({'events': events}).encode()
+        try:
+            status = self._post(url, body)
+            error = None if 200 <= status < 300 else f'HTTP {status}'
+        except Exception as e:
+            error = str(e)
+        if error is None:
+            self.stats['delivered'] += len(events)
+            self._report(events, True)
+            return
+        if attempt + 1 >= self.retries:
+            logger.error("Callback para %s descartado após %s tentativas: %s", url, attempt + 1, error)
+            self.stats['failed'] += len(events)
+            self._report(events, False)
+            return
+        delay = backoff_delay(attempt, 1.0, 60.0)
+        logger.info("Callback para %s falhou (%s); nova tentativa em %.1fs", url, error, delay)
+        self._retry.append((time.time() + delay, attempt + 1, url, events))
+
+    def _report(self, events, delivered):
+        if self.on_result:
+            try:
+                self.on_result(events, delivered)
+            except Exception as e:
+                logger.error("Erro ao registrar resultado do callback: %s", e)